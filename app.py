@@ -1,9 +1,26 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, stream_with_context, request, redirect, url_for, flash, session, jsonify, g
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+import csv
+import io
+import json
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
+import re
+import time
+import click
+from collections import Counter, namedtuple
 from functools import wraps
+from markupsafe import Markup
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql.visitors import iterate
+
+from broadcast import Broadcaster, format_sse
+from cache import FragmentCache, LRUCache, TTLCache, VersionStamps
+from passwords import PasswordHasher, PasswordHasherBusy
+from pricing import RateTable, TimeRule, quote_many
+from profiling import RequestProfiler
+from scheduler import PeriodicJob
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'
@@ -13,11 +30,76 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 if not os.path.exists(os.path.join(basedir, 'database')):
     os.makedirs(os.path.join(basedir, 'database'))
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'database', 'parking.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'database', 'parking.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Applied to every new SQLite connection: WAL lets readers and a writer work at the same time,
+# and busy_timeout makes writers queue for the lock instead of failing with "database is locked"
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 15000)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 268435456)),
+    'temp_store': 'MEMORY'
+}
+
+def engine_options(database_uri):
+    """Connection pool settings; in-memory SQLite keeps SQLAlchemy's single-connection pool"""
+    if not database_uri.startswith(('sqlite', 'postgresql')):
+        # Claims, expiry and the rollups rely on UPDATE ... RETURNING and ON CONFLICT upserts
+        raise ValueError('DATABASE_URL must point at SQLite or PostgreSQL')
+    if database_uri in ('sqlite://', 'sqlite:///:memory:'):
+        return {}
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    }
+    if not database_uri.startswith('sqlite'):
+        # Server databases drop idle connections, so recycle and ping before use
+        options.update(pool_recycle=1800, pool_pre_ping=True)
+    return options
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
 db = SQLAlchemy(app)
 
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        db.event.listen(db.engine, 'connect', _apply_sqlite_pragmas)
+
+# Opt-in request profiling (query counts, SQL/template time, slow query plans) shown at /admin/metrics
+app.config['PROFILE_REQUESTS'] = os.environ.get('PROFILE_REQUESTS') == '1'
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 100))
+profiler = RequestProfiler()
+if app.config['PROFILE_REQUESTS']:
+    profiler.init_app(app, db)
+
+# Seconds between background sweeps that complete overdue bookings (0 turns the in-process worker off)
+app.config['BOOKING_EXPIRY_INTERVAL'] = float(os.environ.get('BOOKING_EXPIRY_INTERVAL', 60))
+# Seconds between catch-up runs of the analytics rollups (0 turns the in-process job off)
+app.config['ROLLUP_INTERVAL'] = float(os.environ.get('ROLLUP_INTERVAL', 300))
+# Finished bookings older than this many days move to bookings_archive, checked every ARCHIVE_INTERVAL seconds
+app.config['ARCHIVE_AFTER_DAYS'] = float(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+app.config['ARCHIVE_INTERVAL'] = float(os.environ.get('ARCHIVE_INTERVAL', 3600))
+
+# Password hashing runs on a bounded pool of threads; the method is a werkzeug method string such as
+# 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000', and older hashes are upgraded at the next login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 64))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 2))
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                                 app.config['PASSWORD_HASH_QUEUE'], app.config['PASSWORD_HASH_TIMEOUT'])
+
 # Models
 class User(db.Model):
     __tablename__ = 'users'
@@ -36,10 +118,14 @@ class User(db.Model):
     vehicles = db.relationship('Vehicle', backref='owner', lazy=True, cascade='all, delete-orphan')
     bookings = db.relationship('Booking', backref='user', lazy=True)
 
+# Case-insensitive login and registration lookups
+db.Index('ix_users_username_lower', db.func.lower(User.username))
+db.Index('ix_users_email_lower', db.func.lower(User.email))
+
 class Vehicle(db.Model):
     __tablename__ = 'vehicles'
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     owner_name = db.Column(db.String(100), nullable=False)
     mobile = db.Column(db.String(15), nullable=False)
     vehicle_type = db.Column(db.String(50), nullable=False)
@@ -52,16 +138,45 @@ class ParkingLot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     address = db.Column(db.Text, nullable=False)
-    pincode = db.Column(db.String(10), nullable=False)
-    price_per_hour = db.Column(db.Float, nullable=False)
+    pincode = db.Column(db.String(10), nullable=False, index=True)
+    price_per_hour = db.Column(db.Numeric(10, 2), nullable=False)
     capacity = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
     spots = db.relationship('ParkingSpot', backref='parking_lot', lazy=True, cascade='all, delete-orphan')
+    occupancy = db.relationship('LotOccupancy', backref='parking_lot', uselist=False, cascade='all, delete-orphan')
+    pricing_rules = db.relationship('PricingRule', backref='parking_lot', lazy=True, cascade='all, delete-orphan')
+
+class LotOccupancy(db.Model):
+    __tablename__ = 'lot_occupancy'
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), primary_key=True)
+    available_count = db.Column(db.Integer, nullable=False, default=0)
+    occupied_count = db.Column(db.Integer, nullable=False, default=0)
+
+class PricingRule(db.Model):
+    __tablename__ = 'pricing_rules'
+    id = db.Column(db.Integer, primary_key=True)
+    # NULL applies the rule to every lot
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), nullable=True, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    kind = db.Column(db.String(20), nullable=False, default='time')  # time, surge
+    # Time rules: weekday digits (Monday is 0) and a minute-of-day window, which may wrap past midnight
+    days = db.Column(db.String(7), nullable=False, default='0123456')
+    start_minute = db.Column(db.Integer, nullable=False, default=0)
+    end_minute = db.Column(db.Integer, nullable=False, default=24 * 60)
+    # Surge rules: occupied share of the lot (0-1) from which the multiplier applies
+    min_occupancy = db.Column(db.Numeric(4, 3))
+    multiplier = db.Column(db.Numeric(6, 3), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class ParkingSpot(db.Model):
     __tablename__ = 'parking_spots'
+    __table_args__ = (
+        db.Index('ix_parking_spots_lot_available', 'lot_id', 'is_available'),
+        # A lot's spots in id order, for listings that take every spot regardless of availability
+        db.Index('ix_parking_spots_lot_id', 'lot_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), nullable=False)
     spot_number = db.Column(db.String(10), nullable=False)
@@ -73,15 +188,139 @@ class ParkingSpot(db.Model):
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        # Overlap lookups: active bookings ending after the window start, per spot or across lots
+        db.Index('ix_bookings_status_exit_entry', 'status', 'exit_time', 'entry_time', 'spot_id'),
+        db.Index('ix_bookings_spot_window', 'spot_id', 'entry_time', 'exit_time'),
+        # Per-user history (dashboard, my bookings) and per-user status counts
+        db.Index('ix_bookings_user_created', 'user_id', 'created_at'),
+        db.Index('ix_bookings_user_status', 'user_id', 'status'),
+        # Whether a spot still has an active booking (release and expiry), and whether it does in a window
+        db.Index('ix_bookings_spot_status_window', 'spot_id', 'status', 'exit_time', 'entry_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     spot_id = db.Column(db.Integer, db.ForeignKey('parking_spots.id'), nullable=False)
-    vehicle_no = db.Column(db.String(20), nullable=False)
+    vehicle_no = db.Column(db.String(20), nullable=False, index=True)
     entry_time = db.Column(db.DateTime, nullable=False)
     exit_time = db.Column(db.DateTime, nullable=False)
-    total_cost = db.Column(db.Float, nullable=False)
+    total_cost = db.Column(db.Numeric(10, 2), nullable=False)
     status = db.Column(db.String(20), default='active')  # active, completed, cancelled
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Set in the transaction that counts the booking into the analytics rollups
+    rolled_up = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+# Just the few bookings the rollups have not counted yet, for the rollup refresh and the dashboard revenue tail
+db.Index('ix_bookings_unrolled', Booking.id, sqlite_where=Booking.rolled_up == db.false(),
+         postgresql_where=Booking.rolled_up == db.false())
+
+class ArchivedBooking(db.Model):
+    """Finished bookings moved out of the hot bookings table by the archival job; same ids and columns"""
+    __tablename__ = 'bookings_archive'
+    __table_args__ = (
+        db.Index('ix_bookings_archive_user_created', 'user_id', 'created_at'),
+        db.Index('ix_bookings_archive_created', 'created_at'),
+        # Whether a spot has archived history, before the spot may be deleted
+        db.Index('ix_bookings_archive_spot', 'spot_id'),
+    )
+    # No foreign keys: archived history may outlive the spots and lots it refers to
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    spot_id = db.Column(db.Integer, nullable=False)
+    vehicle_no = db.Column(db.String(20), nullable=False)
+    entry_time = db.Column(db.DateTime, nullable=False)
+    exit_time = db.Column(db.DateTime, nullable=False)
+    total_cost = db.Column(db.Numeric(10, 2), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime)
+    # Only bookings the rollups have counted are archived
+    rolled_up = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class LotHourlyStats(db.Model):
+    """Rollup of bookings per lot and hour: count and revenue by entry hour, booked spot-minutes by overlap"""
+    __tablename__ = 'lot_hourly_stats'
+    __table_args__ = (
+        # Covers hourly reports over a time range across every lot, already in report order
+        db.Index('ix_lot_hourly_stats_hour', 'hour', 'lot_id', 'bookings', 'revenue', 'occupied_minutes'),
+    )
+    lot_id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    occupied_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+class LotDailyStats(db.Model):
+    """The same rollup per lot and day, so day and whole-range reports read a few rows per lot"""
+    __tablename__ = 'lot_daily_stats'
+    __table_args__ = (
+        db.Index('ix_lot_daily_stats_day', 'day', 'lot_id', 'bookings', 'revenue', 'occupied_minutes'),
+    )
+    lot_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.DateTime, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    occupied_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+class RollupState(db.Model):
+    """One row per rollup, written first by each refresh so refreshes take turns"""
+    __tablename__ = 'rollup_state'
+    name = db.Column(db.String(50), primary_key=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Resolved principals: per request on flask.g, across requests in a bounded LRU keyed by user id.
+# Commits through the ORM drop changed users at once in this process; the TTL bounds how long other
+# worker processes, or changes made outside the ORM, can keep serving a stale admin flag.
+Principal = namedtuple('Principal', ['user_id', 'is_admin'])
+PRINCIPAL_CACHE_SIZE = 1024
+app.config['PRINCIPAL_CACHE_TTL'] = float(os.environ.get('PRINCIPAL_CACHE_TTL', 10))
+principal_cache = LRUCache(PRINCIPAL_CACHE_SIZE, app.config['PRINCIPAL_CACHE_TTL'])
+
+def current_principal():
+    """The logged-in user's Principal, or None if nobody is logged in or the user no longer exists"""
+    if 'principal' in g:
+        return g.principal
+
+    principal = None
+    user_id = session.get('user_id')
+    if user_id is not None:
+        principal = principal_cache.get(user_id)
+        if principal is None:
+            row = db.session.query(User.id, User.is_admin).filter(User.id == user_id).first()
+            if row:
+                principal = Principal(row.id, bool(row.is_admin))
+                principal_cache.set(user_id, principal)
+    g.principal = principal
+    return principal
+
+def invalidate_principal(user_id=None):
+    """Forget a cached principal (or all of them); needed after bulk updates that bypass the ORM"""
+    principal_cache.invalidate(user_id)
+
+@db.event.listens_for(db.session, 'after_flush')
+def _collect_principal_changes(session_, flush_context):
+    changed = session_.info.setdefault('changed_principals', set())
+    for obj in session_.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+    for obj in session_.dirty:
+        if isinstance(obj, User) and db.inspect(obj).attrs.is_admin.history.has_changes():
+            changed.add(obj.id)
+
+@db.event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_principals(session_):
+    for user_id in session_.info.pop('changed_principals', ()):
+        invalidate_principal(user_id)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _forget_principal_changes(session_):
+    session_.info.pop('changed_principals', None)
 
 # Helper decorators
 def login_required(f):
@@ -100,36 +339,1334 @@ def admin_required(f):
             flash('Please log in to access this page.', 'error')
             return redirect(url_for('login'))
 
-        user = User.query.get(session['user_id'])
-        if not user or not user.is_admin:
+        principal = current_principal()
+        if not principal or not principal.is_admin:
             flash('You do not have permission to access this page.', 'error')
             return redirect(url_for('dashboard'))
         return f(*args, **kwargs)
     return decorated_function
 
+# Query helpers
+def user_bookings_query(user_id, bookings=Booking):
+    """A user's bookings with lot, spot and vehicle, newest first; pass booking_history(True) to include archived ones"""
+    return db.session.query(bookings, ParkingLot, ParkingSpot, Vehicle).\
+        join(ParkingSpot, bookings.spot_id == ParkingSpot.id).\
+        join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id).\
+        join(Vehicle, bookings.vehicle_no == Vehicle.vehicle_no).\
+        filter(bookings.user_id == user_id).\
+        order_by(bookings.created_at.desc(), bookings.id.desc())
+
+def all_bookings_query(bookings=Booking):
+    """Every booking with user, lot and spot, newest first"""
+    return db.session.query(bookings, User, ParkingLot, ParkingSpot).\
+        join(User, bookings.user_id == User.id).\
+        join(ParkingSpot, bookings.spot_id == ParkingSpot.id).\
+        join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id).\
+        order_by(bookings.created_at.desc(), bookings.id.desc())
+
+def spot_has_bookings():
+    """Correlated filter on ParkingSpot: the spot appears in any booking, hot or archived"""
+    return db.or_(db.select(Booking.id).where(Booking.spot_id == ParkingSpot.id).exists(),
+                  db.select(ArchivedBooking.id).where(ArchivedBooking.spot_id == ParkingSpot.id).exists())
+
+def lot_active_bookings_query(lot_id):
+    """Active bookings on any spot of a lot"""
+    return db.session.query(Booking).\
+        join(ParkingSpot, Booking.spot_id == ParkingSpot.id).\
+        filter(ParkingSpot.lot_id == lot_id, Booking.status == 'active')
+
+# Keyset pagination over (created_at, id) so deep pages cost the same as the first
+BOOKINGS_PAGE_SIZE = 50
+
+def encode_booking_cursor(booking):
+    return f'{booking.created_at.isoformat()}_{booking.id}'
+
+def decode_booking_cursor(cursor):
+    """Return (created_at, id) from a cursor string, or None if it is missing or malformed"""
+    try:
+        created_at, booking_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(booking_id)
+    except (AttributeError, ValueError):
+        return None
+
+def bookings_before(query, position):
+    """Restrict a newest-first bookings query to rows after the (created_at, id) position"""
+    bookings = query.column_descriptions[0]['entity']
+    return query.filter(db.tuple_(bookings.created_at, bookings.id) < position)
+
+def bookings_page(query, cursor=None, page_size=BOOKINGS_PAGE_SIZE):
+    """One page of a newest-first bookings query and the cursor for the next page (or None)"""
+    position = decode_booking_cursor(cursor)
+    if position:
+        query = bookings_before(query, position)
+
+    rows = query.limit(page_size + 1).all()
+    next_cursor = encode_booking_cursor(rows[page_size - 1][0]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+def iter_bookings(query, batch_size=BOOKINGS_PAGE_SIZE * 10):
+    """Yield every row of a newest-first bookings query, one keyset batch at a time"""
+    cursor = None
+    while True:
+        rows, cursor = bookings_page(query, cursor, batch_size)
+        yield from rows
+        if not cursor:
+            return
+        db.session.expunge_all()
+
+def render_bookings(template, query, **context):
+    """Render a paginated bookings page, or stream every booking when ?stream=1 is given"""
+    if request.args.get('stream') == '1':
+        first_rows, _ = bookings_page(query, page_size=1)
+        context.update(bookings=iter_bookings(query) if first_rows else [], next_cursor=None)
+        app.update_template_context(context)
+
+        # Jinja's stream() wraps generate(); buffering sends rows in chunks instead of token by token
+        stream = app.jinja_env.get_template(template).stream(context)
+        stream.enable_buffering(100)
+        return app.response_class(stream_with_context(stream))
+
+    cursor = request.args.get('cursor')
+    bookings, next_cursor = bookings_page(query, cursor)
+    return render_template(template, bookings=bookings, cursor=cursor, next_cursor=next_cursor, **context)
+
+# Admin dashboard statistics, cached briefly and dropped whenever bookings, lots or users change
+ADMIN_STATS_TTL = 30
+admin_stats_cache = TTLCache(ADMIN_STATS_TTL)
+
+def compute_admin_stats():
+    """All dashboard figures in one round trip of scalar subqueries; revenue comes from the rollups and their unfolded tail"""
+    row = db.session.query(
+        db.select(db.func.count(ParkingLot.id)).scalar_subquery(),
+        db.select(db.func.coalesce(db.func.sum(LotOccupancy.available_count + LotOccupancy.occupied_count), 0)).
+        scalar_subquery(),
+        db.select(db.func.count(User.id)).where(User.is_admin == False).scalar_subquery(),
+        db.select(db.func.count(Booking.id)).scalar_subquery() +
+        db.select(db.func.count(ArchivedBooking.id)).scalar_subquery(),
+        # Active bookings are a small slice, so count them from the status index
+        db.select(db.func.count(Booking.id)).where(Booking.status == 'active').scalar_subquery(),
+        db.select(db.func.coalesce(db.func.sum(LotDailyStats.revenue), 0)).scalar_subquery() +
+        # Bookings the rollups have not folded in yet, through their partial index
+        db.select(db.func.coalesce(db.func.sum(Booking.total_cost), 0)).
+        where(Booking.rolled_up == db.false()).scalar_subquery()
+    ).one()
+
+    total_lots, total_spots, total_users, total_bookings, active_bookings, total_revenue = row
+    return {
+        'total_lots': total_lots,
+        'total_spots': total_spots,
+        'total_users': total_users,
+        'total_bookings': total_bookings,
+        'active_bookings': active_bookings,
+        'total_revenue': total_revenue
+    }
+
+def invalidate_admin_stats():
+    admin_stats_cache.invalidate()
+
+# Page caches: query results and rendered fragments keyed by their inputs plus version stamps.
+# Stamps: 'lots' (lot details), 'availability' (spot counters and bookings), 'users' (the admin
+# users table) and 'user:<id>' (one user's vehicles and bookings). Writers bump the stamps they
+# affect after committing; entries under old stamps are never read again and age out of the LRU.
+PAGE_CACHE_TTL = 300
+app.config['PAGE_CACHE_BYTES'] = int(os.environ.get('PAGE_CACHE_MB', 32)) * 1024 * 1024
+page_cache = FragmentCache(app.config['PAGE_CACHE_BYTES'], PAGE_CACHE_TTL)
+versions = VersionStamps()
+
+def user_stamp(user_id):
+    return f'user:{user_id}'
+
+def cached(key, stamps, factory):
+    """factory()'s result for key, reused until one of the named version stamps is bumped"""
+    return page_cache.get_or_set(tuple(key) + tuple(stamps) + versions.get(*stamps), factory)
+
+@app.template_global()
+def cached_fragment(*key, stamps=(), caller=None):
+    """Use as {% call cached_fragment('name', ..., stamps=(...)) %}...{% endcall %} to render the body once per key"""
+    return Markup(cached(key, stamps, caller))
+
+def as_dict(obj):
+    """A model instance's column values, safe to cache and share between requests"""
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+# Availability helpers
+def lots_with_availability(query, limit=None, offset=0):
+    """Attach spot totals to a ParkingLot query from the lot_occupancy counters"""
+    rows = query.outerjoin(LotOccupancy, LotOccupancy.lot_id == ParkingLot.id).\
+        add_columns(LotOccupancy.available_count, LotOccupancy.occupied_count).\
+        order_by(ParkingLot.id).limit(limit).offset(offset).all()
+
+    lots_data = []
+    for lot, available_spots, occupied_spots in rows:
+        available_spots = available_spots or 0
+        total_spots = available_spots + (occupied_spots or 0)
+        lots_data.append({
+            'lot': lot,
+            'total_spots': total_spots,
+            'available_spots': available_spots,
+            'utilization': ((total_spots - available_spots) / total_spots * 100) if total_spots > 0 else 0
+        })
+    return lots_data
+
+def adjust_occupancy(lot_id, available=0, occupied=0):
+    """Shift a lot's counters in SQL so concurrent writers never lose an update"""
+    db.session.execute(
+        db.update(LotOccupancy).
+        where(LotOccupancy.lot_id == lot_id).
+        values(available_count=LotOccupancy.available_count + available,
+               occupied_count=LotOccupancy.occupied_count + occupied)
+    )
+    if available:
+        db.session.info.setdefault('availability_changes', Counter())[lot_id] += available
+
+# Live availability: committed per-lot deltas fan out to Server-Sent Events subscribers
+AVAILABILITY_KEEPALIVE_SECONDS = 15
+availability_feed = Broadcaster()
+
+@db.event.listens_for(db.session, 'after_commit')
+def _publish_availability_changes(session_):
+    changes = session_.info.pop('availability_changes', None)
+    changes = {lot_id: delta for lot_id, delta in (changes or {}).items() if delta}
+    if changes:
+        versions.bump('availability')
+        availability_feed.publish({'lots': [{'lot_id': lot_id, 'available': delta}
+                                            for lot_id, delta in sorted(changes.items())]})
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _forget_availability_changes(session_):
+    session_.info.pop('availability_changes', None)
+
+def overlapping_bookings(start, end):
+    """Active bookings whose [entry_time, exit_time) overlaps [start, end)"""
+    # exit_time > start is the range the status/exit index seeks on, so finished history is never scanned
+    return db.session.query(Booking).filter(
+        Booking.status == 'active',
+        Booking.exit_time > start,
+        Booking.entry_time < end
+    )
+
+def booked_spots_between(lot_ids, start, end):
+    """Return {lot_id: number of spots reserved at some point in [start, end)}"""
+    rows = overlapping_bookings(start, end).\
+        join(ParkingSpot, Booking.spot_id == ParkingSpot.id).\
+        filter(ParkingSpot.lot_id.in_(lot_ids)).\
+        group_by(ParkingSpot.lot_id).\
+        with_entities(ParkingSpot.lot_id, db.func.count(db.distinct(Booking.spot_id)))
+    return dict(rows.all())
+
+def spot_reserved_between(start, end):
+    """EXISTS condition: the enclosing query's spot has an active booking overlapping [start, end)"""
+    # Correlated on the spot first, so each spot seeks its own bookings through ix_bookings_spot_status_window
+    # instead of rescanning every future reservation in the database
+    return db.select(Booking.id).where(
+        Booking.spot_id == ParkingSpot.id,
+        Booking.status == 'active',
+        Booking.exit_time > start,
+        Booking.entry_time < end
+    ).exists()
+
+def free_spots_between(lot_id, start, end):
+    """Query for the spots in a lot with no active booking overlapping [start, end)"""
+    return ParkingSpot.query.filter(ParkingSpot.lot_id == lot_id, ~spot_reserved_between(start, end)).\
+        order_by(ParkingSpot.id)
+
+def bookable_spots(lot_ids, start, end, now):
+    """Query for the spots in the lots a booking for [start, end) may take.
+
+    The window must be free of other active bookings; a window that has already started
+    also needs the spot to be unoccupied right now.
+    """
+    query = ParkingSpot.query.filter(ParkingSpot.lot_id.in_(lot_ids), ~spot_reserved_between(start, end))
+    if start <= now:
+        query = query.filter(ParkingSpot.is_available == True)
+    return query
+
+def claim_spots(lot_id, count, start, end, now=None):
+    """Atomically take up to count spots in the lot that are free for [start, end); returns [(spot_id, spot_number)].
+
+    A window that has already started occupies its spots at once. Future windows leave the spots
+    available until occupy_started_bookings() marks them at entry time, so a booking for next
+    month does not hold a spot today.
+    """
+    now = now or booking_now()
+    starts_now = start <= now
+    candidates = bookable_spots([lot_id], start, end, now).with_entities(ParkingSpot.id).\
+        order_by(ParkingSpot.id).limit(count)
+    # The UPDATE takes the write lock before its conditions are read, and they are read again for every
+    # candidate, so two requests can never take the same spot for overlapping windows
+    guards = [~spot_reserved_between(start, end)]
+    if starts_now:
+        guards.append(ParkingSpot.is_available == True)
+    claimed = db.session.execute(
+        db.update(ParkingSpot).
+        where(ParkingSpot.id.in_(candidates.subquery().select()), *guards).
+        values(is_available=False if starts_now else ParkingSpot.is_available).
+        returning(ParkingSpot.id, ParkingSpot.spot_number).
+        execution_options(synchronize_session=False)
+    ).all()
+    if claimed and starts_now:
+        adjust_occupancy(lot_id, available=-len(claimed), occupied=len(claimed))
+    return claimed
+
+def claim_spot(lot_id, start, end):
+    """Atomically take one spot in the lot that is free for [start, end); returns the spot or None"""
+    claimed = claim_spots(lot_id, 1, start, end)
+    if not claimed:
+        return None
+    return db.session.get(ParkingSpot, claimed[0][0], populate_existing=True)
+
+# Spots are written in executemany batches of this size
+SPOT_INSERT_BATCH = 5000
+
+def provision_spots(lot_id, first_number, last_number):
+    """Bulk-insert spots P<first_number>..P<last_number> for a lot; returns how many were created"""
+    now = datetime.utcnow()
+    for start in range(first_number, last_number + 1, SPOT_INSERT_BATCH):
+        stop = min(start + SPOT_INSERT_BATCH, last_number + 1)
+        db.session.execute(ParkingSpot.__table__.insert(), [
+            {'lot_id': lot_id, 'spot_number': f'P{i:03d}', 'is_available': True, 'created_at': now}
+            for i in range(start, stop)
+        ])
+    return max(last_number - first_number + 1, 0)
+
+def highest_spot_number(lot_id):
+    """Return the largest N among a lot's P<N> spots, 0 if it has none"""
+    number = db.cast(db.func.substr(ParkingSpot.spot_number, 2), db.Integer)
+    return db.session.query(db.func.coalesce(db.func.max(number), 0)).filter(ParkingSpot.lot_id == lot_id).scalar()
+
+def remove_spare_spots(lot_id, keep_available):
+    """Bulk-delete the available spots after the first keep_available ones; returns how many went.
+
+    Spots that appear in any booking, archived ones included, are kept so booking history
+    never loses its spot.
+    """
+    spare = db.select(ParkingSpot.id).\
+        where(ParkingSpot.lot_id == lot_id, ParkingSpot.is_available == True).\
+        order_by(ParkingSpot.id).offset(keep_available).subquery()
+
+    result = db.session.execute(
+        db.delete(ParkingSpot).
+        where(ParkingSpot.id.in_(db.select(spare.c.id)), ~spot_has_bookings()).
+        execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+def count_spot_availability():
+    """Return {lot_id: (available, occupied)} counted directly from parking_spots"""
+    rows = db.session.query(
+        ParkingSpot.lot_id,
+        db.func.sum(db.case((ParkingSpot.is_available == True, 1), else_=0)),
+        db.func.sum(db.case((ParkingSpot.is_available == True, 0), else_=1))
+    ).group_by(ParkingSpot.lot_id)
+    return {lot_id: (available, occupied) for lot_id, available, occupied in rows}
+
+def reconcile_lot_occupancy():
+    """Recompute every lot's counters from parking_spots and return the drift found"""
+    actual = count_spot_availability()
+    stored = {row.lot_id: row for row in LotOccupancy.query.all()}
+
+    drift = []
+    for (lot_id,) in db.session.query(ParkingLot.id).order_by(ParkingLot.id):
+        available, occupied = actual.get(lot_id, (0, 0))
+        row = stored.get(lot_id)
+        if row is None:
+            row = LotOccupancy(lot_id=lot_id, available_count=0, occupied_count=0)
+            db.session.add(row)
+        if (row.available_count, row.occupied_count) != (available, occupied):
+            drift.append((lot_id, row.available_count, row.occupied_count, available, occupied))
+            row.available_count = available
+            row.occupied_count = occupied
+
+    db.session.commit()
+    if drift:
+        versions.bump('availability')
+    return drift
+
+@app.cli.command('reconcile-occupancy')
+def reconcile_occupancy_command():
+    """Recompute lot_occupancy counters and report any drift."""
+    drift = reconcile_lot_occupancy()
+    for lot_id, old_available, old_occupied, available, occupied in drift:
+        print(f'Lot {lot_id}: available {old_available} -> {available}, occupied {old_occupied} -> {occupied}')
+    print(f'{len(drift)} lot(s) corrected.')
+
+def booking_now():
+    """The current time on the clock booking times are stored in: the naive local wall-clock time
+    users type into the booking form, so the server's time zone (TZ) must be the lots' time zone"""
+    return datetime.now()
+
+# Booking expiry: active bookings past their exit_time are completed and their spots freed
+EXPIRY_BATCH_SIZE = 500
+
+def complete_bookings(booking_ids, now=None):
+    """Complete the still-active bookings among booking_ids (a list or an id subquery) and free their spots.
+
+    Returns the (spot_id, exit_time, user_id) rows of the bookings this call completed. A spot
+    stays occupied while another active booking on it has already started by now.
+
+    Every step is conditional on the current row state, so a user release and any number of
+    expiry workers racing over the same booking complete it and free its spot exactly once.
+    """
+    completed = db.session.execute(
+        db.update(Booking).
+        where(Booking.id.in_(booking_ids), Booking.status == 'active').
+        values(status='completed').
+        returning(Booking.spot_id, Booking.exit_time, Booking.user_id),
+        execution_options={'synchronize_session': False}
+    ).all()
+    if not completed:
+        return completed
+
+    still_held = db.select(Booking.id).where(Booking.spot_id == ParkingSpot.id, Booking.status == 'active',
+                                             Booking.entry_time <= (now or booking_now())).exists()
+    freed = db.session.execute(
+        db.update(ParkingSpot).
+        where(ParkingSpot.id.in_({row.spot_id for row in completed}),
+              ParkingSpot.is_available == False, ~still_held).
+        values(is_available=True).
+        returning(ParkingSpot.lot_id),
+        execution_options={'synchronize_session': False}
+    ).all()
+    for lot_id, count in Counter(lot_id for (lot_id,) in freed).items():
+        adjust_occupancy(lot_id, available=count, occupied=-count)
+    return completed
+
+def overdue_bookings_query(now):
+    """Ids of active bookings whose exit_time has passed, most overdue first (served by ix_bookings_status_exit_entry)"""
+    return db.session.query(Booking.id).\
+        filter(Booking.status == 'active', Booking.exit_time <= now).\
+        order_by(Booking.exit_time)
+
+def expire_overdue_bookings(now=None, batch_size=EXPIRY_BATCH_SIZE, on_batch=None):
+    """Complete every overdue booking, one committed transaction per batch; returns how many expired.
+
+    on_batch(size, lag_seconds) is called after each batch with how long its oldest booking was overdue.
+    """
+    now = now or booking_now()
+    expired = 0
+    while True:
+        # Selecting the batch inside the UPDATE takes the write lock first, so concurrent
+        # workers queue on busy_timeout instead of failing on a stale read snapshot
+        completed = complete_bookings(overdue_bookings_query(now).limit(batch_size).scalar_subquery(), now)
+        db.session.commit()
+        expired += len(completed)
+        versions.bump('users', *{user_stamp(row.user_id) for row in completed})
+        if completed and on_batch:
+            oldest_exit = min(row.exit_time for row in completed)
+            on_batch(len(completed), (now - oldest_exit).total_seconds())
+        if len(completed) < batch_size:
+            break
+    if expired:
+        invalidate_admin_stats()
+    return expired
+
+def occupy_started_bookings(now=None):
+    """Mark the spots of active bookings whose window has begun as occupied; returns how many were marked.
+
+    Future bookings leave their spot available until then, so this runs after every expiry sweep.
+    """
+    now = now or booking_now()
+    started = db.select(Booking.spot_id).where(Booking.status == 'active', Booking.exit_time > now,
+                                               Booking.entry_time <= now)
+    occupied = db.session.execute(
+        db.update(ParkingSpot).
+        where(ParkingSpot.id.in_(started), ParkingSpot.is_available == True).
+        values(is_available=False).
+        returning(ParkingSpot.lot_id),
+        execution_options={'synchronize_session': False}
+    ).all()
+    for lot_id, count in Counter(lot_id for (lot_id,) in occupied).items():
+        adjust_occupancy(lot_id, available=-count, occupied=count)
+    db.session.commit()
+    if occupied:
+        invalidate_admin_stats()
+    return len(occupied)
+
+def _run_booking_expiry(job):
+    with app.app_context():
+        now = booking_now()
+        expire_overdue_bookings(now, on_batch=job.record_batch)
+        occupy_started_bookings(now)
+
+booking_expiry_job = PeriodicJob('booking-expiry', _run_booking_expiry, app.config['BOOKING_EXPIRY_INTERVAL'])
+
+def start_booking_expiry():
+    """Start the in-process expiry worker unless it is disabled or already running"""
+    if app.config['BOOKING_EXPIRY_INTERVAL'] > 0:
+        return booking_expiry_job.start()
+    return False
+
+@app.cli.command('expire-bookings')
+@click.option('--batch-size', type=int, default=EXPIRY_BATCH_SIZE, show_default=True)
+@click.option('--watch', is_flag=True, help='Keep running, sweeping every --interval seconds.')
+@click.option('--interval', type=float, default=60, show_default=True)
+def expire_bookings_command(batch_size, watch, interval):
+    """Complete overdue active bookings and free their spots."""
+    while True:
+        now = booking_now()
+        expired = expire_overdue_bookings(now, batch_size=batch_size)
+        started = occupy_started_bookings(now)
+        print(f'{now:%Y-%m-%d %H:%M:%S} {expired} booking(s) expired, {started} spot(s) occupied by starting bookings.')
+        if not watch:
+            return
+        time.sleep(interval)
+
+# Pricing: each lot's rules compiled into a weekly rate table, cached until lots or rules change
+def compile_rate_table(base_rate, rules):
+    """Build a RateTable from a lot's base price and its PricingRule rows (lot-specific and global)"""
+    time_rules = [TimeRule([int(day) for day in rule.days], rule.start_minute, rule.end_minute, rule.multiplier)
+                  for rule in rules if rule.kind == 'time']
+    surge_tiers = [(rule.min_occupancy, rule.multiplier) for rule in rules if rule.kind == 'surge']
+    return RateTable(base_rate, time_rules, surge_tiers)
+
+def rate_tables(lot_ids):
+    """{lot_id: RateTable} for the given lots, compiling any not cached in two queries"""
+    stamps = ('lots', 'pricing')
+    keys = {lot_id: ('rate_table', lot_id) + stamps + versions.get(*stamps) for lot_id in lot_ids}
+    tables = {lot_id: page_cache.get(key) for lot_id, key in keys.items()}
+    missing = [lot_id for lot_id, table in tables.items() if table is None]
+    if missing:
+        rules_by_lot = {}
+        for rule in PricingRule.query.filter(db.or_(PricingRule.lot_id.in_(missing), PricingRule.lot_id.is_(None))):
+            rules_by_lot.setdefault(rule.lot_id, []).append(rule)
+        for lot_id, base_rate in db.session.query(ParkingLot.id, ParkingLot.price_per_hour).\
+                filter(ParkingLot.id.in_(missing)):
+            tables[lot_id] = compile_rate_table(base_rate, rules_by_lot.get(None, []) + rules_by_lot.get(lot_id, []))
+            page_cache.set(keys[lot_id], tables[lot_id])
+    return {lot_id: table for lot_id, table in tables.items() if table is not None}
+
+def lot_occupancies(lot_ids):
+    """{lot_id: occupied share (0-1)} from the lot_occupancy counters"""
+    rows = db.session.query(LotOccupancy).filter(LotOccupancy.lot_id.in_(lot_ids))
+    return {row.lot_id: Decimal(row.occupied_count) / (row.available_count + row.occupied_count)
+            for row in rows if row.available_count + row.occupied_count}
+
+# Most lots a single /api/quotes call may price
+QUOTE_BATCH_LIMIT = 200
+
+def quote_lots(lot_ids, entry_time, exit_time):
+    """Price one stay at many lots at their current occupancy: {lot_id: Decimal}"""
+    return quote_many(rate_tables(lot_ids), entry_time, exit_time, lot_occupancies(lot_ids))
+
+# Batch bookings: one transaction books a spot for every vehicle in a fleet, or none of them
+BATCH_BOOKING_LIMIT = 1000
+# Lots sharing this many leading pincode digits (the same sorting district) count as nearby
+NEARBY_PINCODE_DIGITS = 3
+
+def bookable_spot_counts(lot_ids, start, end):
+    """{lot_id: spots a booking for [start, end) could take}, for lots with any"""
+    return dict(bookable_spots(lot_ids, start, end, booking_now()).
+                group_by(ParkingSpot.lot_id).with_entities(ParkingSpot.lot_id, db.func.count(ParkingSpot.id)).all())
+
+def nearby_lot_ids(lot_id):
+    """Other lots in the lot's pincode district, emptiest right now first; a future window may fit even a full lot"""
+    pincode = db.session.query(ParkingLot.pincode).filter(ParkingLot.id == lot_id).scalar()
+    if not pincode:
+        return []
+    rows = db.session.query(ParkingLot.id).\
+        join(LotOccupancy, LotOccupancy.lot_id == ParkingLot.id).\
+        filter(pincode_prefix_filter(pincode[:NEARBY_PINCODE_DIGITS]), ParkingLot.id != lot_id).\
+        order_by(LotOccupancy.available_count.desc()).\
+        limit(QUOTE_BATCH_LIMIT - 1)
+    return [nearby_id for (nearby_id,) in rows]
+
+def book_vehicles(user_id, vehicles, lot_ids, entry_time, exit_time):
+    """Book a spot for every vehicle, filling the lots in order, in the current transaction.
+
+    Returns [(booking_id, vehicle, lot_id, spot_number, total_cost)] with nothing committed yet,
+    or None after rolling back every claim when the lots cannot take the whole batch.
+    """
+    # Every lot is priced at the occupancy the user saw, before any spot is taken
+    quotes = quote_lots(lot_ids, entry_time, exit_time)
+    allocations = []
+    for lot_id in lot_ids:
+        if lot_id in quotes and len(allocations) < len(vehicles):
+            allocations += [(lot_id, spot_id, spot_number)
+                            for spot_id, spot_number in
+                            claim_spots(lot_id, len(vehicles) - len(allocations), entry_time, exit_time)]
+    if len(allocations) < len(vehicles):
+        db.session.rollback()
+        return None
+
+    rows = [{'user_id': user_id, 'spot_id': spot_id, 'vehicle_no': vehicle.vehicle_no, 'entry_time': entry_time,
+             'exit_time': exit_time, 'total_cost': quotes[lot_id]}
+            for vehicle, (lot_id, spot_id, _) in zip(vehicles, allocations)]
+    # Each spot is claimed once, so it identifies its booking without forcing row-by-row ordered inserts
+    booking_ids = dict(db.session.execute(db.insert(Booking).returning(Booking.spot_id, Booking.id), rows).all())
+    return [(booking_ids[spot_id], vehicle, lot_id, spot_number, quotes[lot_id])
+            for vehicle, (lot_id, spot_id, spot_number) in zip(vehicles, allocations)]
+
+def parse_clock(value):
+    """Minutes past midnight from HH:MM; 24:00 is allowed as the end of the day"""
+    try:
+        hours, minutes = (int(part) for part in value.split(':'))
+    except ValueError:
+        raise ValueError(f'{value} is not a time of day as HH:MM') from None
+    if not (0 <= minutes < 60 and (0 <= hours < 24 or (hours, minutes) == (24, 0))):
+        raise ValueError(f'{value} is not a time of day')
+    return hours * 60 + minutes
+
+def _form_text(form, name, default=None):
+    """A submitted field as text; JSON numbers are accepted, a missing field or any other JSON type raises ValueError"""
+    value = form.get(name, default)
+    if value is None:
+        raise ValueError(f'{name} is required')
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f'{name} must be a string or a number')
+    return str(value)
+
+def _form_decimal(form, name, places=3):
+    """A submitted field as a finite Decimal rounded to places decimals, raising ValueError otherwise"""
+    try:
+        value = Decimal(_form_text(form, name))
+        if value.is_finite():
+            return value.quantize(Decimal(1).scaleb(-places))
+    except InvalidOperation:
+        pass
+    raise ValueError(f'{name} must be a finite number')
+
+def pricing_rule_from_form(form):
+    """A new PricingRule from submitted fields (form or JSON), raising ValueError on anything invalid"""
+    kind = _form_text(form, 'kind', 'time')
+    if kind not in ('time', 'surge'):
+        raise ValueError('kind must be time or surge')
+    # Bounded by the Numeric(6, 3) and Numeric(4, 3) columns they are stored in
+    multiplier = _form_decimal(form, 'multiplier')
+    if not 0 < multiplier < 1000:
+        raise ValueError('multiplier must be above 0 and below 1000')
+    lot_id = int(_form_text(form, 'lot_id')) if form.get('lot_id') not in (None, '') else None
+    if lot_id is not None and db.session.get(ParkingLot, lot_id) is None:
+        raise ValueError(f'parking lot {lot_id} does not exist')
+
+    rule = PricingRule(lot_id=lot_id, name=_form_text(form, 'name', '') or kind, kind=kind, multiplier=multiplier)
+    if kind == 'time':
+        rule.days = _form_text(form, 'days', '0123456')
+        if not rule.days or any(day not in '0123456' for day in rule.days):
+            raise ValueError('days must be weekday digits, Monday is 0')
+        rule.start_minute = parse_clock(_form_text(form, 'start', '00:00'))
+        rule.end_minute = parse_clock(_form_text(form, 'end', '24:00'))
+        if rule.start_minute == rule.end_minute:
+            raise ValueError('start and end must differ')
+    else:
+        rule.min_occupancy = _form_decimal(form, 'min_occupancy')
+        if not 0 <= rule.min_occupancy <= 1:
+            raise ValueError('min_occupancy must be between 0 and 1')
+    return rule
+
+# Analytics rollups: lot x hour totals kept up to date from bookings, read by the admin reports
+ROLLUP_BATCH_SIZE = 20000
+
+def booking_rollup_rows(bookings):
+    """Aggregate (id, lot_id, entry_time, exit_time, total_cost) rows into LotHourlyStats deltas"""
+    totals = {}
+    for _, lot_id, entry_time, exit_time, total_cost in bookings:
+        entry_hour = entry_time.replace(minute=0, second=0, microsecond=0)
+        row = totals.setdefault((lot_id, entry_hour), [0, Decimal(0), 0])
+        row[0] += 1
+        row[1] += total_cost
+        # Spread the booked window over the hours it overlaps
+        hour = entry_hour
+        while hour < exit_time:
+            next_hour = hour + timedelta(hours=1)
+            minutes = int((min(exit_time, next_hour) - max(entry_time, hour)).total_seconds() // 60)
+            if minutes:
+                totals.setdefault((lot_id, hour), [0, Decimal(0), 0])[2] += minutes
+            hour = next_hour
+    return [{'lot_id': lot_id, 'hour': hour, 'bookings': count, 'revenue': revenue, 'occupied_minutes': minutes}
+            for (lot_id, hour), (count, revenue, minutes) in totals.items()]
+
+def daily_rollup_rows(hourly_rows):
+    """Sum hourly deltas into LotDailyStats deltas"""
+    totals = {}
+    for row in hourly_rows:
+        day = row['hour'].replace(hour=0)
+        total = totals.setdefault((row['lot_id'], day), [0, Decimal(0), 0])
+        total[0] += row['bookings']
+        total[1] += row['revenue']
+        total[2] += row['occupied_minutes']
+    return [{'lot_id': lot_id, 'day': day, 'bookings': count, 'revenue': revenue, 'occupied_minutes': minutes}
+            for (lot_id, day), (count, revenue, minutes) in totals.items()]
+
+def _add_to_rollup(model, period, rows, connection=None):
+    """Add deltas to a rollup table, inserting rows for new lot/period pairs"""
+    executor = connection or db.session
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:  # SQLite, the only other database engine_options accepts
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    statement = upsert(model)
+    statement = statement.on_conflict_do_update(
+        index_elements=['lot_id', period],
+        set_={
+            'bookings': model.bookings + statement.excluded.bookings,
+            'revenue': model.revenue + statement.excluded.revenue,
+            'occupied_minutes': model.occupied_minutes + statement.excluded.occupied_minutes
+        })
+    executor.execute(statement, rows)
+
+def _rollup_select(model):
+    """(id, lot_id, entry_time, exit_time, total_cost) rows of bookings or archived bookings"""
+    return db.select(model.id, ParkingSpot.lot_id, model.entry_time, model.exit_time, model.total_cost).\
+        outerjoin(ParkingSpot, model.spot_id == ParkingSpot.id)
+
+def _rollup_batch(model, after_id, batch_size, connection=None):
+    """The next batch of rollup rows after after_id, in id order"""
+    return (connection or db.session).execute(
+        _rollup_select(model).where(model.id > after_id).order_by(model.id).limit(batch_size)
+    ).all()
+
+def _fold_into_rollups(batch, connection=None):
+    rows = booking_rollup_rows(row for row in batch if row.lot_id is not None)
+    if rows:
+        _add_to_rollup(LotHourlyStats, 'hour', rows, connection)
+        _add_to_rollup(LotDailyStats, 'day', daily_rollup_rows(rows), connection)
+
+def refresh_booking_rollups(batch_size=ROLLUP_BATCH_SIZE, max_batches=None):
+    """Fold bookings not rolled up yet into the rollups, one committed batch at a time.
+
+    Each batch starts by writing the rollup's state row, which takes the write lock (or the
+    row lock on PostgreSQL) before reading, and flags its bookings rolled_up in the same
+    transaction, so concurrent refreshes never count a booking twice. A flag rather than an
+    id watermark, because PostgreSQL can commit a booking after one with a higher id. Stops
+    after max_batches batches when given. Returns the number of bookings folded in.
+    """
+    if db.session.get(RollupState, 'bookings') is None:
+        db.session.add(RollupState(name='bookings'))
+        try:
+            db.session.commit()
+        except db.exc.IntegrityError:
+            db.session.rollback()
+
+    folded = 0
+    batches = 0
+    while True:
+        db.session.execute(db.update(RollupState).where(RollupState.name == 'bookings').
+                           values(updated_at=datetime.utcnow()))
+        batch = db.session.execute(
+            _rollup_select(Booking).where(Booking.rolled_up == db.false()).order_by(Booking.id).limit(batch_size)
+        ).all()
+        if not batch:
+            db.session.commit()
+            return folded
+
+        _fold_into_rollups(batch)
+        db.session.execute(db.update(Booking).where(Booking.id.in_([row.id for row in batch])).
+                           values(rolled_up=True).execution_options(synchronize_session=False))
+        db.session.commit()
+        folded += len(batch)
+        batches += 1
+        if len(batch) < batch_size or batches == max_batches:
+            return folded
+
+def rebuild_booking_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    """Empty the rollups and fold in every booking again, archived ones included"""
+    db.session.execute(db.delete(LotHourlyStats))
+    db.session.execute(db.delete(LotDailyStats))
+    db.session.execute(db.update(Booking).values(rolled_up=False).execution_options(synchronize_session=False))
+    db.session.commit()
+
+    # With no booking rolled up the archival job moves nothing, so no booking is counted twice or missed
+    folded = 0
+    last_id = 0
+    while True:
+        batch = _rollup_batch(ArchivedBooking, last_id, batch_size)
+        if not batch:
+            return folded + refresh_booking_rollups(batch_size)
+        _fold_into_rollups(batch)
+        db.session.commit()
+        folded += len(batch)
+        last_id = batch[-1].id
+
+# Bookings a request folds in itself after committing; any larger backlog is left to the catch-up job
+ROLLUP_REQUEST_BATCH_SIZE = BATCH_BOOKING_LIMIT
+
+def refresh_rollups_after_booking():
+    """Fold just-committed bookings into the rollups, then drop the cached dashboard figures.
+
+    The booking is already committed, so a failure here (a lock timeout, say) is logged and
+    left to the catch-up job instead of reaching the user, who would book again on retry.
+    """
+    try:
+        folded = refresh_booking_rollups(ROLLUP_REQUEST_BATCH_SIZE, max_batches=1)
+        if folded == ROLLUP_REQUEST_BATCH_SIZE:
+            booking_rollup_job.trigger()
+    except db.exc.SQLAlchemyError:
+        db.session.rollback()
+        app.logger.exception('Rollup refresh after booking failed; the catch-up job will fold it in')
+        booking_rollup_job.trigger()
+    invalidate_admin_stats()
+
+def _run_booking_rollups(job):
+    with app.app_context():
+        folded = refresh_booking_rollups()
+        if folded:
+            job.record_batch(folded, 0)
+
+booking_rollup_job = PeriodicJob('booking-rollups', _run_booking_rollups, app.config['ROLLUP_INTERVAL'])
+
+def start_booking_rollups():
+    """Start the in-process rollup catch-up job unless it is disabled or already running"""
+    if app.config['ROLLUP_INTERVAL'] > 0:
+        return booking_rollup_job.start()
+    return False
+
+@app.cli.command('rollup-bookings')
+@click.option('--rebuild', is_flag=True, help='Drop the rollups and backfill them from every booking.')
+@click.option('--batch-size', type=int, default=ROLLUP_BATCH_SIZE, show_default=True)
+def rollup_bookings_command(rebuild, batch_size):
+    """Fold new bookings into the analytics rollups, or backfill them from scratch."""
+    folded = rebuild_booking_rollups(batch_size) if rebuild else refresh_booking_rollups(batch_size)
+    print(f'{folded} booking(s) folded into the rollups.')
+
+ROLLUP_GROUPS = ('hour', 'day', 'lot')
+
+def rollup_report(start, end, group='day', lot_id=None):
+    """Bookings, revenue and booked spot-minutes between start and end, read from the rollups.
+
+    Grouped per lot by hour or day, or per lot over the whole range when group is 'lot'.
+    Day and lot reports read the daily rollup, so they count whole days.
+    """
+    model, period = (LotHourlyStats, LotHourlyStats.hour) if group == 'hour' else (LotDailyStats, LotDailyStats.day)
+    keys = [model.lot_id] if group == 'lot' else [period, model.lot_id]
+    query = db.session.query(*keys, db.func.sum(model.bookings), db.func.sum(model.revenue),
+                             db.func.sum(model.occupied_minutes)).\
+        filter(period >= start, period < end)
+    if lot_id is not None:
+        query = query.filter(model.lot_id == lot_id)
+
+    report = []
+    for *key, bookings, revenue, minutes in query.group_by(*keys).order_by(*keys):
+        row = {'lot_id': key[-1], 'bookings': bookings, 'revenue': revenue, 'occupied_minutes': minutes}
+        if group != 'lot':
+            row['period'] = key[0].isoformat() if group == 'hour' else key[0].date().isoformat()
+        report.append(row)
+    return report
+
+# Archival: finished bookings move to bookings_archive so the hot table only holds recent history.
+# Everything reads the hot table; history views union the archive in when asked with ?archived=1.
+ARCHIVE_BATCH_SIZE = 5000
+ARCHIVED_STATUSES = ('completed', 'cancelled')
+
+def archivable_bookings_query(before):
+    """Ids of finished bookings that ended before `before`, found through the status/exit index"""
+    return db.session.query(Booking.id).filter(Booking.status.in_(ARCHIVED_STATUSES), Booking.exit_time < before)
+
+def archive_bookings(before, batch_size=ARCHIVE_BATCH_SIZE, on_batch=None):
+    """Move finished bookings that ended before `before` into bookings_archive, one committed batch per move.
+
+    Only bookings the rollups have already counted move, so the rollups never miss one.
+    on_batch(size, lag_seconds) is called after each batch with how long before `before`
+    its oldest booking ended. Returns how many bookings moved.
+    """
+    # SQLite hands out max(id) + 1 to new rows, so the newest booking stays put and archived ids are never reused
+    newest = db.select(db.func.max(Booking.id)).scalar_subquery()
+    moved = 0
+    while True:
+        # Selecting the batch inside the DELETE takes the write lock first, as the expiry sweep does
+        batch = archivable_bookings_query(before).filter(Booking.rolled_up == db.true(), Booking.id < newest).\
+            limit(batch_size)
+        rows = db.session.execute(
+            db.delete(Booking).
+            where(Booking.id.in_(batch.subquery().select())).
+            returning(*Booking.__table__.columns).
+            execution_options(synchronize_session=False)
+        ).mappings().all()
+        if rows:
+            archived_at = datetime.utcnow()
+            db.session.execute(db.insert(ArchivedBooking), [dict(row, archived_at=archived_at) for row in rows])
+        db.session.commit()
+        moved += len(rows)
+        if rows:
+            versions.bump(*{user_stamp(row['user_id']) for row in rows})
+            if on_batch:
+                on_batch(len(rows), (before - min(row['exit_time'] for row in rows)).total_seconds())
+        if len(rows) < batch_size:
+            return moved
+
+def _run_booking_archival(job):
+    with app.app_context():
+        archive_bookings(booking_now() - timedelta(days=app.config['ARCHIVE_AFTER_DAYS']),
+                         on_batch=job.record_batch)
+
+booking_archival_job = PeriodicJob('booking-archival', _run_booking_archival, app.config['ARCHIVE_INTERVAL'])
+
+def start_booking_archival():
+    """Start the in-process archival job unless it is disabled or already running"""
+    if app.config['ARCHIVE_INTERVAL'] > 0:
+        return booking_archival_job.start()
+    return False
+
+@app.cli.command('archive-bookings')
+@click.option('--older-than-days', type=float, default=None,
+              help='Archive bookings that ended this many days ago. Defaults to ARCHIVE_AFTER_DAYS.')
+@click.option('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, show_default=True)
+def archive_bookings_command(older_than_days, batch_size):
+    """Move finished bookings out of the hot bookings table into bookings_archive."""
+    if older_than_days is None:
+        older_than_days = app.config['ARCHIVE_AFTER_DAYS']
+    refresh_booking_rollups()
+    moved = archive_bookings(booking_now() - timedelta(days=older_than_days), batch_size)
+    print(f'{moved} booking(s) archived.')
+
+def booking_history(archived=False):
+    """The entity history views query: Booking itself, or Booking over the hot and archived rows together"""
+    if not archived:
+        return Booking
+    names = [column.name for column in Booking.__table__.columns]
+
+    def columns(table):
+        # Databases from before migration 4 keep total_cost as FLOAT in bookings, and SQLite only
+        # pushes the ORDER BY and LIMIT into a UNION ALL whose arms agree on every column's affinity
+        return [db.cast(table.c[name], table.c[name].type).label(name) if name == 'total_cost' else table.c[name]
+                for name in names]
+
+    rows = db.union_all(db.select(*columns(Booking.__table__)), db.select(*columns(ArchivedBooking.__table__)))
+    return db.aliased(Booking, rows.subquery('booking_history'))
+
+# Lot search: pincode prefixes through ix_parking_lots_pincode, name/address through an FTS5 index
+LOTS_PAGE_SIZE = 24
+
+# External-content FTS5 table over parking_lots, kept in sync by triggers so every write path is covered
+LOT_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS parking_lots_fts USING fts5("
+    "name, address, content='parking_lots', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS parking_lots_fts_insert AFTER INSERT ON parking_lots BEGIN "
+    "INSERT INTO parking_lots_fts(rowid, name, address) VALUES (new.id, new.name, new.address); END",
+    "CREATE TRIGGER IF NOT EXISTS parking_lots_fts_delete AFTER DELETE ON parking_lots BEGIN "
+    "INSERT INTO parking_lots_fts(parking_lots_fts, rowid, name, address) "
+    "VALUES ('delete', old.id, old.name, old.address); END",
+    "CREATE TRIGGER IF NOT EXISTS parking_lots_fts_update AFTER UPDATE OF name, address ON parking_lots BEGIN "
+    "INSERT INTO parking_lots_fts(parking_lots_fts, rowid, name, address) "
+    "VALUES ('delete', old.id, old.name, old.address); "
+    "INSERT INTO parking_lots_fts(rowid, name, address) VALUES (new.id, new.name, new.address); END",
+    "INSERT INTO parking_lots_fts(parking_lots_fts) VALUES ('rebuild')"
+]
+
+# Not part of db.metadata, so create_all()/drop_all() leave the virtual table to the migration
+lot_search_table = db.table('parking_lots_fts', db.column('rowid'), db.column('rank'))
+
+def lot_search_enabled():
+    return db.engine.dialect.name == 'sqlite'
+
+def _create_lot_search_index(connection):
+    """Create the FTS5 lot index and its sync triggers, then index the existing lots"""
+    if connection.dialect.name != 'sqlite':
+        return
+    for statement in LOT_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+
+def pincode_prefix_filter(prefix):
+    """A range condition matching pincodes that start with prefix, which SQLite can answer from the index"""
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return db.and_(ParkingLot.pincode >= prefix, ParkingLot.pincode < upper_bound)
+
+def lot_match_expression(words):
+    """Turn search words into an FTS5 query: every word must match as a prefix"""
+    return ' '.join(f'"{word}"*' for word in words)
+
+def search_lots_query(text='', pincode=''):
+    """Lots matching a name/address search and a pincode prefix, best text matches first"""
+    query = ParkingLot.query
+    if pincode:
+        query = query.filter(pincode_prefix_filter(pincode))
+
+    words = re.findall(r'\w+', text)
+    if words and lot_search_enabled():
+        query = query.join(lot_search_table, lot_search_table.c.rowid == ParkingLot.id).\
+            filter(db.text('parking_lots_fts MATCH :match').bindparams(match=lot_match_expression(words))).\
+            order_by(lot_search_table.c.rank)
+    else:
+        for word in words:
+            query = query.filter(db.or_(ParkingLot.name.ilike(f'%{word}%'), ParkingLot.address.ilike(f'%{word}%')))
+    return query
+
+def search_lots(text='', pincode='', page=1, page_size=LOTS_PAGE_SIZE):
+    """One page of search results with availability, and whether another page follows"""
+    lots_data = lots_with_availability(search_lots_query(text, pincode),
+                                       limit=page_size + 1, offset=(page - 1) * page_size)
+    return lots_data[:page_size], len(lots_data) > page_size
+
+# Schema migrations
+def _index_column_names(index):
+    """Names of the columns an index covers or, for a partial index, filters on"""
+    names = {column.name for column in index.columns}
+    for option in ('sqlite_where', 'postgresql_where'):
+        if index.dialect_kwargs.get(option) is not None:
+            names.update(element.name for element in iterate(index.dialect_kwargs[option])
+                         if isinstance(element, db.Column))
+    return names
+
+def _create_model_indexes(connection):
+    """Create any index declared on the models that the database does not have yet.
+
+    Indexes over columns the tables don't have yet are left to the later step that adds them.
+    """
+    inspector = db.inspect(connection)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if not _index_column_names(index) <= existing:
+                continue
+            if all(isinstance(expression, db.Column) for expression in index.expressions):
+                index.create(connection, checkfirst=True)
+            else:
+                # Expression indexes are not reflected, so checkfirst cannot see them; let the database skip them
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+def _backfill_booking_rollups(connection):
+    """Count every existing booking, archived ones included, into the rollups and flag them rolled up"""
+    connection.execute(db.delete(LotHourlyStats))
+    connection.execute(db.delete(LotDailyStats))
+    connection.execute(db.delete(RollupState).where(RollupState.name == 'bookings'))
+    for model in (ArchivedBooking, Booking):
+        after_id = 0
+        while True:
+            batch = _rollup_batch(model, after_id, ROLLUP_BATCH_SIZE, connection)
+            if not batch:
+                break
+            _fold_into_rollups(batch, connection)
+            after_id = batch[-1].id
+    connection.execute(db.update(Booking).values(rolled_up=True))
+    connection.execute(db.insert(RollupState).values(name='bookings', updated_at=datetime.utcnow()))
+
+def _flag_rolled_up_bookings(connection):
+    """Replace the rollup id watermark with a rolled_up flag on each booking, then recount the rollups.
+
+    The watermark skipped bookings that PostgreSQL committed after a higher id, so the counts
+    it left behind are rebuilt rather than trusted.
+    """
+    inspector = db.inspect(connection)
+    for table, default in (('bookings', 'false'), ('bookings_archive', 'true')):
+        if 'rolled_up' not in {column['name'] for column in inspector.get_columns(table)}:
+            connection.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN rolled_up BOOLEAN NOT NULL DEFAULT {default}')
+    if 'last_id' in {column['name'] for column in inspector.get_columns('rollup_state')}:
+        connection.exec_driver_sql('ALTER TABLE rollup_state DROP COLUMN last_id')
+    _create_model_indexes(connection)
+    _backfill_booking_rollups(connection)
+
+def _superseded(connection):
+    """A step whose work a later step now does; kept so the numbering never changes"""
+
+def _backfill_lot_occupancy(connection):
+    """Recount every lot's lot_occupancy counters from parking_spots, creating the rows lots are missing"""
+    counts = db.select(
+        ParkingLot.id,
+        db.func.coalesce(db.func.sum(db.case((ParkingSpot.is_available == True, 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case((ParkingSpot.id.is_(None), 0), (ParkingSpot.is_available == True, 0),
+                                              else_=1)), 0)
+    ).outerjoin(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id).group_by(ParkingLot.id)
+    connection.execute(db.delete(LotOccupancy))
+    connection.execute(db.insert(LotOccupancy).from_select(['lot_id', 'available_count', 'occupied_count'], counts))
+
+def _widen_spot_status_index(connection):
+    """Replace the (spot_id, status) index with one that also covers the booked window"""
+    connection.exec_driver_sql('DROP INDEX IF EXISTS ix_bookings_spot_status')
+    _create_model_indexes(connection)
+
+def _money_as_decimal(connection):
+    """Round stored prices and costs to the paisa; on PostgreSQL also retype the columns as NUMERIC"""
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('ALTER TABLE parking_lots ALTER COLUMN price_per_hour TYPE NUMERIC(10, 2)')
+        connection.exec_driver_sql('ALTER TABLE bookings ALTER COLUMN total_cost TYPE NUMERIC(10, 2)')
+    connection.exec_driver_sql('UPDATE parking_lots SET price_per_hour = ROUND(price_per_hour, 2)')
+    connection.exec_driver_sql('UPDATE bookings SET total_cost = ROUND(total_cost, 2)')
+
+# Applied in order by migrate_db(); append new steps, never renumber old ones
+MIGRATIONS = [
+    (1, 'Indexes for hot filter and join columns', _create_model_indexes),
+    (2, 'Full-text index over lot name and address', _create_lot_search_index),
+    (3, 'Index for active bookings per spot', _create_model_indexes),
+    (4, 'Money columns as exact decimals', _money_as_decimal),
+    (5, 'Case-insensitive username and email indexes', _create_model_indexes),
+    (6, 'Backfill the booking analytics rollups', _superseded),
+    (7, 'Per-spot window index for free spot lookups', _widen_spot_status_index),
+    (8, 'Backfill lot occupancy counters', _backfill_lot_occupancy),
+    (9, 'Rolled-up flag on bookings in place of the rollup watermark', _flag_rolled_up_bookings),
+    (10, 'Index for archived bookings per spot', _create_model_indexes),
+]
+
+def migrate_db():
+    """Create missing tables, then apply pending MIGRATIONS and return the ones applied"""
+    db.create_all()
+    applied = {version for (version,) in db.session.query(SchemaMigration.version)}
+    db.session.close()
+
+    newly_applied = []
+    for version, name, upgrade in MIGRATIONS:
+        if version in applied:
+            continue
+        with db.engine.begin() as connection:
+            upgrade(connection)
+            connection.execute(db.insert(SchemaMigration).values(
+                version=version, name=name, applied_at=datetime.utcnow()))
+        newly_applied.append((version, name))
+    return newly_applied
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply pending schema migrations."""
+    newly_applied = migrate_db()
+    for version, name in newly_applied:
+        print(f'Applied migration {version}: {name}')
+    print(f'{len(newly_applied)} migration(s) applied.')
+
+def explain_query_plan(query):
+    """Return the EXPLAIN QUERY PLAN detail lines for an ORM query (SQLite only)"""
+    # render_postcompile expands IN lists into one placeholder per value
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)
+    return [row[-1] for row in rows]
+
+def hot_query_plans():
+    """The hot queries paired with the indexes any one of which they must use"""
+    now = booking_now()
+    return [
+        ('login by username', User.query.filter(db.func.lower(User.username) == ''), ('ix_users_username_lower',)),
+        ('login by email', User.query.filter(db.func.lower(User.email) == ''), ('ix_users_email_lower',)),
+        ('dashboard recent bookings', user_bookings_query(0).limit(5), ('ix_bookings_user_created',)),
+        ('dashboard active count', Booking.query.filter_by(user_id=0, status='active'), ('ix_bookings_user_status',)),
+        ('my bookings', user_bookings_query(0), ('ix_bookings_user_created',)),
+        ('my bookings with archive', user_bookings_query(0, booking_history(True)),
+         ('ix_bookings_archive_user_created',)),
+        ('admin bookings with archive', all_bookings_query(booking_history(True)), ('ix_bookings_archive_created',)),
+        ('archivable bookings', archivable_bookings_query(now).limit(1), ('ix_bookings_status_exit_entry',)),
+        ('admin bookings', all_bookings_query(), ('ix_bookings_created_at',)),
+        ('admin bookings next page', bookings_before(all_bookings_query(), (now, 0)).limit(1),
+         ('ix_bookings_created_at',)),
+        ('my bookings next page', bookings_before(user_bookings_query(0), (now, 0)).limit(1),
+         ('ix_bookings_user_created',)),
+        ('delete_lot active check', lot_active_bookings_query(0),
+         ('ix_bookings_status_exit_entry', 'ix_bookings_spot_window')),
+        ('delete_lot history check', ParkingSpot.query.filter(ParkingSpot.lot_id == 0, spot_has_bookings()).limit(1),
+         ('ix_bookings_archive_spot',)),
+        ('user vehicles', Vehicle.query.filter_by(user_id=0), ('ix_vehicles_user_id',)),
+        ('lots by pincode', ParkingLot.query.filter_by(pincode=''), ('ix_parking_lots_pincode',)),
+        ('lots by pincode prefix', search_lots_query(pincode='56'), ('ix_parking_lots_pincode',)),
+        ('claim spot for window', bookable_spots([0], now, now, now).order_by(ParkingSpot.id).limit(1),
+         ('ix_bookings_spot_status_window',)),
+        ('window overlap', overlapping_bookings(now, now), ('ix_bookings_status_exit_entry',)),
+        ('bookings to roll up', Booking.query.filter(Booking.rolled_up == db.false()).order_by(Booking.id).limit(1),
+         ('ix_bookings_unrolled',)),
+        ('overdue bookings', overdue_bookings_query(now).limit(1), ('ix_bookings_status_exit_entry',)),
+        ('spot still held', Booking.query.filter_by(spot_id=0, status='active'), ('ix_bookings_spot_status_window',)),
+        ('free spots in window', free_spots_between(0, now, now), ('ix_bookings_spot_status_window',)),
+    ]
+
+def check_query_plans():
+    """Return a list of problems: full table scans, sorts without an index or a missing expected index"""
+    problems = []
+    for name, query, expected_indexes in hot_query_plans():
+        plan = explain_query_plan(query)
+        for line in plan:
+            if (line.startswith('SCAN ') and ' INDEX ' not in line) or 'TEMP B-TREE FOR ORDER BY' in line:
+                problems.append(f'{name}: {line}')
+        if not any(index in line for line in plan for index in expected_indexes):
+            problems.append(f'{name}: expected one of {", ".join(expected_indexes)} in {plan}')
+    return problems
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if a hot query stops using its index."""
+    problems = check_query_plans()
+    for problem in problems:
+        print(problem)
+    if problems:
+        raise SystemExit(1)
+    print('All hot queries use their indexes.')
+
+# Bulk import / export
+DATA_TABLES = {
+    'lots': ParkingLot,
+    'spots': ParkingSpot,
+    'vehicles': Vehicle,
+    'bookings': Booking,
+    'archived_bookings': ArchivedBooking,
+    'pricing_rules': PricingRule
+}
+DATA_FORMATS = ('csv', 'json')
+
+# Rows read per keyset batch on export, and inserted (and committed) per chunk on import
+EXPORT_BATCH_SIZE = 10000
+IMPORT_BATCH_SIZE = 5000
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serialisable')
+
+def iter_table_batches(model, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a model's table as lists of row tuples in id order, without building ORM objects"""
+    table = model.__table__
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(table).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+def iter_export(model, fmt):
+    """Yield the table serialised as CSV (with a header) or newline-delimited JSON, one batch at a time"""
+    columns = [column.name for column in model.__table__.columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(columns)
+
+    for rows in iter_table_batches(model):
+        if fmt == 'csv':
+            writer.writerows(rows)
+        else:
+            buffer.writelines(json.dumps(dict(zip(columns, row)), default=_export_value) + '\n' for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_import_records(stream, fmt):
+    """Yield dicts from a text stream of CSV (with header) or newline-delimited JSON"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+def _column_parser(column):
+    """Build a function turning a raw CSV/JSON value into the column's Python value"""
+    python_type = column.type.python_type
+    if python_type is datetime:
+        convert = lambda value: datetime.fromisoformat(value) if isinstance(value, str) else value
+    elif python_type is bool:
+        convert = lambda value: value.strip().lower() in ('1', 'true', 'yes', 'y') if isinstance(value, str) else bool(value)
+    elif python_type in (int, float, Decimal):
+        convert = python_type
+    else:
+        convert = lambda value: value
+
+    default = column.default
+    def parse(value):
+        if value is None or value == '':
+            if default is None:
+                return None
+            return default.arg(None) if default.is_callable else default.arg
+        return convert(value)
+    return parse
+
+def import_records(model, records, batch_size=IMPORT_BATCH_SIZE, provision_lot_spots=False):
+    """Insert records into a model's table in committed chunks; returns the number inserted"""
+    table = model.__table__
+    parsers = None
+    imported = 0
+    chunk = []
+
+    def flush(chunk):
+        if provision_lot_spots:
+            inserted = db.session.execute(table.insert().returning(table.c.id, table.c.capacity), chunk)
+            for lot_id, capacity in inserted.all():
+                provision_spots(lot_id, 1, capacity)
+        else:
+            db.session.execute(table.insert(), chunk)
+        db.session.commit()
+
+    for record in records:
+        if parsers is None:
+            # Unknown keys are ignored; columns missing from the file get their defaults
+            parsers = {column.name: _column_parser(column) for column in table.columns
+                       if column.name in record or column.name != 'id'}
+        # rolled_up says whether this database's rollups counted the row, so it always takes its default
+        chunk.append({name: parse(None if name == 'rolled_up' else record.get(name))
+                      for name, parse in parsers.items()})
+        if len(chunk) == batch_size:
+            flush(chunk)
+            imported += len(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+        imported += len(chunk)
+
+    if model in (ParkingLot, ParkingSpot):
+        reconcile_lot_occupancy()
+    elif model is Booking:
+        refresh_booking_rollups()
+    invalidate_admin_stats()
+    page_cache.invalidate()
+    return imported
+
+@app.cli.command('export-data')
+@click.argument('table', type=click.Choice(list(DATA_TABLES)))
+@click.option('--format', 'fmt', type=click.Choice(DATA_FORMATS), default='csv')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-')
+def export_data_command(table, fmt, output):
+    """Stream a table to a CSV or newline-delimited JSON file."""
+    for chunk in iter_export(DATA_TABLES[table], fmt):
+        output.write(chunk)
+
+@app.cli.command('import-data')
+@click.argument('table', type=click.Choice(list(DATA_TABLES)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(DATA_FORMATS), default=None,
+              help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+@click.option('--provision-spots', is_flag=True, help='Create P001.. spots for each imported lot.')
+def import_data_command(table, source, fmt, batch_size, provision_spots):
+    """Import a CSV or newline-delimited JSON file in committed batches."""
+    fmt = fmt or ('json' if source.name.endswith(('.json', '.jsonl', '.ndjson')) else 'csv')
+    imported = import_records(DATA_TABLES[table], iter_import_records(source, fmt), batch_size,
+                              provision_lot_spots=provision_spots and table == 'lots')
+    print(f'Imported {imported} {table}.')
+
 # Routes
 @app.route('/')
 def index():
     if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user and user.is_admin:
+        principal = current_principal()
+        if principal and principal.is_admin:
             return redirect(url_for('admin_dashboard'))
         else:
             return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
+def find_login_user(identifier):
+    """The user whose username, or else email, matches identifier ignoring case.
+
+    Two lookups on the lower() indexes instead of an OR across both columns; if lowercasing
+    makes older accounts collide, the one matching the exact spelling wins.
+    """
+    key = identifier.strip().lower()
+    users = User.query.filter(db.func.lower(User.username) == key).all()
+    if not users and '@' in key:
+        users = User.query.filter(db.func.lower(User.email) == key).all()
+    exact = [user for user in users if identifier in (user.username, user.email)]
+    return (exact or users or [None])[0]
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
 
-        # Try username first, then email
-        user = User.query.filter(
-            (User.username == username) | (User.email == username)
-        ).first()
+        user = find_login_user(username)
+        try:
+            verified = user is not None and password_hasher.verify(user.password, password)
+        except PasswordHasherBusy:
+            flash('Too many sign-ins at the moment, please try again in a few seconds.', 'error')
+            return render_template('login.html'), 503, {'Retry-After': '2'}
+
+        if verified:
+            if password_hasher.needs_rehash(user.password):
+                # Upgrade the stored hash to the configured parameters; the login goes ahead even if the pool is busy
+                try:
+                    user.password = password_hasher.hash(password)
+                    db.session.commit()
+                except PasswordHasherBusy:
+                    pass
 
-        if user and check_password_hash(user.password, password):
             session['user_id'] = user.id
             session['username'] = user.username
             session['is_admin'] = user.is_admin
@@ -163,16 +1700,22 @@ def register():
             flash('Passwords do not match!', 'error')
             return render_template('register.html', form_data=request.form)
 
-        # Check if username exists
-        if User.query.filter_by(username=username).first():
+        # Check if username exists, ignoring case since logins do
+        if User.query.filter(db.func.lower(User.username) == username.lower()).first():
             flash('Username already exists!', 'error')
             return render_template('register.html', form_data=request.form)
 
         # Check if email exists
-        if User.query.filter_by(email=email).first():
+        if User.query.filter(db.func.lower(User.email) == email.lower()).first():
             flash('Email already registered!', 'error')
             return render_template('register.html', form_data=request.form)
 
+        try:
+            password_hash = password_hasher.hash(password)
+        except PasswordHasherBusy:
+            flash('We are busy at the moment, please try again in a few seconds.', 'error')
+            return render_template('register.html', form_data=request.form), 503, {'Retry-After': '2'}
+
         # Create new user
         new_user = User(
             first_name=first_name,
@@ -181,11 +1724,13 @@ def register():
             email=email,
             address=address,
             pincode=pincode,
-            password=generate_password_hash(password)
+            password=password_hash
         )
 
         db.session.add(new_user)
         db.session.commit()
+        invalidate_admin_stats()
+        versions.bump('users')
 
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('login'))
@@ -202,22 +1747,27 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    user = User.query.get(session['user_id'])
-    vehicles = Vehicle.query.filter_by(user_id=user.id).all()
-    bookings = db.session.query(Booking, ParkingLot, ParkingSpot, Vehicle).\
-        join(ParkingSpot, Booking.spot_id == ParkingSpot.id).\
-        join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id).\
-        join(Vehicle, Booking.vehicle_no == Vehicle.vehicle_no).\
-        filter(Booking.user_id == user.id).\
-        order_by(Booking.created_at.desc()).limit(5).all()
+    user_id = session['user_id']
+    summary = cached(('dashboard', user_id), ('lots', user_stamp(user_id)), lambda: dashboard_summary(user_id))
+    return render_template('dashboard.html', **summary)
+
+def dashboard_summary(user_id):
+    """The dashboard's figures and recent bookings for one user as cacheable plain data"""
+    user = User.query.get(user_id)
+    bookings = user_bookings_query(user.id).limit(5).all()
 
     stats = {
-        'total_vehicles': len(vehicles),
-        'total_bookings': Booking.query.filter_by(user_id=user.id).count(),
+        'total_vehicles': Vehicle.query.filter_by(user_id=user.id).count(),
+        'total_bookings': Booking.query.filter_by(user_id=user.id).count() +
+            ArchivedBooking.query.filter_by(user_id=user.id).count(),
         'active_bookings': Booking.query.filter_by(user_id=user.id, status='active').count()
     }
 
-    return render_template('dashboard.html', user=user, stats=stats, recent_bookings=bookings)
+    return {
+        'user': {'first_name': user.first_name},
+        'stats': stats,
+        'recent_bookings': [tuple(as_dict(obj) for obj in row) for row in bookings]
+    }
 
 # Vehicle Management
 @app.route('/vehicles', methods=['GET', 'POST'])
@@ -241,6 +1791,7 @@ def vehicle_register():
 
         db.session.add(vehicle)
         db.session.commit()
+        versions.bump('users', user_stamp(session['user_id']))
         flash('Vehicle registered successfully!', 'success')
         return redirect(url_for('vehicle_register'))
 
@@ -251,47 +1802,69 @@ def vehicle_register():
 @app.route('/parking_lots')
 @login_required
 def parking_lots():
-    search_pincode = request.args.get('pincode', '')
-    search_date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
-
-    query = ParkingLot.query
-    if search_pincode:
-        query = query.filter(ParkingLot.pincode.like(f'%{search_pincode}%'))
-
-    lots = query.all()
-
-    # Calculate availability for each lot
-    lots_with_availability = []
-    for lot in lots:
-        total_spots = len(lot.spots)
-        # For simplicity, we'll just count available spots (in real app, consider date/time)
-        available_spots = len([spot for spot in lot.spots if spot.is_available])
-        lots_with_availability.append({
-            'lot': lot,
-            'total_spots': total_spots,
-            'available_spots': available_spots,
-            'utilization': ((total_spots - available_spots) / total_spots * 100) if total_spots > 0 else 0
-        })
+    search_pincode = request.args.get('pincode', '').strip()
+    search_text = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    search_date = request.args.get('date', booking_now().strftime('%Y-%m-%d'))
+    try:
+        window_start = datetime.strptime(search_date, '%Y-%m-%d')
+    except ValueError:
+        search_date = booking_now().strftime('%Y-%m-%d')
+        window_start = datetime.strptime(search_date, '%Y-%m-%d')
+
+    feed_event_id, lots_data, has_next = cached(
+        ('lot_search', search_text, search_pincode, page, search_date), ('lots', 'availability'),
+        lambda: lot_search_results(search_text, search_pincode, page, window_start))
 
     # Get user vehicles for booking
-    vehicles = Vehicle.query.filter_by(user_id=session['user_id']).all()
+    user_id = session['user_id']
+    vehicles = cached(('vehicles', user_id), (user_stamp(user_id),),
+                      lambda: [as_dict(vehicle) for vehicle in Vehicle.query.filter_by(user_id=user_id)])
 
     return render_template('parking_lots.html', 
-                         lots_data=lots_with_availability, 
+                         lots_data=lots_data, 
                          vehicles=vehicles,
                          search_pincode=search_pincode,
-                         search_date=search_date)
+                         search_text=search_text,
+                         search_date=search_date,
+                         page=page,
+                         has_next=has_next,
+                         feed_event_id=feed_event_id)
+
+def lot_search_results(text, pincode, page, window_start):
+    """One page of search results as plain data, with the feed event id they are current as of"""
+    # Taken before the counts are read so the live feed replays anything committed in between
+    feed_event_id = availability_feed.stats()['last_event_id']
+    lots_data, has_next = search_lots(text, pincode, page)
+
+    # Spots still free at some point on the searched date
+    booked = booked_spots_between([data['lot'].id for data in lots_data],
+                                  window_start, window_start + timedelta(days=1))
+    for data in lots_data:
+        data['free_on_date'] = data['total_spots'] - booked.get(data['lot'].id, 0)
+        data['lot'] = as_dict(data['lot'])
+    return feed_event_id, lots_data, has_next
 
 @app.route('/book_parking', methods=['POST'])
 @login_required
 def book_parking():
-    lot_id = request.form['lot_id']
+    lot_id = int(request.form['lot_id'])
     vehicle_id = request.form['vehicle_id']
     entry_time = datetime.strptime(request.form['entry_time'], '%Y-%m-%dT%H:%M')
     exit_time = datetime.strptime(request.form['exit_time'], '%Y-%m-%dT%H:%M')
 
-    # Find available spot in the lot
-    available_spot = ParkingSpot.query.filter_by(lot_id=lot_id, is_available=True).first()
+    if exit_time <= entry_time:
+        flash('Exit time must be after entry time!', 'error')
+        return redirect(url_for('parking_lots'))
+
+    # Price the stay at the occupancy the user saw, before taking a spot
+    total_cost = quote_lots([lot_id], entry_time, exit_time).get(lot_id)
+    if total_cost is None:
+        flash('Parking lot not found!', 'error')
+        return redirect(url_for('parking_lots'))
+
+    # Claim an available spot in the lot
+    available_spot = claim_spot(lot_id, entry_time, exit_time)
     if not available_spot:
         flash('No available spots in this parking lot!', 'error')
         return redirect(url_for('parking_lots'))
@@ -300,10 +1873,6 @@ def book_parking():
     vehicle = Vehicle.query.get(vehicle_id)
     lot = ParkingLot.query.get(lot_id)
 
-    # Calculate cost
-    duration_hours = (exit_time - entry_time).total_seconds() / 3600
-    total_cost = duration_hours * lot.price_per_hour
-
     # Create booking
     booking = Booking(
         user_id=session['user_id'],
@@ -314,11 +1883,10 @@ def book_parking():
         total_cost=total_cost
     )
 
-    # Mark spot as unavailable
-    available_spot.is_available = False
-
     db.session.add(booking)
     db.session.commit()
+    versions.bump('availability', 'users', user_stamp(session['user_id']))
+    refresh_rollups_after_booking()
 
     flash('Parking spot booked successfully!', 'success')
     return render_template('confirm_booking.html', 
@@ -327,17 +1895,157 @@ def book_parking():
                          spot=available_spot, 
                          vehicle=vehicle)
 
+def _json_ids(value):
+    """A JSON array of integer ids (or digit strings) as ints, raising TypeError for anything else.
+
+    A bare string must not get through: iterating "12" would give ids 1 and 2.
+    """
+    if not isinstance(value, list) or any(isinstance(item, bool) or not isinstance(item, (int, str)) for item in value):
+        raise TypeError('expected a list of ids')
+    return [int(item) for item in value]
+
+@app.route('/api/bookings/batch', methods=['POST'])
+@login_required
+def book_parking_batch():
+    payload = request.get_json(silent=True) or {}
+    try:
+        entry_time = datetime.strptime(payload['entry_time'], '%Y-%m-%dT%H:%M')
+        exit_time = datetime.strptime(payload['exit_time'], '%Y-%m-%dT%H:%M')
+        vehicle_ids = _json_ids(payload['vehicle_ids'])
+        lot_ids = _json_ids(payload.get('lot_ids') or [payload['lot_id']])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'vehicle_ids, lot_id or lot_ids, entry_time and exit_time '
+                                 '(YYYY-MM-DDTHH:MM) are required'}), 400
+    if exit_time <= entry_time:
+        return jsonify({'error': 'exit_time must be after entry_time'}), 400
+    if not vehicle_ids or len(vehicle_ids) > BATCH_BOOKING_LIMIT or len(set(vehicle_ids)) != len(vehicle_ids):
+        return jsonify({'error': f'give between 1 and {BATCH_BOOKING_LIMIT} distinct vehicle_ids'}), 400
+    if len(lot_ids) > QUOTE_BATCH_LIMIT:
+        return jsonify({'error': f'give at most {QUOTE_BATCH_LIMIT} lot_ids'}), 400
+
+    user_id = session['user_id']
+    vehicles = {vehicle.id: vehicle for vehicle in
+                Vehicle.query.filter(Vehicle.id.in_(vehicle_ids), Vehicle.user_id == user_id)}
+    missing = [vehicle_id for vehicle_id in vehicle_ids if vehicle_id not in vehicles]
+    if missing:
+        return jsonify({'error': 'vehicles not found', 'vehicle_ids': missing}), 404
+    if payload.get('nearby'):
+        lot_ids = list(dict.fromkeys(lot_ids + nearby_lot_ids(lot_ids[0])))[:QUOTE_BATCH_LIMIT]
+
+    # Reject from a read of the free spots before taking any write lock when the lots are clearly too full
+    available = bookable_spot_counts(lot_ids, entry_time, exit_time)
+    booked = None
+    if sum(available.values()) >= len(vehicle_ids):
+        booked = book_vehicles(user_id, [vehicles[vehicle_id] for vehicle_id in vehicle_ids],
+                               [lot_id for lot_id in lot_ids if available.get(lot_id)], entry_time, exit_time)
+    if booked is None:
+        return jsonify({'error': 'not enough free spots for the whole batch; nothing was booked',
+                        'requested': len(vehicle_ids),
+                        'available': {str(lot_id): available.get(lot_id, 0) for lot_id in lot_ids}}), 409
+
+    # Read the vehicles before committing, which would expire them and reload each one
+    result = {
+        'entry_time': entry_time.isoformat(),
+        'exit_time': exit_time.isoformat(),
+        'total_cost': str(sum(total_cost for *_, total_cost in booked)),
+        'bookings': [{'booking_id': booking_id, 'vehicle_id': vehicle.id, 'vehicle_no': vehicle.vehicle_no,
+                      'lot_id': lot_id, 'spot_number': spot_number, 'total_cost': str(total_cost)}
+                     for booking_id, vehicle, lot_id, spot_number, total_cost in booked]
+    }
+    db.session.commit()
+    versions.bump('availability', 'users', user_stamp(user_id))
+    refresh_rollups_after_booking()
+    return jsonify(result), 201
+
+@app.route('/api/lots/<int:lot_id>/availability')
+@login_required
+def lot_window_availability(lot_id):
+    lot = ParkingLot.query.get_or_404(lot_id)
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%dT%H:%M')
+        end = datetime.strptime(request.args['end'], '%Y-%m-%dT%H:%M')
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start and end are required as YYYY-MM-DDTHH:MM'}), 400
+    if end <= start:
+        return jsonify({'error': 'end must be after start'}), 400
+
+    total_spots = ParkingSpot.query.filter_by(lot_id=lot.id).count()
+    free_spot_numbers = [spot.spot_number for spot in free_spots_between(lot.id, start, end)]
+    return jsonify({
+        'lot_id': lot.id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'total_spots': total_spots,
+        'free_spots': len(free_spot_numbers),
+        'free_spot_numbers': free_spot_numbers
+    })
+
+@app.route('/api/quotes')
+@login_required
+def lot_quotes():
+    lot_ids = request.args.getlist('lot_id', type=int)
+    try:
+        entry_time = datetime.strptime(request.args['entry'], '%Y-%m-%dT%H:%M')
+        exit_time = datetime.strptime(request.args['exit'], '%Y-%m-%dT%H:%M')
+    except (KeyError, ValueError):
+        return jsonify({'error': 'entry and exit are required as YYYY-MM-DDTHH:MM'}), 400
+    if exit_time <= entry_time:
+        return jsonify({'error': 'exit must be after entry'}), 400
+    if not lot_ids or len(lot_ids) > QUOTE_BATCH_LIMIT:
+        return jsonify({'error': f'give between 1 and {QUOTE_BATCH_LIMIT} lot_id values'}), 400
+
+    quotes = quote_lots(lot_ids, entry_time, exit_time)
+    return jsonify({
+        'entry': entry_time.isoformat(),
+        'exit': exit_time.isoformat(),
+        'quotes': [{'lot_id': lot_id, 'total_cost': str(quotes[lot_id])} for lot_id in lot_ids if lot_id in quotes]
+    })
+
+@app.route('/api/availability')
+@login_required
+def lot_availability():
+    lot_ids = request.args.getlist('lot_id', type=int)
+    rows = db.session.query(LotOccupancy).filter(LotOccupancy.lot_id.in_(lot_ids)).all()
+    return jsonify({
+        'last_event_id': availability_feed.stats()['last_event_id'],
+        'lots': [{'lot_id': row.lot_id,
+                  'available_spots': row.available_count,
+                  'total_spots': row.available_count + row.occupied_count} for row in rows]
+    })
+
+@app.route('/api/availability/stream')
+@login_required
+def availability_stream():
+    # EventSource sends Last-Event-ID on reconnect; the first connection passes the page's id instead
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', type=int)
+    subscription, missed = availability_feed.subscribe(last_event_id)
+
+    def events():
+        try:
+            yield 'retry: 3000\n\n'
+            # Too far behind to replay: the client re-reads /api/availability
+            if missed is None:
+                yield format_sse({}, event='reset')
+            for event_id, payload in missed or ():
+                yield format_sse(payload, event_id)
+            while not subscription.dropped:
+                event = subscription.get(AVAILABILITY_KEEPALIVE_SECONDS)
+                yield ': keepalive\n\n' if event is None else format_sse(event[1], event[0])
+            yield format_sse({}, event='reset')
+        finally:
+            availability_feed.unsubscribe(subscription)
+
+    return app.response_class(events(), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/my_bookings')
 @login_required
 def view_reservations():
-    bookings = db.session.query(Booking, ParkingLot, ParkingSpot, Vehicle).\
-        join(ParkingSpot, Booking.spot_id == ParkingSpot.id).\
-        join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id).\
-        join(Vehicle, Booking.vehicle_no == Vehicle.vehicle_no).\
-        filter(Booking.user_id == session['user_id']).\
-        order_by(Booking.created_at.desc()).all()
-
-    return render_template('view_reservations.html', bookings=bookings)
+    archived = request.args.get('archived') == '1'
+    return render_bookings('view_reservations.html',
+                           user_bookings_query(session['user_id'], booking_history(archived)), archived=archived)
 
 @app.route('/release_parking/<int:booking_id>')
 @login_required
@@ -350,11 +2058,10 @@ def release_parking(booking_id):
         return redirect(url_for('view_reservations'))
 
     # Release the spot
-    spot = ParkingSpot.query.get(booking.spot_id)
-    spot.is_available = True
-    booking.status = 'completed'
-
+    complete_bookings([booking.id])
     db.session.commit()
+    invalidate_admin_stats()
+    versions.bump('availability', 'users', user_stamp(session['user_id']))
     flash('Parking spot released successfully!', 'success')
     return redirect(url_for('view_reservations'))
 
@@ -363,48 +2070,18 @@ def release_parking(booking_id):
 @admin_required
 def admin_dashboard():
     # Get statistics
-    total_lots = ParkingLot.query.count()
-    total_spots = ParkingSpot.query.count()
-    total_users = User.query.filter_by(is_admin=False).count()
-    total_bookings = Booking.query.count()
-    active_bookings = Booking.query.filter_by(status='active').count()
-
-    # Calculate total revenue
-    total_revenue = db.session.query(db.func.sum(Booking.total_cost)).scalar() or 0
+    stats = admin_stats_cache.get_or_set('stats', compute_admin_stats)
 
     # Get recent bookings
-    recent_bookings = db.session.query(Booking, User, ParkingLot, ParkingSpot).\
-        join(User, Booking.user_id == User.id).\
-        join(ParkingSpot, Booking.spot_id == ParkingSpot.id).\
-        join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id).\
-        order_by(Booking.created_at.desc()).limit(5).all()
-
-    stats = {
-        'total_lots': total_lots,
-        'total_spots': total_spots,
-        'total_users': total_users,
-        'total_bookings': total_bookings,
-        'active_bookings': active_bookings,
-        'total_revenue': total_revenue
-    }
+    recent_bookings = all_bookings_query().limit(5).all()
 
     return render_template('admin/dashboard.html', stats=stats, recent_bookings=recent_bookings)
 
 @app.route('/admin/parking_lots')
 @admin_required
 def admin_parking_lots():
-    lots = ParkingLot.query.all()
-    lots_data = []
-
-    for lot in lots:
-        total_spots = len(lot.spots)
-        available_spots = len([spot for spot in lot.spots if spot.is_available])
-        lots_data.append({
-            'lot': lot,
-            'total_spots': total_spots,
-            'available_spots': available_spots,
-            'utilization': ((total_spots - available_spots) / total_spots * 100) if total_spots > 0 else 0
-        })
+    lots_data = cached(('admin_lots',), ('lots', 'availability'),
+                       lambda: [dict(data, lot=as_dict(data['lot'])) for data in lots_with_availability(ParkingLot.query)])
 
     return render_template('admin/parking_lots.html', lots_data=lots_data)
 
@@ -416,22 +2093,20 @@ def add_lot():
             name=request.form['name'],
             address=request.form['address'],
             pincode=request.form['pincode'],
-            price_per_hour=float(request.form['price_per_hour']),
+            price_per_hour=Decimal(request.form['price_per_hour']),
             capacity=int(request.form['capacity'])
         )
 
         db.session.add(lot)
         db.session.flush()  # Get the lot ID
+        db.session.add(LotOccupancy(lot_id=lot.id, available_count=lot.capacity, occupied_count=0))
 
         # Create parking spots
-        for i in range(1, lot.capacity + 1):
-            spot = ParkingSpot(
-                lot_id=lot.id,
-                spot_number=f'P{i:03d}'
-            )
-            db.session.add(spot)
+        provision_spots(lot.id, 1, lot.capacity)
 
         db.session.commit()
+        invalidate_admin_stats()
+        versions.bump('lots')
         flash(f'Parking lot "{lot.name}" created with {lot.capacity} spots!', 'success')
         return redirect(url_for('admin_parking_lots'))
 
@@ -448,30 +2123,25 @@ def edit_lot(lot_id):
         lot.name = request.form['name']
         lot.address = request.form['address']
         lot.pincode = request.form['pincode']
-        lot.price_per_hour = float(request.form['price_per_hour'])
+        lot.price_per_hour = Decimal(request.form['price_per_hour'])
         lot.capacity = int(request.form['capacity'])
 
         # Handle capacity changes
         if lot.capacity != old_capacity:
             if lot.capacity > old_capacity:
-                # Add more spots
-                current_spots = len(lot.spots)
-                for i in range(current_spots + 1, lot.capacity + 1):
-                    spot = ParkingSpot(
-                        lot_id=lot.id,
-                        spot_number=f'P{i:03d}'
-                    )
-                    db.session.add(spot)
+                # Add more spots, numbered after the highest one so gaps left by removals are not reused
+                current_spots = ParkingSpot.query.filter_by(lot_id=lot.id).count()
+                first_number = highest_spot_number(lot.id) + 1
+                added = provision_spots(lot.id, first_number, first_number + lot.capacity - current_spots - 1)
+                adjust_occupancy(lot.id, available=added)
             else:
                 # Remove excess spots (only if they're available)
-                spots_to_remove = ParkingSpot.query.filter_by(
-                    lot_id=lot.id, is_available=True
-                ).offset(lot.capacity).all()
-
-                for spot in spots_to_remove:
-                    db.session.delete(spot)
+                removed = remove_spare_spots(lot.id, lot.capacity)
+                adjust_occupancy(lot.id, available=-removed)
 
         db.session.commit()
+        invalidate_admin_stats()
+        versions.bump('lots', 'availability')
         flash(f'Parking lot "{lot.name}" updated successfully!', 'success')
         return redirect(url_for('admin_parking_lots'))
 
@@ -483,35 +2153,156 @@ def delete_lot(lot_id):
     lot = ParkingLot.query.get_or_404(lot_id)
 
     # Check if there are active bookings
-    active_bookings = db.session.query(Booking).\
-        join(ParkingSpot, Booking.spot_id == ParkingSpot.id).\
-        filter(ParkingSpot.lot_id == lot_id, Booking.status == 'active').count()
+    active_bookings = lot_active_bookings_query(lot_id).count()
 
     if active_bookings > 0:
         flash('Cannot delete parking lot with active bookings!', 'error')
         return redirect(url_for('admin_parking_lots'))
 
+    # Deleting the spots would orphan their past bookings, hot or archived
+    if ParkingSpot.query.filter(ParkingSpot.lot_id == lot_id, spot_has_bookings()).first():
+        flash('Cannot delete parking lot with booking history!', 'error')
+        return redirect(url_for('admin_parking_lots'))
+
     db.session.delete(lot)
     db.session.commit()
+    invalidate_admin_stats()
+    versions.bump('lots', 'availability')
     flash(f'Parking lot "{lot.name}" deleted successfully!', 'success')
     return redirect(url_for('admin_parking_lots'))
 
+@app.route('/admin/pricing_rules', methods=['GET', 'POST'])
+@admin_required
+def admin_pricing_rules():
+    if request.method == 'POST':
+        try:
+            rule = pricing_rule_from_form(request.get_json(silent=True) or request.form)
+        except (KeyError, ValueError, ArithmeticError) as error:
+            return jsonify({'error': str(error)}), 400
+        db.session.add(rule)
+        db.session.commit()
+        versions.bump('pricing')
+        return jsonify(as_dict(rule)), 201
+
+    query = PricingRule.query.order_by(PricingRule.id)
+    lot_id = request.args.get('lot_id', type=int)
+    if lot_id is not None:
+        query = query.filter(db.or_(PricingRule.lot_id == lot_id, PricingRule.lot_id.is_(None)))
+    return jsonify({'rules': [as_dict(rule) for rule in query]})
+
+@app.route('/admin/pricing_rules/<int:rule_id>/delete', methods=['POST'])
+@admin_required
+def delete_pricing_rule(rule_id):
+    rule = PricingRule.query.get_or_404(rule_id)
+    db.session.delete(rule)
+    db.session.commit()
+    versions.bump('pricing')
+    return jsonify({'deleted': rule_id})
+
+@app.route('/admin/reports')
+@admin_required
+def admin_reports():
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d')
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start and end are required as YYYY-MM-DD'}), 400
+    group = request.args.get('group', 'day')
+    if group not in ROLLUP_GROUPS or end <= start:
+        return jsonify({'error': f'group must be one of {", ".join(ROLLUP_GROUPS)} and end on or after start'}), 400
+
+    report = rollup_report(start, end, group, request.args.get('lot_id', type=int))
+    if group == 'lot':
+        # Booked share of the spot-minutes each lot offered over the range, at its current size
+        range_minutes = (end - start).total_seconds() / 60
+        spots = {row.lot_id: row.available_count + row.occupied_count for row in LotOccupancy.query}
+        for row in report:
+            capacity_minutes = spots.get(row['lot_id'], 0) * range_minutes
+            row['utilization'] = row['occupied_minutes'] / capacity_minutes if capacity_minutes else None
+    return jsonify({'start': start.date().isoformat(), 'end': (end - timedelta(days=1)).date().isoformat(),
+                    'group': group, 'rows': report})
+
+@app.route('/admin/metrics')
+@admin_required
+def admin_metrics():
+    return jsonify({
+        'caches': {
+            'admin_stats': admin_stats_cache.stats(),
+            'principals': principal_cache.stats(),
+            'pages': page_cache.stats(),
+            'versions': versions.stats()
+        },
+        'password_hasher': password_hasher.stats(),
+        'jobs': {
+            'booking_expiry': booking_expiry_job.stats(),
+            'booking_rollups': booking_rollup_job.stats(),
+            'booking_archival': booking_archival_job.stats()
+        },
+        'feeds': {
+            'availability': availability_feed.stats()
+        },
+        'requests': profiler.snapshot()
+    })
+
+@app.route('/admin/principals/flush', methods=['POST'])
+@admin_required
+def flush_principals():
+    # Only this worker process forgets its principals; the others catch up within PRINCIPAL_CACHE_TTL
+    invalidate_principal()
+    return jsonify({'principals': principal_cache.stats()})
+
+@app.route('/admin/export/<table>.<fmt>')
+@admin_required
+def admin_export(table, fmt):
+    if table not in DATA_TABLES or fmt not in DATA_FORMATS:
+        return jsonify({'error': 'unknown table or format'}), 404
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return app.response_class(
+        stream_with_context(iter_export(DATA_TABLES[table], fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'}
+    )
+
+@app.route('/admin/import/<table>', methods=['POST'])
+@admin_required
+def admin_import(table):
+    upload = request.files.get('file')
+    if table not in DATA_TABLES or not upload:
+        return jsonify({'error': 'unknown table or missing file'}), 400
+
+    fmt = request.form.get('format') or ('json' if upload.filename.endswith(('.json', '.jsonl', '.ndjson')) else 'csv')
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+    try:
+        imported = import_records(DATA_TABLES[table], iter_import_records(stream, fmt),
+                                  provision_lot_spots=table == 'lots' and request.form.get('provision_spots') == '1')
+    except (ValueError, KeyError, db.exc.SQLAlchemyError) as error:
+        db.session.rollback()
+        return jsonify({'error': str(error)}), 400
+    return jsonify({'table': table, 'imported': imported})
+
 @app.route('/admin/users')
 @admin_required
 def admin_users():
-    users = User.query.filter_by(is_admin=False).all()
+    users = cached(('admin_users',), ('users',), users_overview)
     return render_template('admin/users.html', users=users)
 
+def users_overview():
+    """Every non-admin user with vehicle and active booking counts, in one query"""
+    vehicle_count = db.select(db.func.count(Vehicle.id)).where(Vehicle.user_id == User.id).scalar_subquery()
+    active_bookings = db.select(db.func.count(Booking.id)).\
+        where(Booking.user_id == User.id, Booking.status == 'active').scalar_subquery()
+    rows = db.session.query(User.id, User.first_name, User.last_name, User.username, User.email, User.address,
+                            User.pincode, User.created_at, vehicle_count.label('vehicle_count'),
+                            active_bookings.label('active_bookings')).\
+        filter(User.is_admin == False).order_by(User.id)
+    return [row._asdict() for row in rows]
+
 @app.route('/admin/bookings')
 @admin_required
 def admin_bookings():
-    bookings = db.session.query(Booking, User, ParkingLot, ParkingSpot).\
-        join(User, Booking.user_id == User.id).\
-        join(ParkingSpot, Booking.spot_id == ParkingSpot.id).\
-        join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id).\
-        order_by(Booking.created_at.desc()).all()
-
-    return render_template('admin/bookings.html', bookings=bookings)
+    archived = request.args.get('archived') == '1'
+    return render_bookings('admin/bookings.html', all_bookings_query(booking_history(archived)), archived=archived)
 
 # Initialize database and create admin user
 def create_admin_user():
@@ -525,7 +2316,7 @@ def create_admin_user():
             email='admin@parking.com',
             address='System Administrator',
             pincode='000000',
-            password=generate_password_hash('Admin@123'),  # Fixed password with caps and special char
+            password=password_hasher.hash('Admin@123'),  # Fixed password with caps and special char
             is_admin=True
         )
         db.session.add(admin)
@@ -535,9 +2326,17 @@ def create_admin_user():
         print("Password: Admin@123")
 
 if __name__ == '__main__':
+    app.debug = True
     with app.app_context():
-        db.create_all()
+        migrate_db()
         create_admin_user()
+        reconcile_lot_occupancy()
+    # The debug reloader runs this module in a watcher process and again in the child that serves
+    # requests; start the jobs only in the child so they don't run twice
+    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_booking_expiry()
+        start_booking_rollups()
+        start_booking_archival()
 
     print("\n" + "="*50)
     print("🚗 Vehicle Parking Management System")
@@ -547,4 +2346,4 @@ if __name__ == '__main__':
     print("Password: Admin@123")  # Fixed password
     print("="*50)
 
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=app.debug, host='0.0.0.0', port=5000)
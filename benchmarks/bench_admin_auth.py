@@ -0,0 +1,80 @@
+"""Database queries per admin request with and without the cached principal.
+
+"cold" clears the principal cache before every request, which matches the
+old behaviour of loading the user on each admin request; "warm" is the
+steady state. Also checks that revoking admin rights through the ORM takes
+effect at once, and that a revocation behind the ORM's back (another worker
+process, a raw UPDATE) takes effect once PRINCIPAL_CACHE_TTL runs out.
+
+Usage: python -m benchmarks.bench_admin_auth
+"""
+import argparse
+import time
+
+from benchmarks.common import (app, db, User, count_queries, logged_in_client, reset_database,
+                               seed_bookings, seed_lots, seed_user, seed_users, spot_ids, time_call)
+from app import principal_cache
+
+
+def admin_get_routes(lot_id):
+    """Every admin page reachable with GET, excluding the destructive delete_lot"""
+    return ['/admin/dashboard', '/admin/parking_lots', '/admin/add_lot', f'/admin/edit_lot/{lot_id}',
+            '/admin/users', '/admin/bookings', '/admin/metrics', '/admin/export/lots.csv', '/']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    reset_database()
+    lot_ids = seed_lots(10, 50)
+    seed_bookings(seed_users(50), spot_ids(), 5000)
+    admin_id = seed_user('bench_admin', is_admin=True)
+    admin = logged_in_client(admin_id, is_admin=True)
+
+    print(f'{"route":<28} {"cold queries":>12} {"warm queries":>12} {"cold ms":>9} {"warm ms":>9}')
+    for path in admin_get_routes(lot_ids[0]):
+        def cold():
+            principal_cache.invalidate()
+            return admin.get(path)
+
+        def warm():
+            return admin.get(path)
+
+        with count_queries() as cold_count:
+            assert cold().status_code in (200, 302)
+        warm()
+        with count_queries() as warm_count:
+            assert warm().status_code in (200, 302)
+        cold_ms, _ = time_call(cold, args.repeat)
+        warm_ms, _ = time_call(warm, args.repeat)
+        print(f'{path:<28} {cold_count["queries"]:>12} {warm_count["queries"]:>12} {cold_ms:>9.2f} {warm_ms:>9.2f}')
+
+    # Revoking the flag through the ORM must invalidate the cached principal on commit
+    with app.app_context():
+        db.session.get(User, admin_id).is_admin = False
+        db.session.commit()
+    response = admin.get('/admin/dashboard')
+    assert response.status_code == 302 and '/dashboard' in response.location, 'revoked admin still allowed'
+    print('revoked admin redirected away; cache:', principal_cache.stats())
+
+    # A raw UPDATE bypasses the commit hooks, so only the TTL can catch it
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == admin_id).values(is_admin=True))
+        db.session.commit()
+    principal_cache.invalidate()
+    assert admin.post('/admin/principals/flush').status_code == 200
+    assert admin.get('/admin/dashboard').status_code == 200
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == admin_id).values(is_admin=False))
+        db.session.commit()
+    assert admin.get('/admin/dashboard').status_code == 200, 'cached principal expected within the TTL'
+    time.sleep(principal_cache.ttl)
+    response = admin.get('/admin/dashboard')
+    assert response.status_code == 302, 'revoked admin still allowed after the TTL'
+    print(f'raw UPDATE revocation took effect after the {principal_cache.ttl:g}s TTL; cache:', principal_cache.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Admin dashboard statistics: six separate queries vs one aggregate vs the TTL cache.
+
+Bookings are bulk-seeded behind the rollups' back, so the aggregate is checked
+both before the rollup catch-up (revenue read from the unfolded tail) and after
+it, and timed in the caught-up state the background job keeps it in.
+
+Usage: python -m benchmarks.bench_admin_dashboard [--bookings N] [--refreshes N]
+"""
+import argparse
+
+from benchmarks.common import (app, db, User, ParkingLot, ParkingSpot, Booking, count_queries,
+                               logged_in_client, reset_database, seed_bookings, seed_lots,
+                               seed_user, seed_users, spot_ids, time_call)
+from app import admin_stats_cache, compute_admin_stats, refresh_booking_rollups
+
+
+def legacy_stats():
+    """The original six round trips"""
+    stats = {
+        'total_lots': ParkingLot.query.count(),
+        'total_spots': ParkingSpot.query.count(),
+        'total_users': User.query.filter_by(is_admin=False).count(),
+        'total_bookings': Booking.query.count(),
+        'active_bookings': Booking.query.filter_by(status='active').count(),
+        'total_revenue': db.session.query(db.func.sum(Booking.total_cost)).scalar() or 0,
+    }
+    db.session.remove()
+    return stats
+
+
+def aggregate_stats():
+    stats = compute_admin_stats()
+    db.session.remove()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookings', type=int, default=500000)
+    parser.add_argument('--refreshes', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    reset_database()
+    seed_lots(50, 200)
+    seed_bookings(seed_users(1000), spot_ids(), args.bookings, active_every=50)
+    admin_id = seed_user('bench_admin', is_admin=True)
+
+    with app.app_context():
+        assert legacy_stats() == aggregate_stats(), 'aggregate disagrees with the separate counts before the rollups'
+        refresh_booking_rollups()
+        assert legacy_stats() == aggregate_stats(), 'aggregate disagrees with the separate counts'
+        for label, fn in (('six queries', legacy_stats), ('one aggregate', aggregate_stats)):
+            with count_queries() as counter:
+                fn()
+            best, mean = time_call(fn, args.repeat)
+            print(f'{label:<14} queries={counter["queries"]:<2} best={best:8.1f}ms mean={mean:8.1f}ms')
+
+    admin = logged_in_client(admin_id, is_admin=True)
+    admin_stats_cache.invalidate()
+    with count_queries() as counter:
+        best, mean = time_call(lambda: admin.get('/admin/dashboard'), args.refreshes)
+    print(f'GET /admin/dashboard x{args.refreshes}: {counter["queries"] / args.refreshes:.2f} queries/request '
+          f'best={best:.1f}ms mean={mean:.1f}ms')
+    print('cache:', admin.get('/admin/metrics').get_json()['caches']['admin_stats'])
+
+
+if __name__ == '__main__':
+    main()
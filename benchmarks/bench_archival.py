@@ -0,0 +1,102 @@
+"""Active-booking query latency as booking history grows, with and without archival.
+
+Seeds lots, users and a fixed set of active bookings, then grows completed
+history through --steps total sizes. The first pass keeps every booking in
+the hot table; the second pass archives bookings that ended more than
+--archive-after-days ago after each step. At every size it times the queries
+that only care about active or recent bookings: a user's active count
+(dashboard), a lot's active bookings (delete_lot), the expiry sweep's overdue
+lookup, window availability and the first page of a user's bookings.
+
+Usage: python -m benchmarks.bench_archival [--steps 100000,1000000,3000000] [--archive-after-days 90]
+"""
+import argparse
+import os
+import time
+from datetime import timedelta
+
+from benchmarks.common import (app, db, Booking, reset_database, seed_bookings, seed_lots, seed_users, spot_ids,
+                               time_call)
+from app import (ArchivedBooking, archive_bookings, booked_spots_between, lot_active_bookings_query,
+                 overdue_bookings_query, user_bookings_query)
+
+ACTIVE_BOOKINGS = 2000
+
+
+def active_queries(user_id, lot_id, now):
+    return {
+        'dashboard active count': lambda: Booking.query.filter_by(user_id=user_id, status='active').count(),
+        'delete_lot active check': lambda: lot_active_bookings_query(lot_id).count(),
+        'expiry overdue batch': lambda: overdue_bookings_query(now).limit(500).all(),
+        'window availability': lambda: booked_spots_between([lot_id], now, now + timedelta(hours=2)),
+        'my bookings first page': lambda: user_bookings_query(user_id).limit(51).all(),
+    }
+
+
+def grow_history(owners, spots, size, total, now):
+    """Add completed bookings until total rows have been seeded; returns the new total"""
+    if size > total:
+        seed_bookings(owners, spots, size - total, active_every=size + 1, now=now, seed=size)
+    return size
+
+
+def run_pass(steps, archive_after_days, owners, spots, lot_id, now):
+    results = {}
+    total = 0
+    for size in steps:
+        total = grow_history(owners, spots, size, total, now)
+        with app.app_context():
+            archived = 0
+            archive_s = 0.0
+            if archive_after_days is not None:
+                # The rollups are not under test: mark everything as counted so archival may move it
+                Booking.query.filter_by(rolled_up=False).update({'rolled_up': True})
+                db.session.commit()
+                start = time.perf_counter()
+                archived = archive_bookings(now - timedelta(days=archive_after_days))
+                archive_s = time.perf_counter() - start
+                # Fold the deletes back into the main file, as happens long before the next archival run
+                db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+            hot = Booking.query.count()
+            user_id = owners[0][0]
+            timings = {name: time_call(query, 20)[0] for name, query in active_queries(user_id, lot_id, now).items()}
+        results[size] = (hot, archived, archive_s, timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--steps', default='100000,1000000,3000000',
+                        help='comma-separated total history sizes to measure at')
+    parser.add_argument('--archive-after-days', type=float, default=90)
+    args = parser.parse_args()
+    steps = [int(step) for step in args.steps.split(',')]
+
+    passes = {}
+    for label, archive_after_days in (('hot table only', None), ('with archival', args.archive_after_days)):
+        reset_database()
+        lot_id = seed_lots(50, 40)[0]
+        owners = seed_users(500)
+        spots = spot_ids()
+        now = seed_bookings(owners, spots, ACTIVE_BOOKINGS, active_every=1)
+        passes[label] = run_pass(steps, archive_after_days, owners, spots, lot_id, now)
+        with app.app_context():
+            archived_total = ArchivedBooking.query.count()
+            file_mb = os.path.getsize(db.engine.url.database) / 2 ** 20
+        print(f'{label}: database file {file_mb:.0f} MB, {archived_total:,} archived rows')
+
+    names = list(next(iter(passes['hot table only'].values()))[3])
+    for size in steps:
+        print(f'\nhistory {size:>10,} bookings')
+        for label, results in passes.items():
+            hot, archived, archive_s, _ = results[size]
+            moved = f', archived {archived:,} in {archive_s:.1f}s' if archived else ''
+            print(f'  {label:<15} hot rows {hot:>10,}{moved}')
+        for name in names:
+            before = passes['hot table only'][size][3][name]
+            after = passes['with archival'][size][3][name]
+            print(f'  {name:<24} hot table only {before:8.3f} ms   with archival {after:8.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
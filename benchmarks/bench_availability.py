@@ -0,0 +1,74 @@
+"""Availability reads: per-lot lazy loading vs grouped aggregate vs lot_occupancy counters.
+
+Usage: python -m benchmarks.bench_availability [--lots N] [--spots M]
+"""
+import argparse
+
+from benchmarks.common import (app, db, ParkingLot, count_queries, logged_in_client,
+                               reset_database, seed_lots, seed_user, time_call)
+from app import count_spot_availability, lots_with_availability
+
+
+def legacy_lots_data():
+    """The original loop: one lazy load of lot.spots per lot"""
+    lots_data = []
+    for lot in ParkingLot.query.all():
+        total_spots = len(lot.spots)
+        available_spots = len([spot for spot in lot.spots if spot.is_available])
+        lots_data.append((lot.id, total_spots, available_spots))
+    db.session.remove()
+    return lots_data
+
+
+def aggregate_lots_data():
+    counts = count_spot_availability()
+    lots_data = []
+    for (lot_id,) in db.session.query(ParkingLot.id).order_by(ParkingLot.id):
+        available, occupied = counts.get(lot_id, (0, 0))
+        lots_data.append((lot_id, available + occupied, available))
+    db.session.remove()
+    return lots_data
+
+
+def counter_lots_data():
+    lots_data = [(d['lot'].id, d['total_spots'], d['available_spots'])
+                 for d in lots_with_availability(ParkingLot.query)]
+    db.session.remove()
+    return lots_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lots', type=int, default=200)
+    parser.add_argument('--spots', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    reset_database()
+    seed_lots(args.lots, args.spots)
+    user_id = seed_user()
+    admin_id = seed_user('bench_admin', is_admin=True)
+    print(f'Seeded {args.lots} lots x {args.spots} spots')
+
+    with app.app_context():
+        expected = legacy_lots_data()
+        assert aggregate_lots_data() == expected, 'aggregate disagrees with legacy loop'
+        assert counter_lots_data() == expected, 'counters disagree with legacy loop'
+        for label, fn in (('legacy loop', legacy_lots_data),
+                          ('grouped aggregate', aggregate_lots_data),
+                          ('occupancy counters', counter_lots_data)):
+            with count_queries() as counter:
+                fn()
+            best, mean = time_call(fn, args.repeat)
+            print(f'{label:<20} queries={counter["queries"]:<6} best={best:9.1f}ms mean={mean:9.1f}ms')
+
+    for path, client in (('/parking_lots', logged_in_client(user_id)),
+                         ('/admin/parking_lots', logged_in_client(admin_id, is_admin=True))):
+        with count_queries() as counter:
+            assert client.get(path).status_code == 200
+        best, mean = time_call(lambda: client.get(path), args.repeat)
+        print(f'GET {path:<20} queries={counter["queries"]:<6} best={best:9.1f}ms mean={mean:9.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
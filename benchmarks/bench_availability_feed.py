@@ -0,0 +1,124 @@
+"""Live availability feed fan-out: hundreds of SSE subscribers on one shared broadcaster.
+
+Starts a local threaded WSGI server, opens --subscribers connections to
+/api/availability/stream, then books and releases spots through the app.
+Reports how many subscribers received every event, delivery latency, and
+the SQL statements run while subscribers were connected (the feed itself
+should run none).
+
+Usage: python -m benchmarks.bench_availability_feed [--subscribers N] [--events M]
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from datetime import timedelta
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks.common import (app, Booking, Vehicle, count_queries, logged_in_client, reset_database,
+                               seed_lots, seed_users)
+from app import availability_feed, booking_now
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def session_cookie(user_id):
+    serializer = app.session_interface.get_signing_serializer(app)
+    return f'{app.config["SESSION_COOKIE_NAME"]}={serializer.dumps({"user_id": user_id, "is_admin": False})}'
+
+
+def subscriber(port, cookie, expected, received, ready):
+    """Read SSE messages until expected events have arrived, recording arrival times by event id"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    connection.request('GET', '/api/availability/stream', headers={'Cookie': cookie})
+    response = connection.getresponse()
+    ready.release()
+    event_id = None
+    while len(received) < expected:
+        line = response.fp.readline()
+        if not line:
+            break
+        line = line.decode().rstrip('\n')
+        if line.startswith('id: '):
+            event_id = int(line[4:])
+        elif line.startswith('data: ') and event_id is not None:
+            json.loads(line[6:])
+            received[event_id] = time.perf_counter()
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscribers', type=int, default=300)
+    parser.add_argument('--events', type=int, default=50, help='bookings + releases to publish')
+    args = parser.parse_args()
+
+    reset_database()
+    [lot_id] = seed_lots(1, args.events, occupied_every=args.events + 1)
+    [(user_id, _)] = seed_users(1)
+    with app.app_context():
+        vehicle_id = Vehicle.query.filter_by(user_id=user_id).one().id
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cookie = session_cookie(user_id)
+
+    ready = threading.Semaphore(0)
+    inboxes = [{} for _ in range(args.subscribers)]
+    threads = [threading.Thread(target=subscriber, args=(server.server_port, cookie, args.events, inbox, ready),
+                                daemon=True) for inbox in inboxes]
+    with count_queries() as idle:
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for _ in threads:
+            ready.acquire()
+        while availability_feed.stats()['subscribers'] < args.subscribers:
+            time.sleep(0.01)
+        connect_s = time.perf_counter() - start
+        time.sleep(1)
+    print(f'{args.subscribers} subscribers connected in {connect_s:.2f}s; '
+          f'SQL statements while connected and idle: {idle["queries"]}')
+
+    client = logged_in_client(user_id)
+    # Bookings that start now take their spot at once, so each one publishes a delta
+    now = booking_now()
+    window = {'entry_time': now.strftime('%Y-%m-%dT%H:%M'),
+              'exit_time': (now + timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M')}
+    published_at = {}
+    with count_queries() as busy:
+        start = time.perf_counter()
+        for i in range(args.events):
+            event_id = availability_feed.stats()['last_event_id'] + 1
+            published_at[event_id] = time.perf_counter()
+            if i % 2 == 0:
+                client.post('/book_parking', data=dict(window, lot_id=lot_id, vehicle_id=vehicle_id))
+            else:
+                with app.app_context():
+                    booking_id = Booking.query.filter_by(status='active').order_by(Booking.id).first().id
+                client.get(f'/release_parking/{booking_id}')
+        for thread in threads:
+            thread.join(30)
+        elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    complete = sum(1 for inbox in inboxes if len(inbox) >= args.events)
+    latencies = sorted((arrived - published_at[event_id]) * 1000
+                       for inbox in inboxes for event_id, arrived in inbox.items() if event_id in published_at)
+    stats = availability_feed.stats()
+    print(f'{args.events} events to {args.subscribers} subscribers in {elapsed:.2f}s: '
+          f'{complete} received all, {stats["delivered"]} deliveries, {stats["dropped_subscribers"]} dropped')
+    if latencies:
+        print(f'delivery latency from request start: p50={latencies[len(latencies) // 2]:.1f} ms '
+              f'p95={latencies[int(len(latencies) * 0.95)]:.1f} ms max={latencies[-1]:.1f} ms')
+    print(f'SQL statements while publishing: {busy["queries"]} '
+          f'({busy["queries"] / args.events:.1f} per event, independent of subscriber count)')
+
+
+if __name__ == '__main__':
+    main()
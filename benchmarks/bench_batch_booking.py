@@ -0,0 +1,88 @@
+"""Fleet bookings: one /api/bookings/batch call against a /book_parking POST per vehicle.
+
+Gives one user --vehicles vehicles and books all of them three ways into
+empty lots: one POST per vehicle, one batch into a single lot, and one batch
+spread over --spread nearby lots of the same pincode district. Reports wall
+time, SQL statements and commits for each, after checking that a batch too big
+for its lot is rejected without booking anything.
+
+Usage: python -m benchmarks.bench_batch_booking [--vehicles N] [--spread M]
+"""
+import argparse
+import time
+
+from benchmarks.common import app, db, Booking, Vehicle, count_queries, logged_in_client, reset_database, \
+    seed_lots, seed_users
+from app import LotOccupancy
+
+WINDOW = {'entry_time': '2030-01-01T10:00', 'exit_time': '2030-01-01T12:00'}
+
+
+def timed(fn):
+    with count_queries() as counter:
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+    return elapsed * 1000, counter['queries']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vehicles', type=int, default=1000)
+    parser.add_argument('--spread', type=int, default=10, help='nearby lots the third run spreads over')
+    args = parser.parse_args()
+
+    reset_database()
+    # Lot 1 takes the per-request run, lot 2 the single-lot batch, the rest the nearby batch; pincodes repeat
+    # every 100 lots so they all share a district
+    lot_ids = seed_lots(2 + args.spread, args.vehicles, occupied_every=args.vehicles + 1)
+    owners = seed_users(args.vehicles)
+    user_id = owners[0][0]
+    with app.app_context():
+        Vehicle.query.update({'user_id': user_id})
+        db.session.commit()
+        vehicle_ids = [vehicle_id for (vehicle_id,) in db.session.query(Vehicle.id).order_by(Vehicle.id)]
+        # Book out the spread lots over the same window so only args.vehicles / spread spots are free in each
+        per_lot = -(-args.vehicles // args.spread)
+        for lot_id in lot_ids[2:]:
+            db.session.execute(db.text(
+                "INSERT INTO bookings (user_id, spot_id, vehicle_no, entry_time, exit_time, total_cost, status) "
+                "SELECT :user_id, id, 'FILLER', '2030-01-01 09:00:00.000000', '2030-01-01 13:00:00.000000', 0, "
+                "'active' FROM parking_spots WHERE lot_id = :lot_id AND id NOT IN "
+                "(SELECT id FROM parking_spots WHERE lot_id = :lot_id ORDER BY id LIMIT :free)"),
+                {'user_id': user_id, 'lot_id': lot_id, 'free': per_lot})
+        db.session.commit()
+    client = logged_in_client(user_id)
+
+    def per_request():
+        for vehicle_id in vehicle_ids:
+            client.post('/book_parking', data=dict(WINDOW, lot_id=lot_ids[0], vehicle_id=vehicle_id))
+
+    def batch(**lots):
+        def run():
+            response = client.post('/api/bookings/batch', json=dict(WINDOW, vehicle_ids=vehicle_ids, **lots))
+            assert response.status_code == 201, response.json
+            return response.json
+        return run
+
+    # One spread lot has only a tenth of the spots the fleet needs
+    with app.app_context():
+        bookings_before = Booking.query.count()
+        free_before = db.session.query(db.func.sum(LotOccupancy.available_count)).scalar()
+    response = client.post('/api/bookings/batch', json=dict(WINDOW, vehicle_ids=vehicle_ids, lot_id=lot_ids[2]))
+    with app.app_context():
+        assert Booking.query.count() == bookings_before
+        assert db.session.query(db.func.sum(LotOccupancy.available_count)).scalar() == free_before
+    print(f'batch larger than its lot: HTTP {response.status_code}, nothing booked, {free_before} spots still free')
+
+    print(f'{args.vehicles} vehicles per run')
+    baseline_ms, baseline_sql = timed(per_request)
+    print(f'{"POST /book_parking each":<28} {baseline_ms:9.1f} ms  {baseline_sql:6d} SQL  {args.vehicles} commits')
+    for label, lots in (('batch, one lot', {'lot_id': lot_ids[1]}),
+                        (f'batch, {args.spread} nearby lots', {'lot_id': lot_ids[2], 'nearby': True})):
+        elapsed_ms, sql = timed(batch(**lots))
+        print(f'{label:<28} {elapsed_ms:9.1f} ms  {sql:6d} SQL  1 commit   {baseline_ms / elapsed_ms:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
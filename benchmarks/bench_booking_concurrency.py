@@ -0,0 +1,95 @@
+"""Concurrent booking stress test: many threads booking one lot through /book_parking.
+
+Every attempt books the same future window, so the lot fills up after --spots
+bookings. Checks that no spot is handed out twice and reports bookings/sec. Pass
+--legacy to run the old select-then-update allocation for comparison.
+The app's SQLite pragmas (WAL, busy_timeout) apply to the benchmark database.
+
+Usage: python -m benchmarks.bench_booking_concurrency [--threads N] [--spots M]
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from benchmarks.common import app, db, ParkingSpot, logged_in_client, reset_database, seed_lots, seed_user
+from app import Booking, Vehicle
+
+
+def legacy_book(lot_id, user_id, vehicle_no):
+    """The original allocation: read a free spot, then flip it in Python"""
+    with app.app_context():
+        spot = ParkingSpot.query.filter_by(lot_id=lot_id, is_available=True).first()
+        if not spot:
+            return False
+        spot.is_available = False
+        db.session.add(Booking(user_id=user_id, spot_id=spot.id, vehicle_no=vehicle_no,
+                               entry_time=datetime.utcnow(), exit_time=datetime.utcnow(), total_cost=0))
+        db.session.commit()
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--spots', type=int, default=500)
+    parser.add_argument('--attempts', type=int, default=0, help='total booking attempts (default spots + 20%%)')
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+    attempts = args.attempts or int(args.spots * 1.2)
+
+    reset_database()
+    [lot_id] = seed_lots(1, args.spots, occupied_every=args.spots + 1)
+    user_id = seed_user()
+    with app.app_context():
+        vehicle = Vehicle(user_id=user_id, owner_name='Bench', mobile='0', vehicle_type='4-wheeler',
+                          vehicle_brand='Bench', vehicle_no='BENCH0001')
+        db.session.add(vehicle)
+        db.session.commit()
+        vehicle_id, vehicle_no = vehicle.id, vehicle.vehicle_no
+
+    remaining = iter(range(attempts))
+    lock = threading.Lock()
+    errors = []
+
+    def worker():
+        client = logged_in_client(user_id)
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            try:
+                if args.legacy:
+                    legacy_book(lot_id, user_id, vehicle_no)
+                else:
+                    response = client.post('/book_parking', data={
+                        'lot_id': lot_id, 'vehicle_id': vehicle_id,
+                        'entry_time': '2030-01-01T10:00', 'exit_time': '2030-01-01T12:00'})
+                    assert response.status_code in (200, 302)
+            except Exception as exc:  # keep going so the collision check still runs
+                errors.append(repr(exc))
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        booked = Counter(spot_id for (spot_id,) in db.session.query(Booking.spot_id))
+    collisions = sum(count - 1 for count in booked.values() if count > 1)
+    taken = len(booked)
+
+    mode = 'legacy select-then-update' if args.legacy else 'claim_spot'
+    print(f'{mode}: {args.threads} threads, {attempts} attempts on {args.spots} spots')
+    print(f'bookings={sum(booked.values())} spots_taken={taken} collisions={collisions} errors={len(errors)}')
+    print(f'throughput={sum(booked.values()) / elapsed:.1f} bookings/sec ({elapsed:.2f}s)')
+    if errors:
+        print('first error:', errors[0])
+
+
+if __name__ == '__main__':
+    main()
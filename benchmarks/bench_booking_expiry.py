@@ -0,0 +1,91 @@
+"""Booking expiry throughput and safety under concurrency.
+
+Seeds lots whose every spot is held by an overdue active booking, then runs
+--workers expiry sweeps at once while a user releases bookings through
+/release_parking. Reports bookings expired per second and checks that every
+spot was freed exactly once (no occupancy drift).
+
+Usage: python -m benchmarks.bench_booking_expiry [--lots N] [--spots M] [--workers W]
+"""
+import argparse
+import random
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import insert
+
+from benchmarks.common import app, db, Booking, ParkingSpot, logged_in_client, reset_database, seed_lots, seed_users
+from app import EXPIRY_BATCH_SIZE, booking_now, expire_overdue_bookings, reconcile_lot_occupancy
+
+
+def seed_overdue_bookings(owner):
+    """One overdue active booking on every spot; returns the booking ids"""
+    user_id, vehicle_no = owner
+    now = booking_now()
+    with app.app_context():
+        spot_ids = [spot_id for (spot_id,) in db.session.query(ParkingSpot.id)]
+        db.session.execute(insert(Booking), [{
+            'user_id': user_id, 'spot_id': spot_id, 'vehicle_no': vehicle_no,
+            'entry_time': now - timedelta(hours=3), 'exit_time': now - timedelta(minutes=i % 120 + 1),
+            'total_cost': 40.0, 'status': 'active', 'created_at': now - timedelta(hours=4),
+        } for i, spot_id in enumerate(spot_ids)])
+        db.session.commit()
+        return [booking_id for (booking_id,) in db.session.query(Booking.id)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lots', type=int, default=50)
+    parser.add_argument('--spots', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH_SIZE)
+    parser.add_argument('--releases', type=int, default=200, help='manual releases racing the workers')
+    args = parser.parse_args()
+
+    reset_database()
+    seed_lots(args.lots, args.spots, occupied_every=1)
+    [owner] = seed_users(1)
+    booking_ids = seed_overdue_bookings(owner)
+    released = random.Random(1).sample(booking_ids, min(args.releases, len(booking_ids)))
+
+    totals = {'expired': 0, 'batches': 0}
+    lock = threading.Lock()
+
+    def on_batch(size, lag_seconds):
+        with lock:
+            totals['expired'] += size
+            totals['batches'] += 1
+
+    def expiry_worker():
+        with app.app_context():
+            expire_overdue_bookings(batch_size=args.batch_size, on_batch=on_batch)
+
+    def releaser():
+        client = logged_in_client(owner[0])
+        for booking_id in released:
+            client.get(f'/release_parking/{booking_id}')
+
+    threads = [threading.Thread(target=expiry_worker) for _ in range(args.workers)]
+    threads.append(threading.Thread(target=releaser))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        still_active = Booking.query.filter_by(status='active').count()
+        held_spots = ParkingSpot.query.filter_by(is_available=False).count()
+        drift = reconcile_lot_occupancy()
+
+    print(f'{len(booking_ids)} overdue bookings, {args.workers} expiry workers, {len(released)} racing releases')
+    print(f'expired={totals["expired"]} in {totals["batches"]} batches, '
+          f'released by users={len(booking_ids) - totals["expired"]}, {elapsed:.2f}s, '
+          f'{len(booking_ids) / elapsed:.0f} bookings/sec')
+    print(f'still active={still_active} spots still held={held_spots} lots with occupancy drift={len(drift)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Streaming export and batched import of bookings.
+
+Exports the bookings table through the CLI code path and the admin
+endpoint, re-imports the file into an empty table and checks the round
+trip, reporting rows/sec and the peak memory of each step.
+
+Usage: python -m benchmarks.bench_import_export [--bookings N] [--format csv|json]
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import (app, db, Booking, logged_in_client, reset_database, seed_bookings,
+                               seed_lots, seed_user, seed_users, spot_ids)
+from app import ParkingLot, ParkingSpot, import_records, iter_export, iter_import_records
+
+
+def measured(fn, trace_memory=False):
+    """Run fn and return (result, seconds, peak MB); memory is only traced when asked since it slows the run"""
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--format', dest='fmt', choices=('csv', 'json'), default='csv')
+    args = parser.parse_args()
+
+    reset_database()
+    seed_lots(20, 100)
+    seed_bookings(seed_users(100), spot_ids(), args.bookings)
+    admin_id = seed_user('bench_admin', is_admin=True)
+    path = os.path.join(tempfile.mkdtemp(), f'bookings.{args.fmt}')
+
+    def export_file():
+        with app.app_context(), open(path, 'w', encoding='utf-8', newline='') as output:
+            for chunk in iter_export(Booking, args.fmt):
+                output.write(chunk)
+        return os.path.getsize(path)
+
+    size, elapsed, _ = measured(export_file)
+    _, _, peak = measured(export_file, trace_memory=True)
+    print(f'export  {args.bookings:>9} rows {elapsed:6.1f}s {args.bookings / elapsed:>10,.0f} rows/s '
+          f'peak={peak:.1f}MB file={size / 1024 / 1024:.0f}MB')
+
+    admin = logged_in_client(admin_id, is_admin=True)
+
+    def export_endpoint():
+        response = admin.get(f'/admin/export/bookings.{args.fmt}', buffered=False)
+        total = sum(len(chunk) for chunk in response.iter_encoded())
+        response.close()
+        return total
+
+    streamed, elapsed, peak = measured(export_endpoint, trace_memory=True)
+    assert streamed == size, (streamed, size)
+    print(f'GET /admin/export/bookings.{args.fmt} {elapsed:6.1f}s (memory traced) peak={peak:.1f}MB')
+
+    with app.app_context():
+        expected = db.session.query(db.func.count(Booking.id), db.func.sum(Booking.total_cost)).one()
+        Booking.query.delete()
+        db.session.commit()
+
+    def import_file():
+        with app.app_context(), open(path, encoding='utf-8', newline='') as source:
+            return import_records(Booking, iter_import_records(source, args.fmt))
+
+    imported, elapsed, _ = measured(import_file)
+    with app.app_context():
+        assert db.session.query(db.func.count(Booking.id), db.func.sum(Booking.total_cost)).one() == expected
+        Booking.query.delete()
+        db.session.commit()
+    _, _, peak = measured(import_file, trace_memory=True)
+    print(f'import  {imported:>9} rows {elapsed:6.1f}s {imported / elapsed:>10,.0f} rows/s peak={peak:.1f}MB')
+    with app.app_context():
+        assert db.session.query(db.func.count(Booking.id), db.func.sum(Booking.total_cost)).one() == expected
+
+    # Onboarding: a lots file without ids, spots provisioned from each capacity
+    lots_csv = 'name,address,pincode,price_per_hour,capacity\n' + ''.join(
+        f'New Lot {i},{i} New Street,600{i:03d},30,{50 + i}\n' for i in range(100))
+    response = admin.post('/admin/import/lots', data={
+        'file': (io.BytesIO(lots_csv.encode()), 'lots.csv'), 'provision_spots': '1'})
+    with app.app_context():
+        new_spots = ParkingSpot.query.join(ParkingLot).filter(ParkingLot.name.like('New Lot%')).count()
+    assert new_spots == sum(50 + i for i in range(100)), new_spots
+    print('POST /admin/import/lots:', response.get_json(), f'-> {new_spots} spots provisioned')
+
+
+if __name__ == '__main__':
+    main()
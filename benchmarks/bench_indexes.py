@@ -0,0 +1,72 @@
+"""Hot-route latency with and without the booking/vehicle/lot indexes.
+
+Seeds a large database, asserts every hot query plan uses its index,
+then times dashboard, view_reservations, admin_bookings and the
+delete_lot active-booking check before dropping the indexes and timing
+them again.
+
+Usage: python -m benchmarks.bench_indexes [--bookings N] [--users N]
+"""
+import argparse
+
+from sqlalchemy import text
+
+from benchmarks.common import (app, db, count_queries, logged_in_client, reset_database,
+                               seed_bookings, seed_lots, seed_user, seed_users, spot_ids, time_call)
+from app import Booking, check_query_plans, lot_active_bookings_query
+
+# Everything added for the hot queries except the overlap/claim indexes they fall back to
+DROPPED_INDEXES = ('ix_bookings_user_created', 'ix_bookings_user_status', 'ix_bookings_created_at',
+                   'ix_bookings_vehicle_no', 'ix_bookings_spot_window', 'ix_bookings_status_exit_entry',
+                   'ix_vehicles_user_id', 'ix_parking_lots_pincode')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookings', type=int, default=500000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--lots', type=int, default=50)
+    parser.add_argument('--spots', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    reset_database()
+    lot_ids = seed_lots(args.lots, args.spots)
+    owners = seed_users(args.users)
+    seed_bookings(owners, spot_ids(), args.bookings, active_every=200)
+    admin_id = seed_user('bench_admin', is_admin=True)
+    with app.app_context():
+        busy_lot = lot_active_bookings_query(lot_ids[0]).first()
+        assert busy_lot is not None, 'expected active bookings on the first lot'
+        user_bookings = Booking.query.filter_by(user_id=owners[0][0]).count()
+        problems = check_query_plans()
+    assert not problems, '\n'.join(problems)
+    print(f'Seeded {args.bookings} bookings for {args.users} users; '
+          f'benchmark user has {user_bookings}. Query plans OK.')
+
+    user = logged_in_client(owners[0][0])
+    admin = logged_in_client(admin_id, is_admin=True)
+    routes = (
+        ('/dashboard', user),
+        ('/my_bookings', user),
+        ('/admin/bookings', admin),
+        (f'/admin/delete_lot/{lot_ids[0]}', admin),  # refused: the lot has active bookings
+    )
+
+    for label in ('indexed', 'no indexes'):
+        if label == 'no indexes':
+            with app.app_context():
+                for name in DROPPED_INDEXES:
+                    db.session.execute(text(f'DROP INDEX {name}'))
+                db.session.commit()
+        for path, client in routes:
+            with count_queries() as counter:
+                assert client.get(path).status_code in (200, 302)
+            repeat = 1 if path == '/admin/bookings' else args.repeat
+            best, mean = time_call(lambda: client.get(path), repeat)
+            print(f'{label:<11} GET {path:<22} queries={counter["queries"]:<3} '
+                  f'best={best:9.1f}ms mean={mean:9.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
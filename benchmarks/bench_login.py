@@ -0,0 +1,106 @@
+"""Login throughput under concurrency with password hashing on a bounded pool.
+
+Seeds --users users, then --clients threads log in as fast as they can.
+Runs three times: with a pool as wide as the client count (every request
+thread hashing at once, as the inline code did), with the configured pool
+width and queue, and with a short queue and timeout. Reports logins/sec,
+latency percentiles, how many requests were turned away with 503, and the
+latency of other pages served by the same process during the burst. Also
+times the old OR lookup on username/email against the split lower() index
+lookups.
+
+Usage: python -m benchmarks.bench_login [--users N] [--clients C] [--logins L]
+"""
+import argparse
+import threading
+import time
+
+import app as parking_app
+from benchmarks.common import BENCH_PASSWORD, app, db, User, reset_database, seed_users, time_call
+from app import find_login_user
+from passwords import PasswordHasher
+
+
+def run(usernames, clients, logins):
+    remaining = iter(range(logins))
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                i = next(remaining, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            response = client.post('/login', data={'username': usernames[i % len(usernames)].upper(),
+                                                   'password': BENCH_PASSWORD})
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    # Another visitor loading a page that needs no hashing while the logins run
+    page_latencies = []
+    done = threading.Event()
+
+    def page_probe():
+        client = app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/login')
+            page_latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    probe = threading.Thread(target=page_probe)
+    start = time.perf_counter()
+    probe.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    probe.join()
+    latencies.sort()
+    page_latencies.sort()
+    return statuses.get(302, 0) / elapsed, latencies, statuses, page_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--logins', type=int, default=400)
+    args = parser.parse_args()
+
+    reset_database()
+    owners = seed_users(args.users)
+    with app.app_context():
+        usernames = [username for (username,) in db.session.query(User.username).
+                     filter(User.id.in_([user_id for user_id, _ in owners[:args.logins]]))]
+        last = usernames[-1]
+        or_best, _ = time_call(lambda: User.query.filter((User.username == last) | (User.email == last)).first(), 50)
+        split_best, _ = time_call(lambda: find_login_user(last.upper()), 50)
+    print(f'{args.users} users: username/email OR lookup {or_best:.3f} ms, '
+          f'case-insensitive split lookup {split_best:.3f} ms')
+
+    configured = parking_app.password_hasher
+    print(f'{args.clients} clients, {args.logins} logins, hash method {configured.prefix}')
+    for label, hasher in (
+            (f'{args.clients} hashing at once', PasswordHasher(configured.method, args.clients, 0, 60)),
+            (f'pool of {configured.workers}', configured),
+            (f'pool of {configured.workers}, queue 4', PasswordHasher(configured.method, configured.workers, 4, 0.5))):
+        parking_app.password_hasher = hasher
+        throughput, latencies, statuses, pages = run(usernames, args.clients, args.logins)
+        print(f'{label:<22} {throughput:7.1f} logins/s  p50 {latencies[len(latencies) // 2]:7.1f} ms  '
+              f'p95 {latencies[int(len(latencies) * 0.95)]:7.1f} ms  503s {statuses.get(503, 0)}  '
+              f'other pages p50 {pages[len(pages) // 2]:6.1f} ms p95 {pages[int(len(pages) * 0.95)]:6.1f} ms')
+    parking_app.password_hasher = configured
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Lot search latency: the old LIKE scans against the pincode prefix range and the FTS5 index.
+
+Seeds --lots lots with varied names, addresses and pincodes, then times one
+page of results for pincode and name/address searches both ways.
+
+Usage: python -m benchmarks.bench_lot_search [--lots N]
+"""
+import argparse
+import random
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from benchmarks.common import app, db, ParkingLot, logged_in_client, reset_database, seed_user, time_call
+from app import LOTS_PAGE_SIZE, lots_with_availability, search_lots
+
+AREAS = ['Koramangala', 'Indiranagar', 'Whitefield', 'Jayanagar', 'Malleshwaram', 'Hebbal', 'Yelahanka',
+         'Marathahalli', 'Banashankari', 'Basavanagudi', 'Electronic City', 'Rajajinagar']
+KINDS = ['Mall', 'Metro', 'Hospital', 'Market', 'Stadium', 'Tech Park', 'Station', 'Plaza', 'Temple', 'College']
+STREETS = ['Main Road', 'Cross Road', 'Ring Road', 'Church Street', 'Brigade Road', 'Residency Road', 'Link Road']
+
+
+def seed_search_lots(n_lots, seed=7):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    rows = []
+    for i in range(1, n_lots + 1):
+        area, kind = rng.choice(AREAS), rng.choice(KINDS)
+        rows.append({
+            'name': f'{area} {kind} Parking {i}',
+            'address': f'{rng.randint(1, 999)} {rng.choice(STREETS)}, {area}',
+            'pincode': f'{rng.randint(110000, 859999):06d}',
+            'price_per_hour': 20.0,
+            'capacity': 0,
+            'created_at': now,
+        })
+    with app.app_context():
+        db.session.execute(insert(ParkingLot), rows)
+        db.session.commit()
+
+
+def old_pincode_search(pincode):
+    return lots_with_availability(ParkingLot.query.filter(ParkingLot.pincode.like(f'%{pincode}%')),
+                                  limit=LOTS_PAGE_SIZE)
+
+
+def old_text_search(text):
+    query = ParkingLot.query
+    for word in text.split():
+        query = query.filter(db.or_(ParkingLot.name.ilike(f'%{word}%'), ParkingLot.address.ilike(f'%{word}%')))
+    return lots_with_availability(query, limit=LOTS_PAGE_SIZE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lots', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    reset_database()
+    seed_search_lots(args.lots)
+    user_id = seed_user()
+
+    cases = [
+        ('pincode 5600', lambda: old_pincode_search('5600'), lambda: search_lots(pincode='5600')),
+        ('pincode 859', lambda: old_pincode_search('859'), lambda: search_lots(pincode='859')),
+        ('text "hebbal metro"', lambda: old_text_search('hebbal metro'), lambda: search_lots('hebbal metro')),
+        ('text "church"', lambda: old_text_search('church'), lambda: search_lots('church')),
+        ('text "zzz" (no match)', lambda: old_text_search('zzz'), lambda: search_lots('zzz')),
+    ]
+    print(f'{args.lots} lots, first page of {LOTS_PAGE_SIZE}, best/mean of {args.repeat}')
+    with app.app_context():
+        for name, old, new in cases:
+            old_best, old_mean = time_call(old, args.repeat)
+            new_best, new_mean = time_call(new, args.repeat)
+            print(f'{name:<24} LIKE scan {old_best:8.2f}/{old_mean:8.2f} ms   '
+                  f'indexed {new_best:7.2f}/{new_mean:7.2f} ms   {old_mean / new_mean:6.1f}x')
+
+    client = logged_in_client(user_id)
+    for url in ('/parking_lots?q=whitefield+mall', '/parking_lots?pincode=560', '/parking_lots?page=100'):
+        best, mean = time_call(lambda: client.get(url), args.repeat)
+        print(f'GET {url:<36} {best:7.2f}/{mean:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Search page throughput with and without the page cache.
+
+Many users load /parking_lots with a handful of popular searches while one
+user books a spot every --write-every requests, which bumps the availability
+stamp. Runs once with the cache off (PAGE_CACHE_MB=0 behaviour) and once on,
+and reports requests/sec, SQL per request, hit rate and cache memory.
+
+Usage: python -m benchmarks.bench_page_cache [--lots N] [--users U] [--requests R]
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.common import (app, db, Vehicle, count_queries, logged_in_client, reset_database, seed_lots,
+                               seed_users)
+from app import page_cache
+
+SEARCHES = ['/parking_lots', '/parking_lots?pincode=5600', '/parking_lots?pincode=56001',
+            '/parking_lots?q=bench', '/parking_lots?page=2', '/parking_lots?q=lot+1']
+
+
+def run(owners, lot_ids, vehicle_ids, threads, requests, write_every):
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker(index):
+        user_id, _ = owners[index % len(owners)]
+        client = logged_in_client(user_id)
+        while True:
+            with lock:
+                i = next(remaining, None)
+            if i is None:
+                return
+            if write_every and i % write_every == 0:
+                client.post('/book_parking', data={
+                    'lot_id': lot_ids[i % len(lot_ids)], 'vehicle_id': vehicle_ids[user_id],
+                    'entry_time': '2030-01-01T10:00', 'exit_time': '2030-01-01T12:00'})
+            else:
+                assert client.get(SEARCHES[i % len(SEARCHES)]).status_code == 200
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    with count_queries() as counter:
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    return requests / elapsed, counter['queries'] / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lots', type=int, default=500)
+    parser.add_argument('--spots', type=int, default=50)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--write-every', type=int, default=100, help='book a spot every N requests (0: never)')
+    args = parser.parse_args()
+
+    reset_database()
+    lot_ids = seed_lots(args.lots, args.spots)
+    owners = seed_users(args.users)
+    with app.app_context():
+        vehicle_ids = dict(db.session.query(Vehicle.user_id, Vehicle.id))
+
+    max_bytes = page_cache.max_bytes
+    print(f'{args.lots} lots, {args.users} users, {args.threads} threads, {args.requests} requests, '
+          f'a booking every {args.write_every}')
+    for label, cache_bytes in (('cache off', 0), ('cache on', max_bytes)):
+        page_cache.max_bytes = cache_bytes
+        page_cache.invalidate()
+        page_cache.hits = page_cache.misses = 0
+        throughput, queries = run(owners, lot_ids, vehicle_ids, args.threads, args.requests, args.write_every)
+        stats = page_cache.stats()
+        print(f'{label:<10} {throughput:8.1f} req/s  {queries:5.2f} SQL/request  hit rate {stats["hit_rate"]:.1%}  '
+              f'{stats["entries"]} entries, {stats["bytes"] / 1024:.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Keyset pagination and streaming for the booking history pages.
+
+Pages through /admin/bookings and a user's bookings on a large seeded
+table, checking that every booking is seen exactly once (including rows
+that share a created_at), and compares the memory peak of streaming
+against loading the whole table.
+
+Usage: python -m benchmarks.bench_pagination [--bookings N]
+"""
+import argparse
+import re
+import time
+import tracemalloc
+from collections import Counter
+
+from sqlalchemy import update
+
+from benchmarks.common import (app, db, logged_in_client, reset_database, seed_bookings,
+                               seed_lots, seed_user, seed_users, spot_ids)
+from app import Booking, all_bookings_query, bookings_page, user_bookings_query
+
+BOOKING_ID = re.compile(rb'<td>#(\d+)</td>')
+
+
+def page_through_admin(client):
+    seen = Counter()
+    path, pages, slowest = '/admin/bookings', 0, 0.0
+    while path:
+        start = time.perf_counter()
+        response = client.get(path)
+        slowest = max(slowest, time.perf_counter() - start)
+        assert response.status_code == 200
+        seen.update(int(booking_id) for booking_id in BOOKING_ID.findall(response.data))
+        match = re.search(rb'href="([^"]*cursor=[^"]*)"', response.data)
+        path = match.group(1).decode().replace('&amp;', '&') if match else None
+        pages += 1
+    return seen, pages, slowest
+
+
+def page_through_user(user_id):
+    seen = Counter()
+    cursor = None
+    with app.app_context():
+        while True:
+            rows, cursor = bookings_page(user_bookings_query(user_id), cursor, 7)
+            seen.update(booking.id for booking, _, _, _ in rows)
+            if not cursor:
+                return seen
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookings', type=int, default=100000)
+    args = parser.parse_args()
+
+    reset_database()
+    seed_lots(20, 100)
+    owners = seed_users(20)
+    seed_bookings(owners, spot_ids(), args.bookings)
+    admin_id = seed_user('bench_admin', is_admin=True)
+    with app.app_context():
+        # Give a run of bookings the same created_at so ties have to be broken by id
+        tie = db.session.query(Booking.created_at).order_by(Booking.id).first()[0]
+        db.session.execute(update(Booking).where(Booking.id % 97 == 0).values(created_at=tie))
+        db.session.commit()
+        expected = {booking_id for (booking_id,) in db.session.query(Booking.id)}
+        user_expected = {booking_id for (booking_id,) in
+                         db.session.query(Booking.id).filter(Booking.user_id == owners[0][0])}
+
+    admin = logged_in_client(admin_id, is_admin=True)
+    seen, pages, slowest = page_through_admin(admin)
+    assert set(seen) == expected and max(seen.values()) == 1, 'admin pages missed or repeated bookings'
+    print(f'/admin/bookings: {len(seen)} bookings over {pages} pages, each seen once; '
+          f'slowest page {slowest * 1000:.1f}ms')
+
+    user_seen = page_through_user(owners[0][0])
+    assert set(user_seen) == user_expected and max(user_seen.values()) == 1, 'user pages missed or repeated'
+    print(f'user bookings: {len(user_seen)} bookings, each seen once')
+
+    def stream_all():
+        response = admin.get('/admin/bookings?stream=1', buffered=False)
+        rows = sum(chunk.count(b'<td>#') for chunk in response.iter_encoded())
+        response.close()
+        assert rows == len(expected), (rows, len(expected))
+
+    def load_all():
+        with app.app_context():
+            assert len(all_bookings_query().all()) == len(expected)
+            db.session.remove()
+
+    print(f'peak memory: stream={peak_memory(stream_all):.1f}MB  .all()={peak_memory(load_all):.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
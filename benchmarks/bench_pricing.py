@@ -0,0 +1,94 @@
+"""Pricing engine microbenchmark: compiled rate tables against minute-by-minute pricing.
+
+Times single quotes for stays of different lengths, the cost of compiling a
+table, and one /api/quotes call pricing --lots candidate lots for a search.
+
+Usage: python -m benchmarks.bench_pricing [--quotes N] [--lots M]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from benchmarks.common import app, db, logged_in_client, reset_database, seed_lots, seed_user, time_call
+from app import PricingRule
+from pricing import RateTable, TimeRule, to_money
+
+RULES = [
+    TimeRule(range(5), 8 * 60, 10 * 60, '1.5'),     # weekday morning peak
+    TimeRule(range(5), 17 * 60, 20 * 60, '1.4'),    # weekday evening peak
+    TimeRule([5, 6], 0, 24 * 60, '1.2'),            # weekends
+    TimeRule(range(7), 22 * 60, 6 * 60, '0.6'),     # nights
+]
+SURGE = [('0.8', '1.25'), ('0.95', '1.5')]
+
+
+def minute_by_minute(base_rate, entry_time, exit_time):
+    """The naive engine: look up the rate for every minute of the stay"""
+    total = Decimal(0)
+    when = entry_time
+    while when < exit_time:
+        rate = base_rate
+        minute = when.hour * 60 + when.minute
+        for rule in RULES:
+            if when.weekday() in rule.weekdays and rule.start_minute <= minute < rule.end_minute:
+                rate *= rule.multiplier
+            elif rule.end_minute < rule.start_minute and (
+                    (when.weekday() in rule.weekdays and minute >= rule.start_minute) or
+                    ((when.weekday() - 1) % 7 in rule.weekdays and minute < rule.end_minute)):
+                rate *= rule.multiplier
+        total += rate / 60
+        when += timedelta(minutes=1)
+    return to_money(total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--quotes', type=int, default=20000)
+    parser.add_argument('--lots', type=int, default=200)
+    args = parser.parse_args()
+
+    base_rate = Decimal('20.00')
+    table = RateTable(base_rate, RULES, SURGE)
+    compile_best, _ = time_call(lambda: RateTable(base_rate, RULES, SURGE), 50)
+    print(f'rate table: {table.segments} segments, compiled in {compile_best:.3f} ms')
+
+    rng = random.Random(3)
+    start = datetime(2030, 1, 1)
+    for label, max_minutes in (('<= 4 hours', 240), ('<= 3 days', 3 * 24 * 60), ('<= 30 days', 30 * 24 * 60)):
+        stays = []
+        for _ in range(args.quotes):
+            entry_time = start + timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            stays.append((entry_time, entry_time + timedelta(minutes=rng.randint(30, max_minutes))))
+        began = time.perf_counter()
+        for entry_time, exit_time in stays:
+            table.quote(entry_time, exit_time, Decimal('0.5'))
+        compiled_rate = len(stays) / (time.perf_counter() - began)
+
+        sample = stays[:max(20, args.quotes // (max_minutes // 10))]
+        began = time.perf_counter()
+        for entry_time, exit_time in sample:
+            assert minute_by_minute(base_rate, entry_time, exit_time) == table.quote(entry_time, exit_time)
+        naive_rate = len(sample) / (time.perf_counter() - began)
+        print(f'stays {label:<11} compiled {compiled_rate:10.0f} quotes/s   '
+              f'minute-by-minute {naive_rate:8.1f} quotes/s   {compiled_rate / naive_rate:8.0f}x')
+
+    reset_database()
+    lot_ids = seed_lots(args.lots, 20)
+    user_id = seed_user()
+    with app.app_context():
+        db.session.add_all([PricingRule(name='peak', days='01234', start_minute=480, end_minute=600, multiplier=1.5),
+                            PricingRule(kind='surge', name='surge', min_occupancy=0.8, multiplier=1.25)])
+        db.session.commit()
+    client = logged_in_client(user_id)
+    url = '/api/quotes?entry=2030-01-07T09:00&exit=2030-01-07T18:00&' + '&'.join(f'lot_id={i}' for i in lot_ids)
+    cold_best, _ = time_call(lambda: client.get(url), 1)
+    warm_best, warm_mean = time_call(lambda: client.get(url), 20)
+    assert len(client.get(url).json['quotes']) == len(lot_ids)
+    print(f'/api/quotes for {len(lot_ids)} lots: first call {cold_best:.1f} ms (compiles tables), '
+          f'cached tables {warm_best:.1f}/{warm_mean:.1f} ms best/mean')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Analytics reports from the lot x hour rollups against raw aggregation over bookings.
+
+Seeds --bookings bookings over two years, backfills lot_hourly_stats, then
+times per-day, per-hour and per-lot reports for a 30-day and a full-history
+range both ways, the dashboard revenue total, and the cost a booking pays to
+fold itself into the rollups.
+
+Usage: python -m benchmarks.bench_rollups [--bookings N] [--lots M]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import (app, db, Booking, ParkingSpot, Vehicle, logged_in_client, reset_database,
+                               seed_bookings, seed_lots, seed_users, spot_ids, time_call)
+from app import LotDailyStats, LotHourlyStats, rebuild_booking_rollups, rollup_report
+
+
+def raw_report(start, end, group):
+    """The same report computed from bookings (minutes attributed to the entry hour)"""
+    period = {'hour': db.func.strftime('%Y-%m-%d %H:00:00', Booking.entry_time),
+              'day': db.func.date(Booking.entry_time), 'lot': None}[group]
+    keys = [ParkingSpot.lot_id] if period is None else [period, ParkingSpot.lot_id]
+    minutes = (db.func.julianday(Booking.exit_time) - db.func.julianday(Booking.entry_time)) * 1440
+    return db.session.query(*keys, db.func.count(Booking.id), db.func.sum(Booking.total_cost),
+                            db.func.sum(minutes)).\
+        join(ParkingSpot, Booking.spot_id == ParkingSpot.id).\
+        filter(Booking.entry_time >= start, Booking.entry_time < end).group_by(*keys).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--lots', type=int, default=50)
+    parser.add_argument('--spots', type=int, default=40)
+    args = parser.parse_args()
+
+    reset_database()
+    seed_lots(args.lots, args.spots)
+    owners = seed_users(200)
+    now = seed_bookings(owners, spot_ids(), args.bookings)
+
+    with app.app_context():
+        start = time.perf_counter()
+        rebuild_booking_rollups()
+        backfill_s = time.perf_counter() - start
+        hourly_rows = db.session.query(db.func.count()).select_from(LotHourlyStats).scalar()
+        daily_rows = db.session.query(db.func.count()).select_from(LotDailyStats).scalar()
+    print(f'{args.bookings} bookings, {args.lots} lots: backfilled {hourly_rows} hourly and {daily_rows} daily rollup rows in {backfill_s:.1f}s '
+          f'({args.bookings / backfill_s:.0f} bookings/s)')
+
+    for label, days in (('last 30 days', 30), ('full history', 730)):
+        start, end = now - timedelta(days=days), now
+        for group in ('day', 'hour', 'lot'):
+            with app.app_context():
+                raw_best, _ = time_call(lambda: raw_report(start, end, group), 3)
+                rollup_best, _ = time_call(lambda: rollup_report(start, end, group), 3)
+            print(f'{label:<13} by {group:<5} raw {raw_best:9.1f} ms   rollups {rollup_best:8.1f} ms   '
+                  f'{raw_best / rollup_best:6.1f}x')
+
+    with app.app_context():
+        raw_best, _ = time_call(lambda: db.session.query(db.func.sum(Booking.total_cost)).scalar(), 3)
+        rollup_best, _ = time_call(lambda: db.session.query(db.func.sum(LotDailyStats.revenue)).scalar(), 3)
+    print(f'dashboard revenue total: raw {raw_best:.1f} ms   rollups {rollup_best:.1f} ms')
+
+    user_id, _ = owners[0]
+    with app.app_context():
+        vehicle_id = Vehicle.query.filter_by(user_id=user_id).first().id
+        lot_id = db.session.query(ParkingSpot.lot_id).filter(ParkingSpot.is_available == True).first()[0]
+    client = logged_in_client(user_id)
+    entry = datetime(2030, 2, 1, 10)
+    book_best, book_mean = time_call(lambda: client.post('/book_parking', data={
+        'lot_id': lot_id, 'vehicle_id': vehicle_id, 'entry_time': entry.isoformat(timespec='minutes'),
+        'exit_time': (entry + timedelta(hours=2)).isoformat(timespec='minutes')}), 10)
+    with app.app_context():
+        assert db.session.query(db.func.sum(LotHourlyStats.bookings)).scalar() == args.bookings + 10
+    print(f'/book_parking including the rollup update: {book_best:.1f}/{book_mean:.1f} ms best/mean')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Spot provisioning throughput: one ORM object per spot vs batched executemany.
+
+Usage: python -m benchmarks.bench_spot_provisioning [--capacities 100,10000,100000]
+"""
+import argparse
+import time
+
+from benchmarks.common import app, db, ParkingLot, ParkingSpot, reset_database
+from app import LotOccupancy, provision_spots, remove_spare_spots
+
+
+def new_lot(capacity):
+    lot = ParkingLot(name='Bench', address='Bench', pincode='560000', price_per_hour=20.0, capacity=capacity)
+    db.session.add(lot)
+    db.session.flush()
+    db.session.add(LotOccupancy(lot_id=lot.id, available_count=capacity, occupied_count=0))
+    return lot
+
+
+def legacy_create(capacity):
+    lot = new_lot(capacity)
+    for i in range(1, capacity + 1):
+        db.session.add(ParkingSpot(lot_id=lot.id, spot_number=f'P{i:03d}'))
+    db.session.commit()
+    return lot.id
+
+
+def bulk_create(capacity):
+    lot = new_lot(capacity)
+    provision_spots(lot.id, 1, capacity)
+    db.session.commit()
+    return lot.id
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--capacities', default='100,10000,100000')
+    args = parser.parse_args()
+
+    reset_database()
+    with app.app_context():
+        for capacity in (int(value) for value in args.capacities.split(',')):
+            _, legacy_seconds = timed(legacy_create, capacity)
+            lot_id, bulk_seconds = timed(bulk_create, capacity)
+            numbers = [number for (number,) in db.session.query(ParkingSpot.spot_number).
+                       filter_by(lot_id=lot_id).order_by(ParkingSpot.id)]
+            assert numbers == [f'P{i:03d}' for i in range(1, capacity + 1)]
+
+            removed, shrink_seconds = timed(remove_spare_spots, lot_id, capacity // 2)
+            db.session.commit()
+            assert removed == capacity - capacity // 2
+
+            print(f'capacity={capacity:<7} legacy={capacity / legacy_seconds:>10,.0f} spots/s  '
+                  f'bulk={capacity / bulk_seconds:>10,.0f} spots/s  '
+                  f'shrink={removed / max(shrink_seconds, 1e-9):>10,.0f} spots/s')
+            db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Concurrent write benchmark: the untuned SQLite connection against the app's pragmas.
+
+Writer threads book spots through /book_parking while reader threads load
+/parking_lots and /my_bookings. Each mode runs in a fresh subprocess against
+its own database; "before" drops the pragma listener and uses the old default
+pool, "after" uses the app's configuration (WAL, synchronous=NORMAL,
+busy_timeout, cache_size, mmap). Reports bookings/sec, read latency and how
+many requests failed with "database is locked".
+
+Usage: python -m benchmarks.bench_sqlite_tuning [--writers N] [--readers M] [--seconds S]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+
+def run(mode, writers, readers, seconds):
+    """Run one mode in this process and print a single result line"""
+    from sqlalchemy.exc import OperationalError
+
+    from benchmarks.common import app, db, logged_in_client, reset_database, seed_lots, seed_users
+    from app import Vehicle, _apply_sqlite_pragmas
+
+    with app.app_context():
+        engine = db.engine
+    if mode == 'before':
+        db.event.remove(engine, 'connect', _apply_sqlite_pragmas)
+        engine.dispose()
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+
+    reset_database()
+    lot_ids = seed_lots(20, 500, occupied_every=501)
+    owners = seed_users(writers + readers)
+    with app.app_context():
+        vehicle_ids = dict(db.session.query(Vehicle.user_id, Vehicle.id))
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    totals = {'bookings': 0, 'reads': 0, 'read_ms': 0.0, 'locked': 0, 'other_errors': 0}
+
+    def record(key, amount=1):
+        with lock:
+            totals[key] += amount
+
+    def call(fn):
+        try:
+            return fn()
+        except OperationalError as exc:
+            record('locked' if 'database is locked' in str(exc) else 'other_errors')
+        except Exception:
+            record('other_errors')
+        finally:
+            with app.app_context():
+                db.session.remove()
+
+    def writer(index):
+        user_id, _ = owners[index]
+        client = logged_in_client(user_id)
+        i = 0
+        while not stop.is_set():
+            lot_id = lot_ids[(index + i) % len(lot_ids)]
+            i += 1
+            response = call(lambda: client.post('/book_parking', data={
+                'lot_id': lot_id, 'vehicle_id': vehicle_ids[user_id],
+                'entry_time': '2030-01-01T10:00', 'exit_time': '2030-01-01T12:00'}))
+            if response is not None and response.status_code == 200:
+                record('bookings')
+
+    def reader(index):
+        user_id, _ = owners[writers + index]
+        client = logged_in_client(user_id)
+        paths = ['/parking_lots', '/my_bookings']
+        i = 0
+        while not stop.is_set():
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            response = call(lambda: client.get(path))
+            if response is not None and response.status_code == 200:
+                record('reads')
+                record('read_ms', (time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    attempts = totals['bookings'] + totals['reads'] + totals['locked'] + totals['other_errors']
+    mean_read = totals['read_ms'] / totals['reads'] if totals['reads'] else 0.0
+    print(f'{mode:<6} journal={journal_mode:<8} bookings/sec={totals["bookings"] / elapsed:8.1f}  '
+          f'reads/sec={totals["reads"] / elapsed:8.1f}  mean read={mean_read:7.1f} ms  '
+          f'locked={totals["locked"]} ({totals["locked"] / max(attempts, 1):.1%})  '
+          f'other errors={totals["other_errors"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--mode', choices=['before', 'after'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.writers, args.readers, args.seconds)
+        return
+
+    print(f'{args.writers} writers, {args.readers} readers, {args.seconds:g}s per mode')
+    for mode in ('before', 'after'):
+        env = dict(os.environ)
+        env.pop('DATABASE_URL', None)
+        if mode == 'before':
+            # SQLAlchemy's QueuePool defaults before the pool was configured
+            env.update(DB_POOL_SIZE='5', DB_MAX_OVERFLOW='10')
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_sqlite_tuning', '--mode', mode,
+                        '--writers', str(args.writers), '--readers', str(args.readers),
+                        '--seconds', str(args.seconds)], env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
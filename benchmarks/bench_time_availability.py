@@ -0,0 +1,61 @@
+"""Time-window availability over a large booking history.
+
+Seeds completed history plus a slice of active bookings, then times the
+"free spots in lot X between T1 and T2" lookups with and without the
+overlap indexes.
+
+Usage: python -m benchmarks.bench_time_availability [--bookings N]
+"""
+import argparse
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from benchmarks.common import (app, db, logged_in_client, reset_database, seed_bookings,
+                               seed_lots, seed_users, spot_ids, time_call)
+from app import booked_spots_between, free_spots_between
+
+OVERLAP_INDEXES = ('ix_bookings_status_exit_entry', 'ix_bookings_spot_window', 'ix_bookings_spot_status_window')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--lots', type=int, default=50)
+    parser.add_argument('--spots', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    reset_database()
+    lot_ids = seed_lots(args.lots, args.spots)
+    owners = seed_users(100)
+    all_spot_ids = spot_ids()
+    now = seed_bookings(owners, all_spot_ids, args.bookings)
+    print(f'Seeded {args.bookings} bookings over {len(all_spot_ids)} spots')
+
+    start, end = now + timedelta(days=1), now + timedelta(days=2)
+    with app.app_context():
+        def search_page():
+            booked_spots_between(lot_ids, start, end)
+            db.session.remove()
+
+        def single_lot():
+            free_spots_between(lot_ids[0], start, end).count()
+            db.session.remove()
+
+        for label in ('indexed', 'without overlap indexes'):
+            if label != 'indexed':
+                for name in OVERLAP_INDEXES:
+                    db.session.execute(text(f'DROP INDEX {name}'))
+                db.session.commit()
+            for name, fn in (('all lots (search page)', search_page), ('one lot free spots', single_lot)):
+                best, mean = time_call(fn, args.repeat)
+                print(f'{label:<24} {name:<24} best={best:9.2f}ms mean={mean:9.2f}ms')
+
+    client = logged_in_client(owners[0][0])
+    response = client.get(f'/api/lots/{lot_ids[0]}/availability?start={start:%Y-%m-%dT%H:%M}&end={end:%Y-%m-%dT%H:%M}')
+    print('API sample:', {key: value for key, value in response.get_json().items() if key != 'free_spot_numbers'})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Shared helpers for the benchmark scripts.
+
+Run the scripts from the project root as modules, e.g.
+``python -m benchmarks.bench_availability``. Each run works against a
+throwaway SQLite file unless ``DATABASE_URL`` is already set.
+"""
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+_bench_dir = tempfile.mkdtemp(prefix='parking-bench-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_bench_dir, 'bench.db'))
+
+from sqlalchemy import event, insert  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import app, db, User, Vehicle, ParkingLot, ParkingSpot, Booking, migrate_db, reconcile_lot_occupancy  # noqa: E402
+
+
+# Every seeded user logs in with this password
+BENCH_PASSWORD = 'bench'
+_bench_password_hash = generate_password_hash(BENCH_PASSWORD)
+
+
+def reset_database():
+    """Drop and recreate every table in the benchmark database, migrations included"""
+    with app.app_context():
+        db.drop_all()
+        migrate_db()
+
+
+def seed_lots(n_lots, spots_per_lot, occupied_every=3):
+    """Insert n_lots lots with spots_per_lot spots each, every Nth spot occupied"""
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(insert(ParkingLot), [{
+            'name': f'Lot {i}',
+            'address': f'{i} Bench Street',
+            'pincode': f'{560000 + i % 100:06d}',
+            'price_per_hour': 20.0,
+            'capacity': spots_per_lot,
+            'created_at': now,
+        } for i in range(1, n_lots + 1)])
+        lot_ids = [lot_id for (lot_id,) in db.session.query(ParkingLot.id).order_by(ParkingLot.id)]
+        for lot_id in lot_ids:
+            db.session.execute(insert(ParkingSpot), [{
+                'lot_id': lot_id,
+                'spot_number': f'P{i:03d}',
+                'is_available': i % occupied_every != 0,
+                'created_at': now,
+            } for i in range(1, spots_per_lot + 1)])
+        db.session.commit()
+        reconcile_lot_occupancy()
+        return lot_ids
+
+
+def seed_user(username='bench', is_admin=False):
+    """Create a user and return its id"""
+    with app.app_context():
+        user = User(first_name='Bench', last_name='User', username=username,
+                    email=f'{username}@bench.local', address='Bench', pincode='560000',
+                    password=_bench_password_hash, is_admin=is_admin)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def seed_users(n_users):
+    """Insert n_users users with one vehicle each; returns [(user_id, vehicle_no)]"""
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(insert(User), [{
+            'first_name': 'Bench', 'last_name': f'User{i}', 'username': f'user{i}',
+            'email': f'user{i}@bench.local', 'address': 'Bench', 'pincode': '560000',
+            'password': _bench_password_hash, 'is_admin': False, 'created_at': now,
+        } for i in range(n_users)])
+        user_ids = [user_id for (user_id,) in
+                    db.session.query(User.id).filter(User.username.like('user%')).order_by(User.id)]
+        db.session.execute(insert(Vehicle), [{
+            'user_id': user_id, 'owner_name': 'Bench', 'mobile': '0', 'vehicle_type': '4-wheeler',
+            'vehicle_brand': 'Bench', 'vehicle_no': f'BENCH{user_id:07d}', 'created_at': now,
+        } for user_id in user_ids])
+        db.session.commit()
+    return [(user_id, f'BENCH{user_id:07d}') for user_id in user_ids]
+
+
+def seed_bookings(owners, spot_ids, n_bookings, active_every=1000, now=datetime(2030, 1, 1), seed=42,
+                  history_days=730):
+    """Insert n_bookings spread over history_days before now; every Nth is an active future booking.
+
+    owners is a list of (user_id, vehicle_no) pairs as returned by seed_users.
+    """
+    rng = random.Random(seed)
+    batch = []
+    with app.app_context():
+        for i in range(n_bookings):
+            active = i % active_every == 0
+            if active:
+                entry = now + timedelta(hours=rng.randint(1, 24 * 14))
+            else:
+                entry = now - timedelta(minutes=rng.randint(60, 60 * 24 * history_days))
+            user_id, vehicle_no = rng.choice(owners)
+            batch.append({
+                'user_id': user_id, 'spot_id': rng.choice(spot_ids), 'vehicle_no': vehicle_no,
+                'entry_time': entry, 'exit_time': entry + timedelta(hours=rng.randint(1, 8)),
+                'total_cost': 40.0, 'status': 'active' if active else 'completed',
+                'created_at': entry - timedelta(minutes=rng.randint(1, 600)),
+            })
+            if len(batch) == 50000:
+                db.session.execute(insert(Booking), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(Booking), batch)
+        db.session.commit()
+    return now
+
+
+def spot_ids():
+    """Every parking spot id in the benchmark database"""
+    with app.app_context():
+        return [spot_id for (spot_id,) in db.session.query(ParkingSpot.id).order_by(ParkingSpot.id)]
+
+
+def logged_in_client(user_id, is_admin=False):
+    """Return a test client whose session is logged in as user_id"""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['is_admin'] = is_admin
+    return client
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements executed inside the block"""
+    counter = {'queries': 0}
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['queries'] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+
+
+def time_call(fn, repeat=5):
+    """Run fn repeat times and return (best_ms, mean_ms)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), sum(timings) / len(timings)
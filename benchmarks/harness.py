@@ -0,0 +1,291 @@
+"""Load-test harness that drives the real routes with concurrent workers.
+
+Seeds a synthetic dataset (users with vehicles, lots x spots, years of
+bookings), then runs user and admin journeys from concurrent workers
+through the Flask test client or, with --server, a local threaded WSGI
+server over HTTP. Reports throughput, p50/p95/p99 latency and SQL
+queries per route and writes everything to JSON; --compare flags routes
+that regressed against an earlier run.
+
+Usage:
+    python -m benchmarks.harness --workers 8 --duration 30 --output run.json
+    python -m benchmarks.harness --compare baseline.json --output run.json
+"""
+import os
+
+# The per-endpoint query counts come from the app's request profiler
+os.environ.setdefault('PROFILE_REQUESTS', '1')
+# Writers queueing on the SQLite lock are expected under load; only log truly pathological statements
+os.environ.setdefault('SLOW_QUERY_MS', '2000')
+
+import argparse  # noqa: E402
+import http.cookiejar  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import re  # noqa: E402
+import subprocess  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+import urllib.error  # noqa: E402
+import urllib.parse  # noqa: E402
+import urllib.request  # noqa: E402
+from collections import defaultdict  # noqa: E402
+from datetime import datetime  # noqa: E402
+
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+
+from benchmarks.common import (BENCH_PASSWORD, app, reset_database, seed_bookings, seed_lots,  # noqa: E402
+                               seed_user, seed_users, spot_ids)
+from app import profiler  # noqa: E402
+
+RELEASE_LINK = re.compile(r'/release_parking/(\d+)')
+
+
+class TestClientDriver:
+    """Sends requests in-process through Flask's test client"""
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpDriver:
+    """Sends real HTTP requests to a running server, keeping the session cookie"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=body, method=method)) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read().decode()
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Recorder:
+    """Thread-safe latency samples and error counts per route"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def timed(self, driver, name, method, path, data=None, ok=(200, 302)):
+        start = time.perf_counter()
+        status, body = driver.request(method, path, data)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.samples[name].append(elapsed_ms)
+            if status not in ok:
+                self.errors[name] += 1
+        return status, body
+
+
+def user_journey(driver, recorder, lot_ids, vehicle_id, iteration):
+    """Search, book, list bookings, release the newest booking and look at the dashboard"""
+    lot_id = lot_ids[iteration % len(lot_ids)]
+    recorder.timed(driver, 'GET /parking_lots', 'GET', '/parking_lots')
+    recorder.timed(driver, 'POST /book_parking', 'POST', '/book_parking', {
+        'lot_id': lot_id, 'vehicle_id': vehicle_id,
+        'entry_time': '2030-06-01T10:00', 'exit_time': '2030-06-01T12:00'})
+    _, body = recorder.timed(driver, 'GET /my_bookings', 'GET', '/my_bookings')
+    match = RELEASE_LINK.search(body)
+    if match:
+        recorder.timed(driver, 'GET /release_parking', 'GET', f'/release_parking/{match.group(1)}')
+    recorder.timed(driver, 'GET /dashboard', 'GET', '/dashboard')
+
+
+def admin_journey(driver, recorder, lot_ids, vehicle_id, iteration):
+    for path in ('/admin/dashboard', '/admin/parking_lots', '/admin/bookings', '/admin/users'):
+        recorder.timed(driver, f'GET {path}', 'GET', path)
+
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(p / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def route_endpoint(name):
+    """Map 'GET /admin/dashboard' to the Flask endpoint name used by the profiler"""
+    path = name.split(' ', 1)[1]
+    adapter = app.url_map.bind('localhost')
+    method = name.split(' ', 1)[0]
+    try:
+        endpoint, _ = adapter.match(path if path != '/release_parking' else '/release_parking/1', method=method)
+        return endpoint
+    except Exception:
+        return None
+
+
+def summarise(recorder, wall_seconds):
+    endpoints = profiler.snapshot()['endpoints']
+    routes = {}
+    for name, samples in sorted(recorder.samples.items()):
+        samples = sorted(samples)
+        endpoint_stats = endpoints.get(route_endpoint(name) or '', {})
+        routes[name] = {
+            'requests': len(samples),
+            'errors': recorder.errors[name],
+            'throughput_rps': len(samples) / wall_seconds,
+            'latency_ms': {
+                'mean': sum(samples) / len(samples),
+                'p50': percentile(samples, 50),
+                'p95': percentile(samples, 95),
+                'p99': percentile(samples, 99),
+                'max': samples[-1],
+            },
+            'queries_per_request': endpoint_stats.get('queries', {}).get('mean'),
+            'sql_ms_per_request': endpoint_stats.get('sql_ms', {}).get('mean'),
+        }
+    return routes
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f'{"route":<26} {"reqs":>6} {"err":>4} {"rps":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"queries":>8}')
+    for name, route in result['routes'].items():
+        latency = route['latency_ms']
+        queries = route['queries_per_request']
+        print(f'{name:<26} {route["requests"]:>6} {route["errors"]:>4} {route["throughput_rps"]:>8.1f} '
+              f'{latency["p50"]:>8.1f} {latency["p95"]:>8.1f} {latency["p99"]:>8.1f} '
+              f'{queries if queries is not None else float("nan"):>8.1f}')
+    print(f'total: {result["total_requests"]} requests in {result["wall_seconds"]:.1f}s '
+          f'({result["total_requests"] / result["wall_seconds"]:.1f} req/s)')
+
+
+def compare(result, baseline, threshold):
+    """Print per-route p95 and throughput changes; returns the routes that regressed"""
+    regressions = []
+    print(f'\ncompared with {baseline.get("git_revision")} ({baseline.get("started_at")}):')
+    for name, route in result['routes'].items():
+        old = baseline['routes'].get(name)
+        if not old:
+            continue
+        p95_change = (route['latency_ms']['p95'] / old['latency_ms']['p95'] - 1) * 100 if old['latency_ms']['p95'] else 0
+        rps_change = (route['throughput_rps'] / old['throughput_rps'] - 1) * 100 if old['throughput_rps'] else 0
+        flag = ''
+        if p95_change > threshold or rps_change < -threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<26} p95 {p95_change:+7.1f}%  throughput {rps_change:+7.1f}%{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--lots', type=int, default=50)
+    parser.add_argument('--spots', type=int, default=200)
+    parser.add_argument('--years', type=float, default=2)
+    parser.add_argument('--bookings-per-day', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--admin-workers', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=20, help='seconds to run the journeys for')
+    parser.add_argument('--server', action='store_true', help='drive a local WSGI server over HTTP')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='earlier JSON result to compare against')
+    parser.add_argument('--threshold', type=float, default=20, help='regression threshold in percent')
+    args = parser.parse_args()
+
+    history_days = int(args.years * 365)
+    n_bookings = history_days * args.bookings_per_day
+    reset_database()
+    lot_ids = seed_lots(args.lots, args.spots)
+    owners = seed_users(args.users)
+    seed_bookings(owners, spot_ids(), n_bookings, now=datetime.utcnow(), history_days=history_days)
+    seed_user('bench_admin', is_admin=True)
+    with app.app_context():
+        from app import Vehicle
+        vehicle_ids = {user_id: vehicle_id for user_id, vehicle_id in
+                       Vehicle.query.with_entities(Vehicle.user_id, Vehicle.id)}
+    print(f'Seeded {args.users} users, {args.lots}x{args.spots} spots, {n_bookings} bookings '
+          f'over {history_days} days')
+
+    server = None
+    if args.server:
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        make_driver = lambda: HttpDriver(f'http://127.0.0.1:{server.server_port}')  # noqa: E731
+    else:
+        make_driver = TestClientDriver
+
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(index):
+        driver = make_driver()
+        is_admin = index < args.admin_workers
+        username = 'bench_admin' if is_admin else f'user{index % args.users}'
+        driver.request('POST', '/login', {'username': username, 'password': BENCH_PASSWORD})
+        user_id = owners[index % args.users][0]
+        journey = admin_journey if is_admin else user_journey
+        iteration = index
+        while time.perf_counter() < deadline:
+            journey(driver, recorder, lot_ids, vehicle_ids[user_id], iteration)
+            iteration += 1
+
+    profiler.reset()
+    started_at = datetime.utcnow().isoformat()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(args.workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+    if server:
+        server.shutdown()
+
+    routes = summarise(recorder, wall_seconds)
+    result = {
+        'started_at': started_at,
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'config': vars(args) | {'bookings': n_bookings,
+                                'database_url': app.config['SQLALCHEMY_DATABASE_URI']},
+        'wall_seconds': wall_seconds,
+        'total_requests': sum(route['requests'] for route in routes.values()),
+        'routes': routes,
+    }
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(result, output, indent=2)
+        print(f'results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(result, json.load(baseline_file), args.threshold)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""In-process publish/subscribe fan-out for Server-Sent Events."""
+import json
+import queue
+import threading
+from collections import deque
+
+
+class Subscription:
+    """One client's bounded event queue; dropped by the broadcaster if the client falls too far behind."""
+
+    def __init__(self, maxsize):
+        self._queue = queue.Queue(maxsize)
+        self.dropped = False
+
+    def get(self, timeout):
+        """The next (event_id, payload), or None after timeout seconds or once the subscription is dropped"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broadcaster:
+    """Fans each published event out to every subscriber without touching the database.
+
+    Events get increasing ids and the last history_size are kept, so a client
+    reconnecting with Last-Event-ID can replay what it missed.
+    """
+
+    def __init__(self, history_size=1000, subscriber_queue_size=256):
+        self.subscriber_queue_size = subscriber_queue_size
+        self._subscribers = set()
+        self._history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber; returns (subscription, missed) where missed is None if the gap is too old"""
+        subscription = Subscription(self.subscriber_queue_size)
+        with self._lock:
+            missed = []
+            if last_event_id is not None and last_event_id < self._last_id:
+                oldest_kept = self._history[0][0] if self._history else self._last_id + 1
+                if last_event_id + 1 < oldest_kept:
+                    missed = None
+                else:
+                    missed = [event for event in self._history if event[0] > last_event_id]
+            self._subscribers.add(subscription)
+        return subscription, missed
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, payload):
+        """Queue payload for every subscriber; subscribers whose queue is full are dropped"""
+        with self._lock:
+            self._last_id += 1
+            event = (self._last_id, payload)
+            self._history.append(event)
+            self.published += 1
+            for subscription in list(self._subscribers):
+                try:
+                    subscription._queue.put_nowait(event)
+                    self.delivered += 1
+                except queue.Full:
+                    subscription.dropped = True
+                    self._subscribers.discard(subscription)
+                    self.dropped += 1
+        return event[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped_subscribers': self.dropped,
+                'last_event_id': self._last_id,
+            }
+
+
+def format_sse(payload, event_id=None, event=None):
+    """Encode one Server-Sent Events message with a JSON data line"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(payload, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
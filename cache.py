@@ -0,0 +1,244 @@
+"""Small in-process caches for the app's read-heavy pages."""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe key/value cache whose entries expire ttl seconds after they are set."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a value computed before it is never stored after it
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_set(self, key, factory):
+        """Return the cached value for key, calling factory() to fill it on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self._generation
+            value = factory()
+            self.set(key, value, generation)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations,
+            'ttl_seconds': self.ttl,
+        }
+
+
+class LRUCache:
+    """Thread-safe key/value cache holding at most maxsize entries, evicting the least recently used.
+
+    With a ttl, entries also expire ttl seconds after they are set.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            self.invalidations += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'ttl_seconds': self.ttl,
+        }
+
+
+def approximate_size(value):
+    """Rough deep size in bytes of strings, numbers and nested dicts, lists and tuples"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(key) + approximate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class FragmentCache:
+    """Thread-safe LRU cache bounded by approximate memory use, whose entries also expire after ttl seconds.
+
+    Meant for query results and rendered HTML keyed by their inputs plus version
+    stamps: a bumped stamp changes the key, so stale entries are never read again
+    and simply age out.
+    """
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        size = approximate_size(key) + approximate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_set(self, key, factory):
+        """Return the cached value for key, calling factory() to fill it on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self.invalidations += 1
+            self._entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'ttl_seconds': self.ttl,
+        }
+
+
+class VersionStamps:
+    """Named counters that writers bump so cache keys built from them change."""
+
+    def __init__(self):
+        self._stamps = {}
+        self._lock = threading.Lock()
+        self.bumps = 0
+
+    def get(self, *names):
+        with self._lock:
+            return tuple(self._stamps.get(name, 0) for name in names)
+
+    def bump(self, *names):
+        with self._lock:
+            for name in names:
+                self._stamps[name] = self._stamps.get(name, 0) + 1
+                self.bumps += 1
+
+    def stats(self):
+        with self._lock:
+            return {'stamps': len(self._stamps), 'bumps': self.bumps}
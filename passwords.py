@@ -0,0 +1,92 @@
+"""Password hashing on a bounded worker pool, off the request threads.
+
+Werkzeug's scrypt and pbkdf2 hashes run in hashlib, which releases the GIL,
+so a small thread pool hashes on every core while request threads only wait.
+At most workers + queue_size hashes are admitted at once; callers beyond
+that wait up to timeout seconds for a slot and then get PasswordHasherBusy,
+which the app turns into a 503 instead of piling more work on a saturated CPU.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from profiling import Histogram
+
+
+class PasswordHasherBusy(Exception):
+    """Every hashing slot stayed taken for the whole admission timeout"""
+
+
+class PasswordHasher:
+    """Hash and verify passwords with one configured method on a fixed pool of threads.
+
+    method is a werkzeug method string such as 'scrypt:32768:8:1' or
+    'pbkdf2:sha256:600000'; hashes stored with any other parameters report
+    needs_rehash() so they can be upgraded at the next successful login.
+    """
+
+    def __init__(self, method='scrypt', workers=4, queue_size=64, timeout=2.0):
+        # Hash once up front to validate the method and learn its canonical prefix
+        self.prefix = generate_password_hash('', method).split('$', 1)[0]
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_ms = Histogram()
+        self.hash_ms = Histogram()
+
+    def _run(self, fn, *args):
+        queued_at = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy(f'all {self.workers} password hashing workers are busy')
+
+        def timed():
+            started_at = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished_at = time.perf_counter()
+                with self._lock:
+                    self.wait_ms.add((started_at - queued_at) * 1000)
+                    self.hash_ms.add((finished_at - started_at) * 1000)
+
+        with self._lock:
+            self.pending += 1
+        try:
+            return self._executor.submit(timed).result()
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """Whether a stored hash was made with other parameters than the configured method"""
+        return stored_hash.split('$', 1)[0] != self.prefix
+
+    def stats(self):
+        with self._lock:
+            return {
+                'method': self.prefix,
+                'workers': self.workers,
+                'pending': self.pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'wait_ms': self.wait_ms.summary(),
+                'hash_ms': self.hash_ms.summary(),
+            }
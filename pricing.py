@@ -0,0 +1,110 @@
+"""Time-of-day, weekend and occupancy pricing compiled into weekly rate tables.
+
+A lot's rules are compiled once into the segments of a week that share one
+hourly rate, plus a running total of what each segment costs. Pricing any
+entry/exit range is then two bisects into that table, however long the stay.
+All money is Decimal and rounded to the paisa only once, on the final total.
+"""
+import bisect
+import sys
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+MINUTES_PER_DAY = 24 * 60
+SECONDS_PER_WEEK = 7 * MINUTES_PER_DAY * 60
+# A Monday, so week offsets line up with datetime.weekday()
+WEEK_ORIGIN = datetime(2000, 1, 3)
+PAISA = Decimal('0.01')
+ONE = Decimal(1)
+
+
+def to_money(value):
+    """Round a Decimal amount to the paisa, half up"""
+    return Decimal(value).quantize(PAISA, rounding=ROUND_HALF_UP)
+
+
+class TimeRule:
+    """Multiply the rate on the given weekdays (Monday is 0) between two minutes of the day.
+
+    end_minute may be smaller than start_minute for a window that runs past
+    midnight, e.g. 22:00-06:00 night pricing.
+    """
+
+    def __init__(self, weekdays, start_minute, end_minute, multiplier):
+        self.weekdays = tuple(sorted(set(weekdays)))
+        self.start_minute = start_minute
+        self.end_minute = end_minute
+        self.multiplier = Decimal(multiplier)
+
+    def windows(self):
+        """(start, end) second offsets into the week that this rule covers"""
+        for day in self.weekdays:
+            start = (day * MINUTES_PER_DAY + self.start_minute) * 60
+            if self.end_minute > self.start_minute:
+                yield start, (day * MINUTES_PER_DAY + self.end_minute) * 60
+            else:
+                yield start, ((day + 1) * MINUTES_PER_DAY) * 60
+                next_day = (day + 1) % 7 * MINUTES_PER_DAY * 60
+                yield next_day, next_day + self.end_minute * 60
+
+
+class RateTable:
+    """A lot's weekly schedule of hourly rates, compiled for O(log segments) quotes.
+
+    Multipliers of overlapping time rules stack. Surge tiers are
+    (min_occupancy, multiplier) pairs; the highest tier the current occupancy
+    reaches applies to the whole stay.
+    """
+
+    def __init__(self, base_rate, rules=(), surge_tiers=()):
+        self.base_rate = Decimal(base_rate)
+        self.surge_tiers = sorted((Decimal(threshold), Decimal(multiplier)) for threshold, multiplier in surge_tiers)
+
+        windows = [(start, end, rule.multiplier) for rule in rules for start, end in rule.windows()]
+        bounds = sorted({0, SECONDS_PER_WEEK}.union(*[(start, end) for start, end, _ in windows]))
+        self.starts = bounds[:-1]
+        self.rates = []
+        self.cumulative = [Decimal(0)]
+        for start, end in zip(bounds, bounds[1:]):
+            rate = self.base_rate
+            for window_start, window_end, multiplier in windows:
+                if window_start <= start and end <= window_end:
+                    rate *= multiplier
+            self.rates.append(rate)
+            self.cumulative.append(self.cumulative[-1] + rate * (end - start) / 3600)
+        self.week_cost = self.cumulative[-1]
+
+    @property
+    def segments(self):
+        return len(self.rates)
+
+    def __sizeof__(self):
+        # Counted by page cache memory budgets: the per-segment lists dominate
+        return object.__sizeof__(self) + sum(sys.getsizeof(item) for item in self.rates + self.cumulative) + \
+            sys.getsizeof(self.starts) + sys.getsizeof(self.rates) + sys.getsizeof(self.cumulative)
+
+    def _cost_since_origin(self, when):
+        weeks, offset = divmod(int((when - WEEK_ORIGIN).total_seconds()), SECONDS_PER_WEEK)
+        index = bisect.bisect_right(self.starts, offset) - 1
+        return weeks * self.week_cost + self.cumulative[index] + self.rates[index] * (offset - self.starts[index]) / 3600
+
+    def surge_multiplier(self, occupancy):
+        multiplier = ONE
+        if occupancy is not None:
+            for threshold, tier_multiplier in self.surge_tiers:
+                if occupancy >= threshold:
+                    multiplier = tier_multiplier
+        return multiplier
+
+    def quote(self, entry_time, exit_time, occupancy=None):
+        """Total price for parking from entry_time to exit_time at the given occupancy (0-1), rounded to the paisa"""
+        if exit_time <= entry_time:
+            return to_money(0)
+        cost = self._cost_since_origin(exit_time) - self._cost_since_origin(entry_time)
+        return to_money(cost * self.surge_multiplier(occupancy))
+
+
+def quote_many(tables, entry_time, exit_time, occupancies=None):
+    """Quote the same stay at many lots: {lot_id: RateTable} -> {lot_id: price}"""
+    occupancies = occupancies or {}
+    return {lot_id: table.quote(entry_time, exit_time, occupancies.get(lot_id)) for lot_id, table in tables.items()}
@@ -0,0 +1,174 @@
+"""Opt-in per-request profiling: SQL statement counts and time, template time and total latency.
+
+Enable with PROFILE_REQUESTS=1. Figures are kept per endpoint in fixed-bucket
+histograms so memory stays constant however long the process runs.
+"""
+import bisect
+import threading
+import time
+from collections import deque
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+# Upper bounds (ms) of the histogram buckets; anything slower lands in the overflow bucket
+BUCKET_BOUNDS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with percentile estimates."""
+
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (the max for the overflow bucket)"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency_ms = Histogram()
+        self.sql_ms = Histogram()
+        self.template_ms = Histogram()
+        self.queries = Histogram(bounds=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+    def summary(self):
+        return {
+            'latency_ms': self.latency_ms.summary(),
+            'sql_ms': self.sql_ms.summary(),
+            'template_ms': self.template_ms.summary(),
+            'queries': self.queries.summary(),
+        }
+
+
+class RequestProfiler:
+    """Collects per-endpoint request figures and a bounded log of slow SQL statements."""
+
+    def __init__(self, slow_query_ms=100, slow_query_log_size=100):
+        self.slow_query_ms = slow_query_ms
+        self.slow_queries = deque(maxlen=slow_query_log_size)
+        self.endpoints = {}
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._logger = None
+
+    def init_app(self, app, db):
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', self.slow_query_ms)
+        self._logger = app.logger
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+        self.enabled = True
+
+    # Flask hooks
+    def _start_request(self):
+        g.profile = {'start': time.perf_counter(), 'queries': 0, 'sql_ms': 0.0,
+                     'template_ms': 0.0, 'template_starts': []}
+
+    def _finish_request(self, exc=None):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        latency_ms = (time.perf_counter() - profile['start']) * 1000
+        endpoint = request.endpoint or request.path
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.latency_ms.add(latency_ms)
+            stats.sql_ms.add(profile['sql_ms'])
+            stats.template_ms.add(profile['template_ms'])
+            stats.queries.add(profile['queries'])
+
+    def _before_render(self, sender, template, context, **extra):
+        if has_request_context() and 'profile' in g:
+            g.profile['template_starts'].append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        if has_request_context() and 'profile' in g and g.profile['template_starts']:
+            started = g.profile['template_starts'].pop()
+            # Only the outermost render counts, so nested renders are not added twice
+            if not g.profile['template_starts']:
+                g.profile['template_ms'] += (time.perf_counter() - started) * 1000
+
+    # SQLAlchemy hooks
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info['profile_query_start'].pop()) * 1000
+        if has_request_context() and 'profile' in g:
+            g.profile['queries'] += 1
+            g.profile['sql_ms'] += elapsed_ms
+        if elapsed_ms >= self.slow_query_ms:
+            self._record_slow_query(conn, statement, parameters, executemany, elapsed_ms)
+
+    def _record_slow_query(self, conn, statement, parameters, executemany, elapsed_ms):
+        plan = None
+        if conn.dialect.name == 'sqlite' and not executemany and statement.lstrip().upper().startswith('SELECT'):
+            try:
+                # The raw DBAPI connection does not fire engine events, so this cannot recurse
+                rows = conn.connection.driver_connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+                plan = [row[-1] for row in rows]
+            except Exception as error:  # a failed EXPLAIN must never break the request
+                plan = [f'EXPLAIN failed: {error}']
+        entry = {
+            'endpoint': request.endpoint if has_request_context() else None,
+            'duration_ms': round(elapsed_ms, 3),
+            'statement': statement,
+            'plan': plan,
+            'at': time.time(),
+        }
+        self.slow_queries.append(entry)
+        if self._logger:
+            self._logger.warning('Slow query (%.1fms) on %s: %s | plan: %s',
+                                 elapsed_ms, entry['endpoint'], statement, plan)
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {name: stats.summary() for name, stats in self.endpoints.items()}
+        return {
+            'enabled': self.enabled,
+            'slow_query_ms': self.slow_query_ms,
+            'endpoints': endpoints,
+            'slow_queries': list(self.slow_queries),
+        }
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+            self.slow_queries.clear()
@@ -0,0 +1,102 @@
+"""A periodic background job running on a daemon thread, with run metrics."""
+import threading
+import time
+
+from profiling import Histogram
+
+# Bucket bounds for per-batch row counts and for lag in seconds
+BATCH_SIZE_BOUNDS = (1, 10, 50, 100, 200, 500, 1000, 2000, 5000)
+LAG_BOUNDS_SECONDS = (1, 5, 15, 30, 60, 120, 300, 900, 3600, 21600, 86400)
+
+
+class PeriodicJob:
+    """Calls fn(job) every interval seconds on its own thread; trigger() runs it early.
+
+    fn reports the work it did through record_batch() so the job can keep
+    batch size, lag and throughput figures.
+    """
+
+    def __init__(self, name, fn, interval):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_run_at = None
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.run_ms = Histogram()
+        self.batch_sizes = Histogram(bounds=BATCH_SIZE_BOUNDS)
+        self.lag_seconds = Histogram(bounds=LAG_BOUNDS_SECONDS)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def trigger(self):
+        """Run as soon as the current run (if any) finishes instead of waiting for the interval"""
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def run_once(self):
+        """Run fn now on the calling thread; errors are counted, not raised"""
+        start = time.perf_counter()
+        try:
+            self.fn(self)
+        except Exception as exc:  # keep the worker alive; the next run retries
+            with self._lock:
+                self.errors += 1
+                self.last_error = repr(exc)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.runs += 1
+            self.last_run_at = time.time()
+            self.busy_seconds += elapsed
+            self.run_ms.add(elapsed * 1000)
+
+    def record_batch(self, size, lag_seconds):
+        """Record one batch of size items, the oldest of which had waited lag_seconds"""
+        with self._lock:
+            self.items += size
+            self.batch_sizes.add(size)
+            self.lag_seconds.add(lag_seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'interval_seconds': self.interval,
+                'runs': self.runs,
+                'errors': self.errors,
+                'last_error': self.last_error,
+                'last_run_at': self.last_run_at,
+                'items': self.items,
+                'items_per_second': self.items / self.busy_seconds if self.busy_seconds else 0.0,
+                'run_ms': self.run_ms.summary(),
+                'batch_size': self.batch_sizes.summary(),
+                'lag_seconds': self.lag_seconds.summary(),
+            }
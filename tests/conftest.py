@@ -0,0 +1,58 @@
+"""Shared fixtures: every test runs against a freshly migrated throwaway SQLite file.
+
+Run from the project root with ``python -m pytest``.
+"""
+import os
+import tempfile
+from datetime import datetime
+
+import pytest
+
+_test_dir = tempfile.mkdtemp(prefix='parking-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_test_dir, 'test.db')
+
+from app import (app as flask_app, db, User, Vehicle, ParkingLot, admin_stats_cache, migrate_db,  # noqa: E402
+                 page_cache, principal_cache, provision_spots, reconcile_lot_occupancy)
+
+
+@pytest.fixture
+def app():
+    """An app context over an empty, fully migrated database"""
+    with flask_app.app_context():
+        db.drop_all()
+        migrate_db()
+        for cache in (page_cache, admin_stats_cache, principal_cache):
+            cache.invalidate()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def make_lot(app):
+    """make_lot(spots) creates a lot with that many free spots and returns its id"""
+    def make(spots, pincode='560001'):
+        lot = ParkingLot(name='Test Lot', address='1 Test Street', pincode=pincode, price_per_hour=20,
+                         capacity=spots)
+        db.session.add(lot)
+        db.session.flush()
+        provision_spots(lot.id, 1, spots)
+        db.session.commit()
+        reconcile_lot_occupancy()
+        return lot.id
+    return make
+
+
+@pytest.fixture
+def make_user(app):
+    """make_user(name) creates a user with one vehicle and returns (user_id, vehicle_no)"""
+    def make(name):
+        user = User(first_name='Test', last_name=name, username=name, email=f'{name}@test.local',
+                    address='Test', pincode='560001', password='x', created_at=datetime(2030, 1, 1))
+        db.session.add(user)
+        db.session.flush()
+        vehicle = Vehicle(user_id=user.id, owner_name=name, mobile='0', vehicle_type='4-wheeler',
+                          vehicle_brand='Test', vehicle_no=f'KA01{name.upper()}')
+        db.session.add(vehicle)
+        db.session.commit()
+        return user.id, vehicle.vehicle_no
+    return make
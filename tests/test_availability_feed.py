@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+from datetime import timedelta
+
+import app as parking
+from app import app as flask_app, db, availability_feed, booking_now
+from tests.test_reservations import book
+
+SUBSCRIBERS = 300
+
+
+@contextmanager
+def count_sql():
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.event.listen(db.engine, 'before_cursor_execute', on_execute)
+    try:
+        yield statements
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', on_execute)
+
+
+def open_stream(user_id):
+    """Connect one client to the SSE stream; returns its response and an iterator over its messages"""
+    client = flask_app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    response = client.get('/api/availability/stream', buffered=False)
+    messages = (chunk.decode() for chunk in response.response)
+    assert next(messages) == 'retry: 3000\n\n'
+    return response, messages
+
+
+def test_every_subscriber_gets_the_delta_without_running_sql(make_lot, make_user, monkeypatch):
+    monkeypatch.setattr(parking, 'AVAILABILITY_KEEPALIVE_SECONDS', 0.01)
+    lot_id = make_lot(5)
+    alice = make_user('alice')
+    streams = [open_stream(alice[0]) for _ in range(SUBSCRIBERS)]
+    assert availability_feed.stats()['subscribers'] == SUBSCRIBERS
+    try:
+        with count_sql() as idle_sql:
+            assert all(next(messages) == ': keepalive\n\n' for _, messages in streams)
+        assert idle_sql == []
+
+        now = booking_now()
+        book(lot_id, alice, now, now + timedelta(hours=2))
+        event_id = availability_feed.stats()['last_event_id']
+        expected = f'id: {event_id}\ndata: {{"lots":[{{"lot_id":{lot_id},"available":-1}}]}}\n\n'
+        with count_sql() as delivery_sql:
+            assert all(next(messages) == expected for _, messages in streams)
+        assert delivery_sql == []
+    finally:
+        for response, _ in streams:
+            response.close()
+    assert availability_feed.stats()['subscribers'] == 0
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+import pytest
+
+from app import (app as flask_app, db, Booking, LotOccupancy, ParkingSpot, Vehicle, book_vehicles, booking_now,
+                 reconcile_lot_occupancy)
+
+
+def fleet(make_user, size):
+    """A user with size vehicles; returns (user_id, vehicle_ids)"""
+    user_id, _ = make_user('fleet')
+    for i in range(1, size):
+        db.session.add(Vehicle(user_id=user_id, owner_name='fleet', mobile='0', vehicle_type='4-wheeler',
+                               vehicle_brand='Test', vehicle_no=f'KA01FLEET{i}'))
+    db.session.commit()
+    return user_id, [vehicle_id for (vehicle_id,) in
+                     db.session.query(Vehicle.id).filter_by(user_id=user_id).order_by(Vehicle.id)]
+
+
+def client_for(user_id):
+    client = flask_app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return client
+
+
+def window(hours=2):
+    now = booking_now()
+    return {'entry_time': now.strftime('%Y-%m-%dT%H:%M'),
+            'exit_time': (now + timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M')}
+
+
+def lot_state(lot_id):
+    db.session.expire_all()
+    occupancy = db.session.get(LotOccupancy, lot_id)
+    return (ParkingSpot.query.filter_by(lot_id=lot_id, is_available=True).count(),
+            occupancy.available_count, occupancy.occupied_count)
+
+
+@pytest.mark.parametrize('fields', [
+    {'vehicle_ids': '12'},
+    {'vehicle_ids': 12},
+    {'vehicle_ids': {'1': 1}},
+    {'vehicle_ids': [True]},
+    {'vehicle_ids': [1.5]},
+    {'vehicle_ids': [1], 'lot_ids': '12'},
+])
+def test_ids_must_be_lists_of_ids(make_lot, make_user, fields):
+    lot_id = make_lot(20)
+    user_id, _ = fleet(make_user, 2)
+    response = client_for(user_id).post('/api/bookings/batch', json=dict(window(), lot_id=lot_id, **fields))
+    assert response.status_code == 400
+    assert Booking.query.count() == 0
+
+
+def test_a_batch_too_big_for_its_lots_books_nothing(make_lot, make_user):
+    small, smaller = make_lot(3), make_lot(2)
+    user_id, vehicle_ids = fleet(make_user, 6)
+    response = client_for(user_id).post('/api/bookings/batch',
+                                        json=dict(window(), vehicle_ids=vehicle_ids, lot_ids=[small, smaller]))
+    assert response.status_code == 409
+    assert response.json['available'] == {str(small): 3, str(smaller): 2}
+    assert Booking.query.count() == 0
+    assert (lot_state(small), lot_state(smaller)) == ((3, 3, 0), (2, 2, 0))
+
+
+def test_a_batch_that_runs_out_of_spots_midway_rolls_back_every_claim(make_lot, make_user):
+    # Past the pre-check, as when other bookings take the spots first: the claims made so far are undone
+    small, smaller = make_lot(3), make_lot(2)
+    user_id, vehicle_ids = fleet(make_user, 6)
+    vehicles = Vehicle.query.filter(Vehicle.id.in_(vehicle_ids)).all()
+    now = booking_now()
+
+    assert book_vehicles(user_id, vehicles, [small, smaller], now, now + timedelta(hours=2)) is None
+    assert Booking.query.count() == 0
+    assert (lot_state(small), lot_state(smaller)) == ((3, 3, 0), (2, 2, 0))
+    assert reconcile_lot_occupancy() == []
+
+
+def test_a_batch_that_fits_books_every_vehicle(make_lot, make_user):
+    small, smaller = make_lot(3), make_lot(2)
+    user_id, vehicle_ids = fleet(make_user, 5)
+    response = client_for(user_id).post('/api/bookings/batch',
+                                        json=dict(window(), vehicle_ids=vehicle_ids, lot_ids=[small, smaller]))
+    assert response.status_code == 201, response.json
+    assert [booking['lot_id'] for booking in response.json['bookings']] == [small] * 3 + [smaller] * 2
+    assert (lot_state(small), lot_state(smaller)) == ((0, 0, 3), (0, 0, 2))
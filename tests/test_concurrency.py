@@ -0,0 +1,98 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import (app as flask_app, db, Booking, LotOccupancy, ParkingSpot, claim_spot, claim_spots,
+                 complete_bookings, expire_overdue_bookings, reconcile_lot_occupancy)
+
+THREADS = 8
+
+
+def run_threads(fn, count=THREADS):
+    """Run fn(i) on count threads, each in its own app context and session, and re-raise the first error"""
+    errors = []
+    barrier = threading.Barrier(count)
+
+    def target(i):
+        with flask_app.app_context():
+            try:
+                barrier.wait()
+                fn(i)
+            except Exception as exc:  # surfaced in the test thread below
+                errors.append(exc)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def claim_one(lot_id):
+    now = datetime.now()
+    spot = claim_spot(lot_id, now, now + timedelta(hours=2))
+    return [spot.id] if spot else []
+
+
+def claim_three(lot_id):
+    now = datetime.now()
+    return [spot_id for spot_id, _ in claim_spots(lot_id, 3, now, now + timedelta(hours=2))]
+
+
+@pytest.mark.parametrize('claim', [claim_one, claim_three])
+def test_concurrent_claims_never_hand_out_a_spot_twice(make_lot, claim):
+    lot_id = make_lot(20)
+    claimed = []
+    lock = threading.Lock()
+
+    def worker(_):
+        for _ in range(5):
+            spot_ids = claim(lot_id)
+            db.session.commit()
+            with lock:
+                claimed.extend(spot_ids)
+
+    run_threads(worker)
+    assert len(claimed) == len(set(claimed)) == 20
+    assert ParkingSpot.query.filter_by(lot_id=lot_id, is_available=True).count() == 0
+    occupancy = db.session.get(LotOccupancy, lot_id)
+    assert (occupancy.available_count, occupancy.occupied_count) == (0, 20)
+
+
+def test_release_racing_expiry_frees_each_spot_once(make_lot, make_user):
+    lot_id = make_lot(10)
+    user_id, vehicle_no = make_user('alice')
+    now = datetime.now()
+    entry, exit = now - timedelta(hours=3), now - timedelta(minutes=5)
+    booking_ids = []
+    for _ in range(10):
+        spot = claim_spot(lot_id, entry, exit)
+        booking = Booking(user_id=user_id, spot_id=spot.id, vehicle_no=vehicle_no,
+                          entry_time=entry, exit_time=exit, total_cost=40)
+        db.session.add(booking)
+        db.session.flush()
+        booking_ids.append(booking.id)
+    db.session.commit()
+    completed = []
+    lock = threading.Lock()
+
+    def worker(i):
+        if i % 2:
+            count = expire_overdue_bookings(batch_size=3)
+        else:
+            count = len(complete_bookings(booking_ids))
+            db.session.commit()
+        with lock:
+            completed.append(count)
+
+    run_threads(worker)
+    db.session.expire_all()
+    assert sum(completed) == 10
+    assert Booking.query.filter_by(status='active').count() == 0
+    assert ParkingSpot.query.filter_by(lot_id=lot_id, is_available=True).count() == 10
+    assert reconcile_lot_occupancy() == []
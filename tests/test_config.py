@@ -0,0 +1,10 @@
+import pytest
+
+from app import engine_options
+
+
+def test_only_sqlite_and_postgresql_are_accepted():
+    assert engine_options('sqlite://') == {}
+    assert engine_options('postgresql://parking@db/parking')['pool_pre_ping']
+    with pytest.raises(ValueError):
+        engine_options('mysql://parking@db/parking')
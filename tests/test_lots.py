@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from app import (app as flask_app, db, ArchivedBooking, Booking, LotOccupancy, ParkingLot, ParkingSpot, User,
+                 archive_bookings, booking_history, refresh_booking_rollups, user_bookings_query)
+
+
+def admin_client(make_user):
+    user_id, _ = make_user('admin')
+    db.session.get(User, user_id).is_admin = True
+    db.session.commit()
+    client = flask_app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return client
+
+
+def resize(client, lot_id, capacity):
+    lot = db.session.get(ParkingLot, lot_id)
+    response = client.post(f'/admin/edit_lot/{lot_id}', data={
+        'name': lot.name, 'address': lot.address, 'pincode': lot.pincode,
+        'price_per_hour': str(lot.price_per_hour), 'capacity': capacity})
+    assert response.status_code == 302
+    db.session.expire_all()
+
+
+def spot_numbers(lot_id):
+    return [number for (number,) in
+            db.session.query(ParkingSpot.spot_number).filter_by(lot_id=lot_id).order_by(ParkingSpot.id)]
+
+
+def test_growing_a_lot_after_a_shrink_does_not_reuse_spot_numbers(make_lot, make_user):
+    lot_id = make_lot(5)
+    client = admin_client(make_user)
+    user_id, vehicle_no = make_user('alice')
+    # A past booking on P005 keeps that spot when the lot shrinks, leaving a gap at P003-P004
+    p005 = ParkingSpot.query.filter_by(lot_id=lot_id, spot_number='P005').one()
+    db.session.add(Booking(user_id=user_id, spot_id=p005.id, vehicle_no=vehicle_no, entry_time=datetime(2030, 1, 1),
+                           exit_time=datetime(2030, 1, 1) + timedelta(hours=2), total_cost=40, status='completed'))
+    db.session.commit()
+
+    resize(client, lot_id, 2)
+    assert spot_numbers(lot_id) == ['P001', 'P002', 'P005']
+    resize(client, lot_id, 6)
+    assert spot_numbers(lot_id) == ['P001', 'P002', 'P005', 'P006', 'P007', 'P008']
+    assert db.session.get(LotOccupancy, lot_id).available_count == 6
+
+
+def archive_a_booking_on(lot_id, spot_number, user):
+    """Book the spot in the past, then archive that booking; a later booking on another spot stays hot"""
+    user_id, vehicle_no = user
+    spots = {spot.spot_number: spot.id for spot in ParkingSpot.query.filter_by(lot_id=lot_id)}
+    for number, day in ((spot_number, 1), ('P001', 2)):
+        db.session.add(Booking(user_id=user_id, spot_id=spots[number], vehicle_no=vehicle_no,
+                               entry_time=datetime(2030, 1, day), exit_time=datetime(2030, 1, day, 2), total_cost=40,
+                               status='completed'))
+    db.session.commit()
+    refresh_booking_rollups()
+    assert archive_bookings(datetime(2031, 1, 1)) == 1
+    return spots[spot_number]
+
+
+def test_shrinking_a_lot_keeps_spots_with_archived_bookings(make_lot, make_user):
+    lot_id = make_lot(5)
+    client = admin_client(make_user)
+    alice = make_user('alice')
+    archived_spot_id = archive_a_booking_on(lot_id, 'P004', alice)
+
+    resize(client, lot_id, 1)
+    assert spot_numbers(lot_id) == ['P001', 'P004']
+    assert ArchivedBooking.query.one().spot_id == archived_spot_id
+    # History pages join each booking to its spot, so the archived booking is still listed
+    history = user_bookings_query(alice[0], booking_history(True)).all()
+    assert len(history) == 2
+
+
+def test_lots_with_archived_bookings_are_not_deleted(make_lot, make_user):
+    lot_id, unused_lot_id = make_lot(3), make_lot(3)
+    client = admin_client(make_user)
+    alice = make_user('alice')
+    archive_a_booking_on(lot_id, 'P002', alice)
+    # Leave only the archived booking behind
+    Booking.query.delete()
+    db.session.commit()
+
+    assert client.get(f'/admin/delete_lot/{lot_id}').status_code == 302
+    assert client.get(f'/admin/delete_lot/{unused_lot_id}').status_code == 302
+    db.session.expire_all()
+    assert db.session.get(ParkingLot, lot_id) is not None
+    assert db.session.get(ParkingLot, unused_lot_id) is None
+    assert len(user_bookings_query(alice[0], booking_history(True)).all()) == 1
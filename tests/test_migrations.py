@@ -0,0 +1,17 @@
+from app import db, LotOccupancy, ParkingSpot, SchemaMigration, compute_admin_stats, migrate_db
+
+
+def test_upgrade_fills_missing_occupancy_counters(make_lot):
+    lot_id = make_lot(5)
+    empty_lot_id = make_lot(0)
+    db.session.query(ParkingSpot).filter(ParkingSpot.lot_id == lot_id, ParkingSpot.spot_number == 'P002').\
+        update({'is_available': False})
+    # A database from before the counters existed: no rows and the backfill not yet applied
+    db.session.execute(db.delete(LotOccupancy))
+    db.session.execute(db.delete(SchemaMigration).where(SchemaMigration.version == 8))
+    db.session.commit()
+
+    assert (8, 'Backfill lot occupancy counters') in migrate_db()
+    counters = {row.lot_id: (row.available_count, row.occupied_count) for row in LotOccupancy.query}
+    assert counters == {lot_id: (4, 1), empty_lot_id: (0, 0)}
+    assert compute_admin_stats()['total_spots'] == 5
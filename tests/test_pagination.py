@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from app import (db, Booking, ParkingSpot, archive_bookings, booking_history, bookings_page,
+                 refresh_booking_rollups, user_bookings_query)
+
+# Fewer bookings than this share each created_at, so pages have to break ties on id
+TIES = 4
+
+
+def seed_history(user_id, vehicle_no, lot_id, count, now=datetime(2030, 1, 1)):
+    spot_ids = [spot_id for (spot_id,) in db.session.query(ParkingSpot.id).filter_by(lot_id=lot_id)]
+    for i in range(count):
+        entry = now - timedelta(days=count - i)
+        db.session.add(Booking(user_id=user_id, spot_id=spot_ids[i % len(spot_ids)], vehicle_no=vehicle_no,
+                               entry_time=entry, exit_time=entry + timedelta(hours=2), total_cost=40,
+                               status='completed', created_at=now - timedelta(hours=count // TIES - i // TIES)))
+    db.session.commit()
+
+
+def page_through(query, page_size, between_pages=None):
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = bookings_page(query, cursor, page_size)
+        seen += [(row[0].created_at, row[0].id) for row in rows]
+        if not cursor:
+            return seen
+        if between_pages:
+            between_pages()
+
+
+def test_pages_return_every_booking_once_in_order(make_lot, make_user):
+    lot_id = make_lot(10)
+    user_id, vehicle_no = make_user('alice')
+    seed_history(user_id, vehicle_no, lot_id, 53)
+
+    seen = page_through(user_bookings_query(user_id), page_size=10)
+    assert len(seen) == len(set(seen)) == 53
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_bookings_made_while_paging_do_not_repeat_or_skip_rows(make_lot, make_user):
+    lot_id = make_lot(10)
+    user_id, vehicle_no = make_user('alice')
+    seed_history(user_id, vehicle_no, lot_id, 30)
+    before = {booking_id for (booking_id,) in db.session.query(Booking.id)}
+
+    def book_another():
+        # Newer than every page already read, so it belongs before the cursor
+        seed_history(user_id, vehicle_no, lot_id, 1, now=datetime(2031, 1, 1))
+
+    seen = page_through(user_bookings_query(user_id), page_size=7, between_pages=book_another)
+    ids = [booking_id for _, booking_id in seen]
+    assert len(ids) == len(set(ids))
+    assert before <= set(ids)
+
+
+def test_pages_span_hot_and_archived_bookings_once(make_lot, make_user):
+    lot_id = make_lot(10)
+    user_id, vehicle_no = make_user('alice')
+    seed_history(user_id, vehicle_no, lot_id, 41)
+    refresh_booking_rollups()
+    assert archive_bookings(datetime(2029, 12, 10)) > 0
+
+    seen = page_through(user_bookings_query(user_id, booking_history(True)), page_size=6)
+    assert len(seen) == len(set(seen)) == 41
+    assert seen == sorted(seen, reverse=True)
@@ -0,0 +1,92 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app import PricingRule
+from pricing import RateTable, TimeRule
+from tests.test_lots import admin_client
+
+# 2030-01-07 is a Monday
+MONDAY = datetime(2030, 1, 7)
+
+
+def at(day, hour, minute=0):
+    return MONDAY.replace(day=MONDAY.day + day, hour=hour, minute=minute)
+
+
+def test_stays_are_priced_by_the_segments_they_cover():
+    # Weekday daytime at double rate
+    table = RateTable(20, [TimeRule(range(5), 9 * 60, 17 * 60, 2)])
+    assert table.segments == 11
+    assert table.quote(at(0, 7), at(0, 9)) == Decimal('40.00')
+    assert table.quote(at(0, 8), at(0, 10)) == Decimal('60.00')
+    assert table.quote(at(0, 16, 30), at(0, 17, 15)) == Decimal('25.00')
+    # Saturday is not covered
+    assert table.quote(at(5, 9), at(5, 11)) == Decimal('40.00')
+    assert table.quote(at(0, 10), at(0, 10)) == Decimal('0.00')
+
+
+def test_long_stays_add_whole_weeks():
+    table = RateTable(20, [TimeRule(range(5), 9 * 60, 17 * 60, 2)])
+    one_week = table.quote(at(0, 0), at(7, 0))
+    assert one_week == Decimal(20 * 168 + 20 * 8 * 5)
+    assert table.quote(at(2, 13), at(23, 13)) == 3 * one_week
+
+
+def test_windows_past_midnight_wrap_into_the_next_day():
+    # Sunday night 22:00 to Monday 06:00 at half rate
+    table = RateTable(20, [TimeRule([6], 22 * 60, 6 * 60, Decimal('0.5'))])
+    sunday = at(-1, 0)
+    assert table.quote(sunday.replace(hour=21), sunday.replace(hour=23)) == Decimal('30.00')
+    assert table.quote(at(0, 5), at(0, 7)) == Decimal('30.00')
+    # Saturday night is not covered
+    assert table.quote(at(5, 22), at(5, 23)) == Decimal('20.00')
+
+
+def test_overlapping_rules_stack():
+    table = RateTable(10, [TimeRule(range(7), 0, 24 * 60, 2), TimeRule([0], 12 * 60, 13 * 60, 3)])
+    assert table.quote(at(0, 12), at(0, 13)) == Decimal('60.00')
+
+
+def test_the_highest_surge_tier_reached_applies_to_the_whole_stay():
+    table = RateTable(20, surge_tiers=[('0.9', '2'), ('0.75', '1.5')])
+    two_hours = (at(0, 10), at(0, 12))
+    assert table.quote(*two_hours) == Decimal('40.00')
+    assert table.quote(*two_hours, occupancy=Decimal('0.5')) == Decimal('40.00')
+    assert table.quote(*two_hours, occupancy=Decimal('0.75')) == Decimal('60.00')
+    assert table.quote(*two_hours, occupancy=Decimal('0.95')) == Decimal('80.00')
+
+
+@pytest.mark.parametrize('fields', [
+    {'multiplier': 'Infinity'},
+    {'multiplier': 'NaN'},
+    {'multiplier': '1e999'},
+    {'multiplier': 'cheap'},
+    {'multiplier': '1000'},
+    {'multiplier': '0'},
+    {'multiplier': ['2']},
+    {'multiplier': True},
+    {'multiplier': '2', 'start': '25:00'},
+    {'multiplier': '2', 'start': '09:00', 'end': '09:00'},
+    {'multiplier': '2', 'days': '78'},
+    {'multiplier': '2', 'kind': 'surge', 'min_occupancy': 'Infinity'},
+    {'multiplier': '2', 'kind': 'surge', 'min_occupancy': '1.5'},
+    {'multiplier': '2', 'kind': 'surge'},
+    {'multiplier': '2', 'lot_id': 999},
+])
+def test_invalid_rules_are_rejected_with_400(make_user, fields):
+    client = admin_client(make_user)
+    response = client.post('/admin/pricing_rules', json=fields)
+    assert response.status_code == 400, response.json
+    assert response.json['error']
+    assert PricingRule.query.count() == 0
+
+
+def test_valid_rules_are_stored_rounded_to_their_columns(make_user):
+    client = admin_client(make_user)
+    response = client.post('/admin/pricing_rules', json={'kind': 'surge', 'multiplier': 1.2345,
+                                                         'min_occupancy': '0.8'})
+    assert response.status_code == 201, response.json
+    rule = PricingRule.query.one()
+    assert (rule.multiplier, rule.min_occupancy) == (Decimal('1.234'), Decimal('0.800'))
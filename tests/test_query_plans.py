@@ -0,0 +1,5 @@
+from app import check_query_plans
+
+
+def test_hot_queries_use_their_indexes(app):
+    assert check_query_plans() == []
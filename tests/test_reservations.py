@@ -0,0 +1,93 @@
+import threading
+from datetime import datetime, timedelta
+
+from app import (db, Booking, LotOccupancy, ParkingSpot, booking_now, claim_spot, complete_bookings,
+                 occupy_started_bookings)
+from tests.test_concurrency import run_threads
+
+
+def book(lot_id, user, start, end):
+    """Claim a spot for the window and record the booking in one transaction, as /book_parking does"""
+    user_id, vehicle_no = user
+    spot = claim_spot(lot_id, start, end)
+    if spot is None:
+        db.session.rollback()
+        return None
+    booking = Booking(user_id=user_id, spot_id=spot.id, vehicle_no=vehicle_no, entry_time=start, exit_time=end,
+                      total_cost=40)
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def counters(lot_id):
+    occupancy = db.session.get(LotOccupancy, lot_id, populate_existing=True)
+    return occupancy.available_count, occupancy.occupied_count
+
+
+def test_future_booking_leaves_the_spot_free_until_it_starts(make_lot, make_user):
+    lot_id = make_lot(1)
+    alice = make_user('alice')
+    now = booking_now()
+    next_month = now + timedelta(days=30)
+
+    assert book(lot_id, alice, next_month, next_month + timedelta(hours=2)) is not None
+    assert counters(lot_id) == (1, 0)
+    # Today's window does not overlap next month's, so the only spot is still bookable now
+    today = book(lot_id, alice, now, now + timedelta(hours=2))
+    assert today is not None
+    assert counters(lot_id) == (0, 1)
+    # But nothing overlapping either booking fits
+    assert book(lot_id, alice, next_month + timedelta(hours=1), next_month + timedelta(hours=3)) is None
+    assert book(lot_id, alice, now + timedelta(hours=1), now + timedelta(hours=3)) is None
+
+
+def test_spot_is_occupied_when_its_booking_starts(make_lot, make_user):
+    lot_id = make_lot(1)
+    alice = make_user('alice')
+    now = booking_now()
+    later = book(lot_id, alice, now + timedelta(hours=1), now + timedelta(hours=3))
+
+    assert occupy_started_bookings(now) == 0
+    assert counters(lot_id) == (1, 0)
+    assert occupy_started_bookings(now + timedelta(hours=1)) == 1
+    assert counters(lot_id) == (0, 1)
+    assert not db.session.get(ParkingSpot, later.spot_id, populate_existing=True).is_available
+
+
+def test_releasing_a_booking_keeps_the_spot_held_by_one_that_has_started(make_lot, make_user):
+    lot_id = make_lot(1)
+    alice = make_user('alice')
+    now = booking_now()
+    current = book(lot_id, alice, now - timedelta(hours=2), now + timedelta(minutes=1))
+    # Checked at booking time in the past, so both windows were free then
+    following = Booking(user_id=alice[0], spot_id=current.spot_id, vehicle_no=alice[1],
+                        entry_time=now - timedelta(minutes=5), exit_time=now + timedelta(hours=2), total_cost=40)
+    db.session.add(following)
+    db.session.commit()
+
+    complete_bookings([current.id])
+    db.session.commit()
+    assert counters(lot_id) == (0, 1)
+    complete_bookings([following.id])
+    db.session.commit()
+    assert counters(lot_id) == (1, 0)
+
+
+def test_concurrent_bookings_for_overlapping_future_windows_never_share_a_spot(make_lot, make_user):
+    lot_id = make_lot(5)
+    users = [make_user(f'user{i}') for i in range(8)]
+    start = datetime(2031, 1, 1, 10)
+    spot_ids = []
+    lock = threading.Lock()
+
+    def worker(i):
+        for offset in range(3):
+            booking = book(lot_id, users[i], start + timedelta(minutes=10 * offset), start + timedelta(hours=2))
+            if booking:
+                with lock:
+                    spot_ids.append(booking.spot_id)
+
+    run_threads(worker)
+    assert len(spot_ids) == len(set(spot_ids)) == 5
+    assert counters(lot_id) == (5, 0)
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from app import (db, ArchivedBooking, Booking, LotDailyStats, ParkingSpot, SchemaMigration, archive_bookings,
+                 compute_admin_stats, migrate_db, rebuild_booking_rollups, refresh_booking_rollups)
+
+ENTRY = datetime(2030, 1, 1, 10)
+
+
+def add_booking(lot_id, user, booking_id=None, cost=40, status='completed'):
+    user_id, vehicle_no = user
+    spot_id = db.session.query(ParkingSpot.id).filter_by(lot_id=lot_id).limit(1).scalar()
+    booking = Booking(id=booking_id, user_id=user_id, spot_id=spot_id, vehicle_no=vehicle_no, entry_time=ENTRY,
+                      exit_time=ENTRY + timedelta(hours=2), total_cost=cost, status=status)
+    db.session.add(booking)
+    db.session.commit()
+    return booking.id
+
+
+def rolled_up_revenue():
+    return db.session.query(db.func.coalesce(db.func.sum(LotDailyStats.revenue), 0)).scalar()
+
+
+def test_a_booking_committed_after_a_higher_id_is_still_rolled_up(make_lot, make_user):
+    lot_id = make_lot(2)
+    alice = make_user('alice')
+    add_booking(lot_id, alice, booking_id=10)
+    assert refresh_booking_rollups() == 1
+    # On PostgreSQL an earlier transaction can commit id 5 after id 10 was folded in
+    add_booking(lot_id, alice, booking_id=5, cost=25)
+    assert compute_admin_stats()['total_revenue'] == Decimal('65.00')
+
+    assert refresh_booking_rollups() == 1
+    assert rolled_up_revenue() == Decimal('65.00')
+    assert compute_admin_stats()['total_revenue'] == Decimal('65.00')
+    assert refresh_booking_rollups() == 0
+
+
+def test_only_rolled_up_bookings_are_archived(make_lot, make_user):
+    lot_id = make_lot(2)
+    alice = make_user('alice')
+    counted = add_booking(lot_id, alice)
+    refresh_booking_rollups()
+    uncounted = add_booking(lot_id, alice)
+    add_booking(lot_id, alice)  # the newest booking always stays in the hot table
+
+    assert archive_bookings(datetime(2031, 1, 1)) == 1
+    assert [booking_id for (booking_id,) in db.session.query(ArchivedBooking.id)] == [counted]
+    assert db.session.get(Booking, uncounted) is not None
+    assert compute_admin_stats()['total_revenue'] == Decimal('120.00')
+
+
+def test_rebuild_counts_hot_and_archived_bookings_once(make_lot, make_user):
+    lot_id = make_lot(2)
+    alice = make_user('alice')
+    for _ in range(3):
+        add_booking(lot_id, alice)
+    refresh_booking_rollups()
+    archive_bookings(datetime(2031, 1, 1))
+
+    assert rebuild_booking_rollups() == 3
+    assert rolled_up_revenue() == Decimal('120.00')
+    assert compute_admin_stats()['total_revenue'] == Decimal('120.00')
+
+
+def test_upgrade_from_the_watermark_recounts_every_booking(make_lot, make_user):
+    lot_id = make_lot(2)
+    alice = make_user('alice')
+    for booking_id in (3, 1, 2):
+        add_booking(lot_id, alice, booking_id=booking_id)
+    # The schema before the flag: a watermark at id 3 that skipped the bookings committed after it
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql('DROP INDEX ix_bookings_unrolled')
+        connection.exec_driver_sql('ALTER TABLE bookings DROP COLUMN rolled_up')
+        connection.exec_driver_sql('ALTER TABLE bookings_archive DROP COLUMN rolled_up')
+        connection.exec_driver_sql('ALTER TABLE rollup_state ADD COLUMN last_id INTEGER NOT NULL DEFAULT 3')
+        connection.exec_driver_sql("INSERT INTO lot_daily_stats (lot_id, day, bookings, revenue, occupied_minutes) "
+                                   f"VALUES ({lot_id}, '2030-01-01 00:00:00.000000', 1, 40, 120)")
+        connection.execute(db.delete(SchemaMigration).where(SchemaMigration.version == 9))
+
+    assert migrate_db() == [(9, 'Rolled-up flag on bookings in place of the rollup watermark')]
+    assert rolled_up_revenue() == Decimal('120.00')
+    assert Booking.query.filter_by(rolled_up=False).count() == 0
+    assert compute_admin_stats()['total_revenue'] == Decimal('120.00')